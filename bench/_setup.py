@@ -0,0 +1,33 @@
+"""
+Общая настройка для бенчмарков: Django поднимается на отдельной
+временной SQLite-базе, рабочая db.sqlite3 не затрагивается.
+
+    python bench/<script>.py [--db путь]
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def setup_django(db_path=None, settings_module='younodarapi.settings'):
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+
+    from django.conf import settings
+    db_path = db_path or os.path.join(tempfile.mkdtemp(prefix='bench-'), 'bench.sqlite3')
+    settings.DATABASES['default'] = {
+        **settings.DATABASES['default'],
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': db_path,
+    }
+    settings.DEBUG = False
+
+    import django
+    django.setup()
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+    return db_path
@@ -0,0 +1,106 @@
+"""
+Нагрузочный тест продаж: N «касс» (потоков) параллельно проводят чеки
+через POST /clients/sales/. Печатает пропускную способность и задержки.
+
+Работает на тестовой БД текущего профиля (создаётся и удаляется
+скриптом, рабочие данные не трогаются):
+
+    python bench/checkout_load.py                          # SQLite + WAL
+    SQLITE_JOURNAL_MODE=DELETE python bench/checkout_load.py  # SQLite по умолчанию
+    DB_ENGINE=postgres python bench/checkout_load.py       # PostgreSQL
+    DB_ENGINE=postgres DB_POOL=1 python bench/checkout_load.py
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'younodarapi.settings')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tills', type=int, default=8, help='параллельных касс')
+    parser.add_argument('--sales', type=int, default=200, help='чеков на кассу')
+    parser.add_argument('--lines', type=int, default=10, help='позиций в чеке')
+    parser.add_argument('--skus', type=int, default=500)
+    args = parser.parse_args()
+
+    import django
+    django.setup()
+
+    from django.conf import settings
+    from django.db import connection, connections
+    from django.test.utils import setup_test_environment
+    from rest_framework.test import APIClient
+    from clients.models import Stock
+
+    setup_test_environment()
+    settings.DEBUG = False
+    db_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        Stock.objects.bulk_create([
+            Stock(code=str(i), name=f'Товар {i}', price=10, quantity=10 ** 6,
+                  fixed_quantity=10 ** 6, unit='шт')
+            for i in range(args.skus)
+        ])
+        for stock in Stock.objects.all():
+            stock.sync_barcodes()
+
+        latencies, errors = [], []
+        lock = threading.Lock()
+        barrier = threading.Barrier(args.tills + 1)
+
+        def till(n):
+            client = APIClient()
+            items = [
+                {'code': str((n * 31 + k) % args.skus), 'name': 'x', 'price': '10.00',
+                 'quantity': 1, 'total': '10.00'}
+                for k in range(args.lines)
+            ]
+            body = {'payment_type': 'cash', 'total': f'{10 * args.lines}.00', 'items': items}
+            barrier.wait()
+            try:
+                for _ in range(args.sales):
+                    t0 = time.perf_counter()
+                    response = client.post('/clients/sales/', body, format='json')
+                    elapsed = time.perf_counter() - t0
+                    with lock:
+                        (latencies if response.status_code == 201 else errors).append(elapsed)
+            finally:
+                connections.close_all()
+
+        workers = [threading.Thread(target=till, args=(n,)) for n in range(args.tills)]
+        for w in workers:
+            w.start()
+        barrier.wait()
+        started = time.perf_counter()
+        for w in workers:
+            w.join()
+        wall = time.perf_counter() - started
+
+        profile = connection.vendor
+        if profile == 'sqlite':
+            profile += f" journal_mode={settings.SQLITE_PRAGMAS.get('journal_mode')}"
+        elif settings.DATABASES['default'].get('OPTIONS', {}).get('pool'):
+            profile += ' pool'
+        latencies.sort()
+        print(f'Профиль: {profile} ({db_name})')
+        print(f'Касс: {args.tills}, чеков: {len(latencies)} ок / {len(errors)} ошибок, '
+              f'позиций в чеке: {args.lines}')
+        print(f'Пропускная способность: {len(latencies) / wall:.1f} чеков/с')
+        if latencies:
+            print(f'Задержка p50: {statistics.median(latencies) * 1000:.1f} мс, '
+                  f'p95: {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f} мс, '
+                  f'max: {latencies[-1] * 1000:.1f} мс')
+    finally:
+        connections.close_all()
+        connection.creation.destroy_test_db(db_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""
+Заполняет временную базу движениями/транзакциями и печатает планы
+(EXPLAIN) отчётных запросов — видно, какие индексы они используют.
+
+    python bench/explain_indexes.py --rows 1000000
+"""
+import argparse
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from _setup import setup_django
+
+
+def seed(rows, batch=20000):
+    from django.utils.timezone import now
+    from clients.models import ReturnItem, SaleHistory, SaleItem, Stock, StockMovement, Transaction
+
+    start = now() - timedelta(days=730)
+    stocks = Stock.objects.bulk_create([
+        Stock(code=str(i), name=f'Товар {i}', price=10, quantity=0, fixed_quantity=0, unit='шт')
+        for i in range(1000)
+    ])
+    sale = SaleHistory.objects.create(payment_type='cash', total=0)
+    sale_item = SaleItem.objects.create(sale=sale, code='0', name='Товар 0', price=10, quantity=1, total=10)
+
+    types = [t for t, _ in StockMovement.MOVEMENT_TYPES]
+    step = timedelta(days=730) / rows
+    done = 0
+    while done < rows:
+        n = min(batch, rows - done)
+        StockMovement.objects.bulk_create([
+            StockMovement(
+                stock=random.choice(stocks),
+                movement_type=random.choice(types),
+                quantity=Decimal(random.randint(1, 5)),
+                branch=random.choice(('Сокулук', 'Беловодское')),
+                date=start + step * (done + k),
+            )
+            for k in range(n)
+        ])
+        SaleHistory.objects.bulk_create([
+            SaleHistory(
+                payment_type=random.choice(('cash', 'card')),
+                branch=random.choice(('Сокулук', 'Беловодское')),
+                total=Decimal(random.randint(10, 5000)),
+                date=start + step * (done + k),
+            )
+            for k in range(0, n, 10)
+        ])
+        Transaction.objects.bulk_create([
+            Transaction(
+                type=random.choice(('income', 'expense')),
+                name='bench',
+                amount=Decimal('1.00'),
+                date=(start + step * (done + k)).date(),
+            )
+            for k in range(0, n, 10)
+        ])
+        ReturnItem.objects.bulk_create([
+            ReturnItem(
+                sale_item=sale_item, quantity=1, branch=random.choice(('Сокулук', 'Беловодское')),
+                date=start + step * (done + k),
+            )
+            for k in range(0, n, 10)
+        ])
+        done += n
+        print(f'  {done}/{rows}', end='\r', flush=True)
+    print()
+    return stocks[0]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--db', default=None)
+    args = parser.parse_args()
+
+    db_path = setup_django(args.db)
+    print(f'База: {db_path}')
+
+    from django.db import connection
+    from django.db.models import Count
+    from django.utils.timezone import now
+    from clients.filters import (
+        ReturnItemFilter, SaleHistoryFilter, StockFilter, StockMovementFilter, TransactionFilter
+    )
+    from clients.models import ReturnItem, StockMovement, Transaction
+
+    t0 = time.perf_counter()
+    stock = seed(args.rows)
+    print(f'Заполнено {args.rows} движений за {time.perf_counter() - t0:.1f} с')
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+    today = now().date()
+    month = today.replace(day=1)
+    week_ago = now() - timedelta(days=7)
+    queries = {
+        'movements of one stock, last week': StockMovement.objects.filter(stock=stock, date__gte=week_ago).order_by('-date'),
+        'movements by type, last week': StockMovement.objects.filter(movement_type='sale', date__gte=week_ago).values('id'),
+        'latest movements page': StockMovement.objects.order_by('-date', '-id')[:50],
+        'expense count this month': Transaction.objects.filter(type='expense', date__gte=month).values('type').annotate(n=Count('id')),
+        'expense amounts this month': Transaction.objects.filter(type='expense', date__gte=month).values('amount'),
+        'returns by branch, last week': ReturnItem.objects.filter(branch='Сокулук', date__gte=week_ago).order_by('-date'),
+    }
+    # фильтры списков API (clients/filters.py) — каждый должен идти по индексу;
+    # в синтетических данных одна продажа и нет категорий, поэтому после ANALYZE
+    # для sale/category/salehistory планировщик вправе выбрать SCAN
+    day = week_ago.date().isoformat()
+    filtersets = [
+        (StockMovementFilter, {'stock': stock.pk, 'date_from': day}),
+        (StockMovementFilter, {'movement_type': 'sale', 'date_from': day}),
+        (StockMovementFilter, {'sale': 1}),
+        (StockMovementFilter, {'branch': 'Сокулук', 'date_from': day}),
+        (SaleHistoryFilter, {'payment_type': 'card', 'date_from': day}),
+        (SaleHistoryFilter, {'branch': 'Беловодское', 'date_from': day}),
+        (SaleHistoryFilter, {'total_min': 1000}),
+        (TransactionFilter, {'type': 'expense', 'date_from': day}),
+        (ReturnItemFilter, {'branch': 'Сокулук', 'date_from': day}),
+        (StockFilter, {'low_stock': 5}),
+        (StockFilter, {'category': 1}),
+    ]
+    for filterset, params in filtersets:
+        queries[f'{filterset.__name__} {params}'] = filterset(params, queryset=filterset.Meta.model.objects.all()).qs
+    for title, qs in queries.items():
+        t0 = time.perf_counter()
+        list(qs)
+        elapsed = (time.perf_counter() - t0) * 1000
+        print(f'\n== {title} ({elapsed:.2f} ms)')
+        print(qs.explain())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Задержка GET по спискам каталога и смен: без кэша ответов и из кэша
+(clients/response_cache.py).
+
+    python bench/response_cache.py --stocks 2000
+    python bench/response_cache.py --backend file      # FileBasedCache
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from _setup import setup_django
+
+ENDPOINTS = [
+    '/clients/categories/',
+    '/clients/stocks/',
+    '/clients/stocks/?category=1',
+    '/clients/stocks/1/',
+    '/clients/cash-sessions/',
+]
+
+
+def seed(stocks, categories, sessions):
+    from datetime import timedelta
+
+    from django.utils.timezone import now
+    from clients.models import CashSession, Category, Stock
+
+    cats = Category.objects.bulk_create([Category(name=f'Категория {i}') for i in range(categories)])
+    Stock.objects.bulk_create([
+        Stock(
+            code=f'48700{i:07d}', name=f'Товар {i}', price=10, quantity=100, fixed_quantity=100,
+            unit='шт', category=cats[i % len(cats)],
+        )
+        for i in range(stocks)
+    ])
+    start = now() - timedelta(days=sessions)
+    CashSession.objects.bulk_create([
+        CashSession(
+            opened_at=start + timedelta(days=i), closed_at=start + timedelta(days=i, hours=12),
+            opening_sum=1000, closing_sum=5000,
+        )
+        for i in range(sessions)
+    ])
+
+
+def measure(client, url, repeat):
+    timings = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        response = client.get(url)
+        timings.append((time.perf_counter() - t0) * 1000)
+        assert response.status_code == 200, (url, response.status_code)
+    return statistics.median(timings), sorted(timings)[int(len(timings) * 0.95) - 1], response
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--stocks', type=int, default=2000)
+    parser.add_argument('--categories', type=int, default=50)
+    parser.add_argument('--sessions', type=int, default=365)
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--backend', choices=['locmem', 'file'], default='locmem')
+    parser.add_argument('--db', default=None)
+    args = parser.parse_args()
+
+    os.environ['CACHE_BACKEND'] = args.backend
+    os.environ.setdefault('CACHE_DIR', tempfile.mkdtemp(prefix='bench-cache-'))
+    db_path = setup_django(args.db)
+    print(f'База: {db_path}, кэш: {args.backend}')
+
+    from django.conf import settings
+    from django.core.cache import cache
+    from rest_framework.test import APIClient
+
+    seed(args.stocks, args.categories, args.sessions)
+    cache.clear()
+    client = APIClient()
+    ttl = settings.RESPONSE_CACHE_TTL or 300
+
+    print(f'{"":>28} {"без кэша, мс":>20} {"из кэша, мс":>20}')
+    for url in ENDPOINTS:
+        settings.RESPONSE_CACHE_TTL = 0
+        cold_median, cold_p95, _ = measure(client, url, args.repeat)
+        settings.RESPONSE_CACHE_TTL = ttl
+        client.get(url)     # прогрев
+        hot_median, hot_p95, response = measure(client, url, args.repeat)
+        assert response.get('X-Response-Cache') == 'hit', url
+        print(
+            f'{url:>28} {cold_median:8.2f} (p95 {cold_p95:6.2f}) {hot_median:8.2f} (p95 {hot_p95:6.2f})'
+            f'  ×{cold_median / hot_median:.1f}'
+        )
+
+
+if __name__ == '__main__':
+    main()
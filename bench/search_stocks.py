@@ -0,0 +1,74 @@
+"""
+Время поиска товара (clients/search.py) на большом каталоге.
+
+    python bench/search_stocks.py --stocks 100000
+"""
+import argparse
+import random
+import statistics
+import time
+
+from _setup import setup_django
+
+WORDS = [
+    'Молоко', 'Кефир', 'Сметана', 'Творог', 'Масло', 'Сыр', 'Хлеб', 'Батон', 'Сахар', 'Соль',
+    'Мука', 'Рис', 'Гречка', 'Макароны', 'Чай', 'Кофе', 'Сок', 'Вода', 'Печенье', 'Конфеты',
+]
+KINDS = ['пастеризованное', 'домашний', 'сливочное', 'отборная', 'зелёный', 'чёрный', 'яблочный', 'газированная']
+QUERIES = ['мол', 'молоко', 'малоко', 'кефр', 'сливочн', 'чай зел', '487000012', '0001234', '4879999', 'батон 12']
+
+
+def seed(count, batch=10000):
+    from clients.models import Stock, StockBarcode
+
+    done = 0
+    while done < count:
+        n = min(batch, count - done)
+        stocks = Stock.objects.bulk_create([
+            Stock(
+                code=f'48700{done + k:07d}',
+                name=f'{random.choice(WORDS)} {random.choice(KINDS)} {random.randint(1, 999)}',
+                price=10, quantity=0, fixed_quantity=0, unit='шт',
+            )
+            for k in range(n)
+        ])
+        StockBarcode.objects.bulk_create([StockBarcode(stock=s, barcode=s.code) for s in stocks])
+        done += n
+        print(f'  {done}/{count}', end='\r', flush=True)
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--stocks', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--db', default=None)
+    args = parser.parse_args()
+
+    db_path = setup_django(args.db)
+    print(f'База: {db_path}')
+
+    from clients.search import rebuild_index, search_stocks
+    from clients.models import Stock
+
+    t0 = time.perf_counter()
+    seed(args.stocks)
+    indexed = rebuild_index()
+    print(f'Заполнено {args.stocks} товаров, проиндексировано {indexed} за {time.perf_counter() - t0:.1f} с')
+
+    for query in QUERIES:
+        timings = []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            ids = search_stocks(query, args.limit)
+            timings.append((time.perf_counter() - t0) * 1000)
+        top = list(Stock.objects.filter(pk__in=ids[:3]).values_list('name', flat=True))
+        print(
+            f'{query!r:>12}: {len(ids):>3} шт, медиана {statistics.median(timings):6.2f} мс, '
+            f'p95 {sorted(timings)[int(len(timings) * 0.95) - 1]:6.2f} мс  {top}'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,6 @@
 from django.contrib import admin
 from .models import (
-    Transaction, Stock, SaleHistory, SaleItem,
+    Transaction, Stock, StockBarcode, StockLevel, SaleHistory, SaleItem,
     Category, StockMovement, ReturnItem, CashSession, DispatchHistory, DispatchItem
 )
 
@@ -18,9 +18,34 @@ class CategoryAdmin(admin.ModelAdmin):
     search_fields = ['name']
 
 
+class StockBarcodeInline(admin.TabularInline):
+    """Только просмотр: штрихкоды синхронизируются из поля code"""
+    model = StockBarcode
+    extra = 0
+    can_delete = False
+    readonly_fields = ['barcode']
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+class StockLevelInline(admin.TabularInline):
+    """Только просмотр: остатки филиалов меняются продажами, возвратами и приходом"""
+    model = StockLevel
+    extra = 0
+    can_delete = False
+    readonly_fields = ['branch', 'quantity']
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(Stock)
 class StockAdmin(admin.ModelAdmin):
     list_display     = ('code', 'name', 'quantity', 'fixed_quantity', 'unit', 'category', 'fixed_quantity')
+    list_select_related = ('category',)
+    search_fields    = ('name', '=barcodes__barcode')
+    inlines          = [StockBarcodeInline, StockLevelInline]
 
 
 class SaleItemInline(admin.TabularInline):
@@ -31,21 +56,23 @@ class SaleItemInline(admin.TabularInline):
 
 @admin.register(SaleHistory)
 class SaleHistoryAdmin(admin.ModelAdmin):
-    list_display = ['id', 'payment_type', 'total', 'date']
-    list_filter = ['payment_type', 'date']
+    list_display = ['id', 'payment_type', 'total', 'branch', 'date']
+    list_filter = ['payment_type', 'branch', 'date']
     inlines = [SaleItemInline]
 
 
 @admin.register(StockMovement)
 class StockMovementAdmin(admin.ModelAdmin):
     list_display = ['stock', 'movement_type', 'quantity', 'comment', 'date']
-    list_filter = ['movement_type', 'date']
+    list_select_related = ['stock']
+    list_filter = ['movement_type', 'branch', 'date']
     search_fields = ['stock__name', 'comment']
 
 
 @admin.register(ReturnItem)
 class ReturnItemAdmin(admin.ModelAdmin):
     list_display = ['sale_item', 'quantity', 'reason', 'date']
+    list_select_related = ['sale_item']
     list_filter = ['date']
     search_fields = ['sale_item__name', 'reason']
 
@@ -68,4 +95,5 @@ class DispatchHistoryAdmin(admin.ModelAdmin):
 
 @admin.register(DispatchItem)
 class DispatchItemAdmin(admin.ModelAdmin):
-    list_display = ['name', 'quantity', 'price', 'total', 'dispatch']
\ No newline at end of file
+    list_display = ['name', 'quantity', 'price', 'total', 'dispatch']
+    list_select_related = ['dispatch']
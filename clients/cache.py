@@ -0,0 +1,115 @@
+"""
+Кэши в памяти процесса.
+
+StockResolverCache — LRU «штрихкод → товар». Хранит только
+идентичность и цену (StockRef), остатки в нём не хранятся никогда:
+наличие товара всегда проверяется в БД.
+Сбрасывается сигналами post_save/post_delete на Stock и StockBarcode
+(см. signals.py) — но только в своём процессе. Чтобы другие воркеры не
+продавали перенесённый штрихкод старому товару:
+- запись живёт не дольше STOCK_RESOLVER_CACHE_TTL секунд;
+- с общим кэшем Django (SHARED_CACHE) кэш очищается целиком, как только
+  меняется версия каталога (catalog.stamp) — её берёт любое изменение
+  товара или штрихкода в любом процессе.
+"""
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+
+
+StockRef = namedtuple('StockRef', ['id', 'name', 'price', 'price_seller', 'unit'])
+
+
+class StockResolverCache:
+    def __init__(self, maxsize, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl                  # секунд; None — без срока
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()      # barcode -> (StockRef, истекает)
+        self._by_stock = {}             # stock_id -> {barcode, …}
+        self._version = None            # версия каталога, при которой заполнялся кэш
+        self._lock = threading.Lock()
+
+    def check_version(self, version):
+        """Версия каталога сменилась (в любом процессе) — всё закэшированное забывается."""
+        with self._lock:
+            if version != self._version:
+                self._data.clear()
+                self._by_stock.clear()
+                self._version = version
+
+    def get_many(self, codes):
+        """Возвращает ({code: StockRef} найденных, [коды-промахи])."""
+        found, missing = {}, []
+        moment = time.monotonic()
+        with self._lock:
+            for code in codes:
+                entry = self._data.get(code)
+                if entry is not None and entry[1] is not None and entry[1] <= moment:
+                    del self._data[code]
+                    self._forget(entry[0].id, code)
+                    entry = None
+                if entry is None:
+                    missing.append(code)
+                    continue
+                self._data.move_to_end(code)
+                found[code] = entry[0]
+            self.hits += len(found)
+            self.misses += len(missing)
+        return found, missing
+
+    def set_many(self, refs):
+        if self.maxsize <= 0:
+            return
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            for code, ref in refs.items():
+                self._data[code] = (ref, expires)
+                self._data.move_to_end(code)
+                self._by_stock.setdefault(ref.id, set()).add(code)
+            while len(self._data) > self.maxsize:
+                code, (ref, _) = self._data.popitem(last=False)
+                self._forget(ref.id, code)
+
+    def invalidate_stock(self, stock_id):
+        with self._lock:
+            for code in self._by_stock.pop(stock_id, ()):
+                self._data.pop(code, None)
+
+    def invalidate_code(self, code):
+        with self._lock:
+            entry = self._data.pop(code, None)
+            if entry is not None:
+                self._forget(entry[0].id, code)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._by_stock.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else None,
+        }
+
+    def _forget(self, stock_id, code):
+        codes = self._by_stock.get(stock_id)
+        if codes is not None:
+            codes.discard(code)
+            if not codes:
+                del self._by_stock[stock_id]
+
+
+stock_resolver_cache = StockResolverCache(
+    getattr(settings, 'STOCK_RESOLVER_CACHE_SIZE', 10000),
+    getattr(settings, 'STOCK_RESOLVER_CACHE_TTL', 60),
+)
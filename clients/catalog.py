@@ -0,0 +1,139 @@
+"""
+Версия каталога: условные GET для /stocks/ и /categories/ и дельта
+GET /stocks/changes/?since=<версия>.
+
+Любое изменение товара или категории получает следующий номер
+CatalogVersion; товар хранит номер своего последнего изменения
+(Stock.version). Об изменениях сообщают сигналы save/delete
+(signals.py) и сами bulk-операции в services.py — они сигналов не шлют.
+
+Номер берётся после коммита, в отдельной короткой транзакции:
+блокировка строки CatalogVersion не держится всю продажу и не
+выстраивает кассы всех филиалов в очередь. Та же блокировка
+гарантирует, что номера видны в порядке их выдачи — дельта ?since=
+ничего не пропускает.
+
+Остатки в версию не входят: продажа, возврат или отправка номер не
+берёт (quantities_changed). Любое такое изменение пишет StockMovement,
+поэтому ETag списка строится из версии и последнего id движения —
+он меняется и после продажи, а новых записей на кассе не добавляется.
+Дельта ?since= — только каталог (названия, цены, штрихкоды, категории);
+остаток в ней — на момент ответа.
+
+Ответ 304 на If-None-Match не трогает таблицы товаров: версия и id
+движения берутся из кэша Django (общий бэкенд) или одним запросом по
+pk (LocMem, CATALOG_STAMP_TTL=0). После выдачи номера кэш сбрасывается,
+а после продаж — нет: изменения остатков собираются за
+CATALOG_STAMP_TTL и видны условному клиенту не позже чем через него.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Subquery
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from . import response_cache
+from .models import CatalogVersion, DeletedStock, Stock, StockMovement
+
+STAMP_KEY = 'catalog:stamp'
+
+
+def _forget_stamp():
+    cache.delete(STAMP_KEY)
+
+
+def _publish(stock_ids, deleted_ids):
+    with transaction.atomic():
+        version = CatalogVersion.bump()
+        if stock_ids:
+            Stock.objects.filter(pk__in=stock_ids).update(version=version)
+        DeletedStock.objects.bulk_create([DeletedStock(stock_id=pk, version=version) for pk in deleted_ids])
+    _forget_stamp()
+
+
+def changed(stock_ids=(), deleted_ids=()):
+    """
+    Отмечает изменение каталога: после коммита текущей транзакции товары
+    stock_ids получают новую версию, deleted_ids записываются удалёнными.
+    Без аргументов — изменились только категории.
+    """
+    stock_ids, deleted_ids = list(stock_ids), list(deleted_ids)
+    # всё, что меняет товары, проходит здесь — и сигналы, и bulk-операции
+    response_cache.invalidate('stock')
+    # robust: сбой здесь не должен превращать уже проведённую продажу в 500
+    transaction.on_commit(lambda: _publish(stock_ids, deleted_ids), robust=True)
+
+
+def quantities_changed():
+    """
+    Изменились только остатки (продажа, возврат, отправка, приход): версия
+    не берётся, сбрасывается лишь кэш ответов. Условных клиентов догонит
+    id движения в stamp().
+    """
+    response_cache.invalidate('stock')
+
+
+def stamp():
+    """
+    (версия, время изменения, id последнего движения) — из кэша, при
+    промахе один запрос: строка CatalogVersion по pk и последнее движение
+    по индексу pk.
+    """
+    value = cache.get(STAMP_KEY)
+    if value is None:
+        last = StockMovement.objects.order_by('-pk')
+        row = (
+            CatalogVersion.objects.filter(pk=1)
+            .annotate(movement=Subquery(last.values('pk')[:1]), moved_at=Subquery(last.values('date')[:1]))
+            .values_list('version', 'updated_at', 'movement', 'moved_at')
+            .first()
+        )
+        if row is None:
+            row = (0, None) + (last.values_list('pk', 'date').first() or (None, None))
+        version, updated_at, movement, moved_at = row
+        value = (version, max(filter(None, (updated_at, moved_at)), default=None), movement or 0)
+        cache.set(STAMP_KEY, value, settings.CATALOG_STAMP_TTL)
+    return value
+
+
+def etag(request, version, movement):
+    # один и тот же список в разных представлениях (?branch=, ?fields=, формат) — разные ETag
+    variant = f"{request.path}?{request.META.get('QUERY_STRING', '')}|{request.META.get('HTTP_ACCEPT', '')}"
+    return '"%s-%s-%s"' % (version, movement, hashlib.md5(variant.encode()).hexdigest()[:12])
+
+
+class CatalogConditionalMixin:
+    """
+    Подмешивается к ViewSet каталога: list() отдаёт ETag, Last-Modified и
+    X-Catalog-Version; If-None-Match / If-Modified-Since → 304 без запроса
+    к таблице. Запросы с параметрами из conditional_skip_params отдаются
+    целиком, без ETag: их ответ зависит не только от версии каталога.
+    """
+    conditional_skip_params = ()
+
+    def conditional(self, request, render):
+        if any(p in request.query_params for p in self.conditional_skip_params):
+            return render(stamp()[0])
+        version, updated_at, movement = stamp()
+        tag = etag(request, version, movement)
+        last_modified = int(updated_at.timestamp()) if updated_at else None
+        response = get_conditional_response(request, etag=tag, last_modified=last_modified)
+        if response is None:
+            response = render(version)
+            if response.status_code != 200:
+                return response
+        response['ETag'] = tag
+        # браузер каждый раз переспрашивает сервер — с If-None-Match
+        patch_cache_control(response, no_cache=True)
+        response['X-Catalog-Version'] = str(version)
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(
+            request, lambda version: super(CatalogConditionalMixin, self).list(request, *args, **kwargs)
+        )
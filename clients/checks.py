@@ -0,0 +1,33 @@
+"""Проверки настроек (python manage.py check)."""
+from django.conf import settings
+from django.core.checks import Warning, register
+
+
+@register()
+def local_memory_cache(app_configs, **kwargs):
+    # LocMem — память одного процесса: сброс по сигналам не дойдёт до других воркеров
+    if settings.CACHES['default']['BACKEND'] != 'django.core.cache.backends.locmem.LocMemCache':
+        return []
+    enabled = [name for name in ('RESPONSE_CACHE_TTL', 'CATALOG_STAMP_TTL') if getattr(settings, name, 0)]
+    if not enabled:
+        return []
+    return [Warning(
+        f'{", ".join(enabled)} > 0 с LocMemCache: при нескольких воркерах они отдают устаревшие данные',
+        hint='CACHE_BACKEND=file (общий кэш) или оставьте 0, если процесс один',
+        id='clients.W001',
+    )]
+
+
+@register()
+def stock_resolver_cache_ttl(app_configs, **kwargs):
+    # без общего кэша другие воркеры узнают о переносе штрихкода только по сроку записи
+    if getattr(settings, 'SHARED_CACHE', False) or not settings.STOCK_RESOLVER_CACHE_SIZE:
+        return []
+    if settings.STOCK_RESOLVER_CACHE_TTL:
+        return []
+    return [Warning(
+        'STOCK_RESOLVER_CACHE_TTL = 0 без общего кэша: при нескольких воркерах перенесённый '
+        'штрихкод продаётся старому товару до перезапуска',
+        hint='задайте STOCK_RESOLVER_CACHE_TTL, CACHE_BACKEND=file или STOCK_RESOLVER_CACHE_SIZE=0',
+        id='clients.W002',
+    )]
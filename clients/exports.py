@@ -0,0 +1,121 @@
+"""
+Потоковая выгрузка списков: ?format=csv или ?format=ndjson.
+
+Строки идут прямо из курсора (.values_list().iterator()), модели и
+сериализаторы не создаются — память не растёт с размером выгрузки.
+"""
+import csv
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.http import StreamingHttpResponse
+from django.utils.timezone import localtime
+from rest_framework.exceptions import NotAcceptable
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.response import Response
+
+EXPORT_CHUNK_SIZE = 2000
+
+
+class CSVStreamRenderer(BaseRenderer):
+    """
+    Только для выбора формата (?format=csv) — ответ строит ExportMixin.
+    Всё остальное (ошибки) ExportMixin.finalize_response отдаёт JSON'ом.
+    """
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, ensure_ascii=False, default=str).encode()
+
+
+class NDJSONStreamRenderer(CSVStreamRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+
+class _Echo:
+    """csv.writer пишет в него, а мы сразу отдаём строку клиенту."""
+    def write(self, value):
+        return value
+
+
+def _plain(value):
+    if isinstance(value, datetime):
+        return localtime(value).isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def stream_rows(rows, columns, fmt, filename):
+    """rows — итератор кортежей в порядке columns."""
+    if fmt == 'csv':
+        writer = csv.writer(_Echo())
+
+        def content():
+            yield '\ufeff' + writer.writerow(columns)  # BOM — чтобы Excel понял UTF-8
+            for row in rows:
+                yield writer.writerow([_plain(v) for v in row])
+        content_type = 'text/csv; charset=utf-8'
+    else:
+        def content():
+            for row in rows:
+                yield json.dumps(dict(zip(columns, map(_plain, row))), ensure_ascii=False) + '\n'
+        content_type = 'application/x-ndjson'
+
+    response = StreamingHttpResponse(content(), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{fmt}"'
+    return response
+
+
+class ExportMixin:
+    """
+    Добавляет к list() выгрузку ?format=csv|ndjson.
+
+    export_fields — [(заголовок, lookup для values_list), …]
+    get_export_queryset() — можно переопределить (например, для построчной
+    выгрузки продаж по позициям).
+    """
+    export_fields = []
+    export_formats = ('csv', 'ndjson')
+
+    def get_renderers(self):
+        return super().get_renderers() + [CSVStreamRenderer(), NDJSONStreamRenderer()]
+
+    def perform_content_negotiation(self, request, force=False):
+        renderer, media_type = super().perform_content_negotiation(request, force)
+        # выгружается только список; retrieve и прочие action — 406, а не JSON под text/csv
+        if not force and self.action != 'list' and isinstance(renderer, CSVStreamRenderer):
+            raise NotAcceptable()
+        return renderer, media_type
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        # ошибка списка (фильтр, права) — обычный JSON с правильным Content-Type
+        if isinstance(response, Response) and isinstance(response.accepted_renderer, CSVStreamRenderer):
+            response.accepted_renderer = JSONRenderer()
+            response.accepted_media_type = JSONRenderer.media_type
+        return response
+
+    def get_export_queryset(self):
+        # фильтры списка (filter_queryset) действуют и на выгрузку
+        return self.filter_queryset(self.get_queryset()).prefetch_related(None)
+
+    def list(self, request, *args, **kwargs):
+        fmt = getattr(request.accepted_renderer, 'format', None)
+        if fmt not in self.export_formats:
+            return super().list(request, *args, **kwargs)
+
+        columns = [header for header, _ in self.export_fields]
+        lookups = [lookup for _, lookup in self.export_fields]
+        rows = (
+            self.get_export_queryset()
+            .values_list(*lookups)
+            .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        )
+        return stream_rows(rows, columns, fmt, self.basename)
@@ -0,0 +1,103 @@
+"""
+Фильтры списков (django-filter): ?movement_type=sale&date_from=2025-07-01 …
+
+Каждый фильтр ложится на индекс модели (см. Meta.indexes в models.py и
+bench/explain_indexes.py). Внешние ключи фильтруются по id (NumberFilter),
+без запроса на проверку существования. Фильтры действуют и на выгрузку
+?format=csv|ndjson (ExportMixin берёт filter_queryset).
+"""
+from datetime import datetime, time, timedelta
+
+from django.db import models
+from django.utils.timezone import make_aware
+from django_filters import rest_framework as filters
+
+from .models import BRANCH_CHOICES, ReturnItem, SaleHistory, Stock, StockMovement, Transaction
+
+
+class DateRangeFilterSet(filters.FilterSet):
+    """date_from / date_to — включительно, по дням в текущем часовом поясе."""
+    date_field = 'date'
+
+    date_from = filters.DateFilter(method='filter_date_from')
+    date_to = filters.DateFilter(method='filter_date_to')
+
+    def _is_datetime(self):
+        return isinstance(self.Meta.model._meta.get_field(self.date_field), models.DateTimeField)
+
+    def filter_date_from(self, queryset, name, value):
+        if self._is_datetime():
+            value = make_aware(datetime.combine(value, time.min))
+        return queryset.filter(**{f'{self.date_field}__gte': value})
+
+    def filter_date_to(self, queryset, name, value):
+        if self._is_datetime():
+            return queryset.filter(
+                **{f'{self.date_field}__lt': make_aware(datetime.combine(value + timedelta(days=1), time.min))}
+            )
+        return queryset.filter(**{f'{self.date_field}__lte': value})
+
+
+class StockMovementFilter(DateRangeFilterSet):
+    # индексы: (stock, date), (movement_type, date), (branch, date), (date), FK sale
+    stock = filters.NumberFilter(field_name='stock_id')
+    sale = filters.NumberFilter(field_name='sale_id')
+    movement_type = filters.ChoiceFilter(choices=StockMovement.MOVEMENT_TYPES)
+    branch = filters.ChoiceFilter(choices=BRANCH_CHOICES)
+
+    class Meta:
+        model = StockMovement
+        fields = ['stock', 'movement_type', 'sale', 'branch']
+
+
+class SaleHistoryFilter(DateRangeFilterSet):
+    # индексы: (payment_type, date), (branch, date), (date), (total)
+    payment_type = filters.ChoiceFilter(choices=SaleHistory._meta.get_field('payment_type').choices)
+    branch = filters.ChoiceFilter(choices=BRANCH_CHOICES)
+    total_min = filters.NumberFilter(field_name='total', lookup_expr='gte')
+    total_max = filters.NumberFilter(field_name='total', lookup_expr='lte')
+
+    class Meta:
+        model = SaleHistory
+        fields = ['payment_type', 'branch']
+
+
+class TransactionFilter(DateRangeFilterSet):
+    # индексы: (type, date), (date)
+    type = filters.ChoiceFilter(choices=Transaction.TRANSACTION_TYPES)
+
+    class Meta:
+        model = Transaction
+        fields = ['type']
+
+
+class ReturnItemFilter(DateRangeFilterSet):
+    # индексы: (branch, date), (date)
+    branch = filters.ChoiceFilter(choices=BRANCH_CHOICES)
+
+    class Meta:
+        model = ReturnItem
+        fields = ['branch']
+
+
+class StockFilter(filters.FilterSet):
+    # индексы: FK category, (quantity)
+    category = filters.NumberFilter(field_name='category_id')
+    low_stock = filters.NumberFilter(method='filter_low_stock')
+    # продано больше, чем было (политика 'allow')
+    oversold = filters.BooleanFilter(method='filter_oversold')
+
+    class Meta:
+        model = Stock
+        fields = ['category']
+
+    def filter_low_stock(self, queryset, name, value):
+        # с ?branch= — по остатку филиала (StockLevel), иначе по общему
+        if 'branch_quantity' in queryset.query.annotations:
+            return queryset.filter(branch_quantity__lte=value)
+        return queryset.filter(quantity__lte=value)
+
+    def filter_oversold(self, queryset, name, value):
+        field = 'branch_quantity' if 'branch_quantity' in queryset.query.annotations else 'quantity'
+        lookup = {f'{field}__lt': 0}
+        return queryset.filter(**lookup) if value else queryset.exclude(**lookup)
@@ -0,0 +1,114 @@
+"""
+Идемпотентные POST: заголовок Idempotency-Key.
+
+Касса на нестабильной связи повторяет запрос с тем же ключом —
+повтор получает сохранённый ответ первого запроса и ничего не пишет
+в базу. Ключ занимается вставкой строки IdempotencyKey (уникальность
+key + path), поэтому из одновременных дублей выполняется только один,
+остальные получают 409 и повторяют позже.
+
+Сохраняются только успешные (2xx) ответы: после ошибки ключ
+освобождается, и запрос можно повторить.
+"""
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils.timezone import now
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+
+
+def fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, cls=JSONEncoder, ensure_ascii=False)
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def purge_expired(ttl=None):
+    """Удаляет ключи старше TTL. Возвращает число удалённых строк."""
+    ttl = settings.IDEMPOTENCY_KEY_TTL if ttl is None else ttl
+    deleted, _ = IdempotencyKey.objects.filter(created_at__lt=now() - timedelta(seconds=ttl)).delete()
+    return deleted
+
+
+def _replay(record, digest):
+    if record.fingerprint != digest:
+        return Response(
+            {'detail': f'{HEADER} уже использован с другим телом запроса'},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    if record.status_code is None:
+        response = Response(
+            {'detail': 'Запрос с этим ключом ещё выполняется'},
+            status=status.HTTP_409_CONFLICT,
+        )
+        response['Retry-After'] = '1'
+        return response
+    response = Response(record.response, status=record.status_code)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _is_stale(record):
+    age = now() - record.created_at
+    if record.status_code is None:
+        return age > timedelta(seconds=settings.IDEMPOTENCY_LOCK_TIMEOUT)
+    return age > timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+
+
+def _claim(key, path, digest):
+    """Занимает ключ. Возвращает (запись, None) или (None, ответ-повтор)."""
+    record = IdempotencyKey.objects.filter(key=key, path=path).first()
+    if record is not None:
+        if not _is_stale(record):
+            return None, _replay(record, digest)
+        # устаревший ответ или брошенный запрос — освобождаем ключ
+        IdempotencyKey.objects.filter(pk=record.pk, created_at=record.created_at).delete()
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(key=key, path=path, fingerprint=digest), None
+    except IntegrityError:
+        # ключ только что занял параллельный дубль
+        return None, _replay(IdempotencyKey.objects.get(key=key, path=path), digest)
+
+
+class IdempotentCreateMixin:
+    """
+    Подмешивается к ViewSet перед ModelViewSet: create() с заголовком
+    Idempotency-Key выполняется не больше одного раза на ключ.
+    """
+
+    def create(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER, '').strip()
+        if not key:
+            return super().create(request, *args, **kwargs)
+        if len(key) > IdempotencyKey._meta.get_field('key').max_length:
+            return Response({'detail': f'{HEADER} слишком длинный'}, status=status.HTTP_400_BAD_REQUEST)
+
+        record, replay = _claim(key, request.path, fingerprint(request))
+        if replay is not None:
+            return replay
+
+        try:
+            # запись и сохранённый ответ — одна транзакция: если процесс умрёт
+            # посередине, откатится и то и другое, и повтор выполнится один раз
+            with transaction.atomic():
+                response = super().create(request, *args, **kwargs)
+                if status.is_success(response.status_code):
+                    record.status_code = response.status_code
+                    record.response = json.loads(json.dumps(response.data, cls=JSONEncoder))
+                    record.save(update_fields=['status_code', 'response'])
+        except BaseException:
+            record.delete()
+            raise
+
+        if not status.is_success(response.status_code):
+            record.delete()
+        return response
@@ -0,0 +1,162 @@
+"""
+Потоковый импорт каталога из CSV/XLSX.
+
+Файл читается построчно генератором, строки проверяются правилами
+StockBulkEntrySerializer и записываются пачками фиксированного размера
+через services.receive_stock — память не зависит от размера файла.
+
+Колонки (первая строка — заголовок):
+    code          штрихкоды через «,» или «;»
+    name, price, price_seller, quantity, unit
+    category_id   или category (название)
+    branch        филиал, куда пришёл товар (необязательно)
+"""
+import codecs
+import csv
+from itertools import islice
+
+from rest_framework import serializers
+
+from .models import Category
+from .serializers import StockBulkEntrySerializer
+from .services import receive_stock
+
+DEFAULT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+
+# ---------- чтение файлов -----------------------------------------------------
+
+def iter_csv(fileobj):
+    reader = csv.reader(codecs.iterdecode(fileobj, 'utf-8-sig'), delimiter=_sniff_delimiter(fileobj))
+    yield from _iter_records(reader)
+
+
+def iter_xlsx(fileobj):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise serializers.ValidationError('Для импорта XLSX нужен пакет openpyxl')
+    workbook = load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        yield from _iter_records(workbook.active.iter_rows(values_only=True))
+    finally:
+        workbook.close()
+
+
+def iter_file(fileobj, filename):
+    """(номер строки, dict) для CSV или XLSX — по расширению файла."""
+    if str(filename).lower().endswith('.xlsx'):
+        return iter_xlsx(fileobj)
+    return iter_csv(fileobj)
+
+
+def _sniff_delimiter(fileobj):
+    # Excel в русской локали сохраняет CSV через «;»
+    head = fileobj.read(4096)
+    fileobj.seek(0)
+    if isinstance(head, bytes):
+        head = head.decode('utf-8', errors='ignore')
+    first_line = head.splitlines()[0] if head else ''
+    return ';' if first_line.count(';') > first_line.count(',') else ','
+
+
+def _iter_records(rows):
+    rows = iter(rows)
+    header = next(rows, None)
+    if header is None:
+        return
+    columns = [str(c or '').strip().lower() for c in header]
+    for line, values in enumerate(rows, start=2):
+        record = {
+            column: value for column, value in zip(columns, values)
+            if column and value not in (None, '')
+        }
+        if record:
+            yield line, record
+
+
+# ---------- импорт ------------------------------------------------------------
+
+def _to_entry(record):
+    """Строка файла → данные для StockBulkEntrySerializer."""
+    entry = {k: v for k, v in record.items() if k in StockBulkEntrySerializer._declared_fields}
+    codes = str(record.get('code', '')).replace(';', ',').split(',')
+    codes = [c.strip() for c in codes if c.strip()]
+    if codes:
+        entry['code'] = codes
+    for field in ('price', 'price_seller', 'quantity'):
+        if isinstance(entry.get(field), str):
+            entry[field] = entry[field].replace(' ', '').replace(',', '.')
+    return entry
+
+
+def _categories_by_name(records):
+    names = {str(r['category']).strip() for r in records if r.get('category') and not r.get('category_id')}
+    if not names:
+        return {}
+    return dict(Category.objects.filter(name__in=names).values_list('name', 'pk'))
+
+
+def _drop_unknown_categories(lines, entries, fail):
+    """Один запрос на пачку: строки с несуществующим category_id отбрасываются."""
+    ids = {e['category_id'] for e in entries if e.get('category_id')}
+    missing = ids - set(Category.objects.filter(pk__in=ids).values_list('pk', flat=True))
+    if not missing:
+        return lines, entries
+    kept_lines, kept_entries = [], []
+    for line, entry in zip(lines, entries):
+        if entry.get('category_id') in missing:
+            fail(line, {'category_id': ['Категория не найдена']})
+        else:
+            kept_lines.append(line)
+            kept_entries.append(entry)
+    return kept_lines, kept_entries
+
+
+def import_stock(records, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    records — итератор (номер строки, dict). Генератор: после каждой пачки
+    отдаёт текущий прогресс {processed, created, updated, errors, error_details}.
+    Каждая пачка — своя транзакция: ошибка в пачке не откатывает предыдущие.
+    """
+    records = iter(records)
+    progress = {'processed': 0, 'created': 0, 'updated': 0, 'errors': 0, 'error_details': []}
+
+    def fail(line, errors):
+        progress['errors'] += 1
+        if len(progress['error_details']) < MAX_REPORTED_ERRORS:
+            progress['error_details'].append({'line': line, 'errors': errors})
+
+    while True:
+        chunk = list(islice(records, batch_size))
+        if not chunk:
+            break
+
+        categories = _categories_by_name(r for _, r in chunk)
+        lines, entries = [], []
+        for line, record in chunk:
+            entry = _to_entry(record)
+            if record.get('category') and not record.get('category_id'):
+                entry['category_id'] = categories.get(str(record['category']).strip())
+                if entry['category_id'] is None:
+                    fail(line, {'category': ['Категория не найдена']})
+                    continue
+            serializer = StockBulkEntrySerializer(data=entry)
+            if serializer.is_valid():
+                lines.append(line)
+                entries.append(serializer.validated_data)
+            else:
+                fail(line, serializer.errors)
+
+        lines, entries = _drop_unknown_categories(lines, entries, fail)
+        if entries:
+            try:
+                for status, _ in receive_stock(entries):
+                    progress[status] += 1
+            except serializers.ValidationError as exc:
+                for line, errors in zip(lines, exc.detail):
+                    fail(line, errors or {'batch': ['Пачка отклонена из-за ошибок в других строках']})
+
+        progress['processed'] += len(chunk)
+        yield progress
@@ -0,0 +1,200 @@
+"""
+Складской журнал: знаковые суммы движений, снимки остатков
+и остаток «на дату» (снимок + движения после него).
+"""
+from datetime import datetime, time
+
+from django.db import connection, transaction
+from django.db.models import (
+    Case, DecimalField, F, Max, OuterRef, Q, Subquery, Sum, Value, When
+)
+from django.db.models.functions import Coalesce
+from django.utils.timezone import is_naive, make_aware, now
+
+from .models import Stock, StockMovement, StockSnapshot
+
+QUANTITY = DecimalField(max_digits=12, decimal_places=2)
+SNAPSHOT_BATCH_SIZE = 2000
+
+
+def signed_quantity(prefix=''):
+    """Выражение: quantity со знаком по типу движения (см. StockMovement.SIGNS)."""
+    return Case(
+        *[
+            When(**{f'{prefix}movement_type': t}, then=F(f'{prefix}quantity') * sign)
+            for t, sign in StockMovement.SIGNS.items()
+        ],
+        default=Value(0),
+        output_field=QUANTITY,
+    )
+
+
+def _movement_sum(**filters):
+    """Коррелированный подзапрос: сумма движений товара OuterRef('pk')."""
+    return Coalesce(
+        Subquery(
+            StockMovement.objects.filter(stock=OuterRef('pk'), **filters)
+            .order_by()
+            .values('stock')
+            .annotate(total=Sum(signed_quantity()))
+            .values('total')[:1],
+            output_field=QUANTITY,
+        ),
+        Value(0),
+        output_field=QUANTITY,
+    )
+
+
+def end_of_day(value):
+    """date → последний момент дня (в текущем часовом поясе); datetime — как есть."""
+    if not isinstance(value, datetime):
+        value = datetime.combine(value, time.max)
+    return make_aware(value) if is_naive(value) else value
+
+
+# ---------- остаток на дату ---------------------------------------------------
+
+def annotate_quantity_as_of(queryset, moment):
+    """
+    Добавляет quantity_as_of — остаток на момент moment.
+
+    Берётся последний снимок до moment и к нему прибавляются движения
+    между снимком и moment. Если снимка нет — от текущего остатка
+    отнимаются движения после moment. Всё считается в SQL коррелированными
+    подзапросами по индексам (stock, taken_at) и (stock, date).
+    """
+    snapshots = StockSnapshot.objects.filter(stock=OuterRef('pk'), taken_at__lte=moment).order_by('-taken_at')
+    queryset = queryset.annotate(
+        snapshot_at=Subquery(snapshots.values('taken_at')[:1]),
+        snapshot_quantity=Subquery(snapshots.values('quantity')[:1], output_field=QUANTITY),
+    )
+    return queryset.annotate(
+        quantity_as_of=Case(
+            When(
+                snapshot_at__isnull=False,
+                then=F('snapshot_quantity') + _movement_sum(
+                    date__gt=OuterRef('snapshot_at'), date__lte=moment
+                ),
+            ),
+            default=F('quantity') - _movement_sum(date__gt=moment),
+            output_field=QUANTITY,
+        )
+    )
+
+
+# ---------- снимки ------------------------------------------------------------
+
+def _lock_stock_writes():
+    """
+    До конца транзакции никто не меняет остатки, а начатые изменения
+    закоммичены. SQLite: transaction_mode IMMEDIATE — блокировка записи
+    взята уже на BEGIN. PostgreSQL: SHARE на таблицу товаров ждёт
+    незавершённые UPDATE и не пускает новые.
+    """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(f'LOCK TABLE {connection.ops.quote_name(Stock._meta.db_table)} IN SHARE MODE')
+
+
+def take_snapshot():
+    """
+    Снимок остатков. Пишутся только товары, у которых были движения после
+    предыдущего снимка, и товары без единого снимка — таблица остаётся
+    компактной, а «ближайший снимок» для остальных просто старше.
+
+    Время снимка берётся после блокировки записи: продажа, закоммиченная
+    до него, уже в остатке и датирована раньше, а следующая — позже, и
+    annotate_quantity_as_of не посчитает её дважды.
+    Возвращает число записанных строк.
+    """
+    with transaction.atomic():
+        _lock_stock_writes()
+        taken_at = now()
+        last = StockSnapshot.objects.aggregate(last=Max('taken_at'))['last']
+        stocks = Stock.objects.all()
+        if last is not None:
+            stocks = stocks.filter(
+                Q(pk__in=StockMovement.objects.filter(date__gt=last).values('stock'))
+                | ~Q(pk__in=StockSnapshot.objects.values('stock'))
+            )
+
+        written = 0
+        batch = []
+        for pk, quantity in stocks.values_list('pk', 'quantity').iterator(chunk_size=SNAPSHOT_BATCH_SIZE):
+            batch.append(StockSnapshot(stock_id=pk, taken_at=taken_at, quantity=quantity))
+            if len(batch) >= SNAPSHOT_BATCH_SIZE:
+                StockSnapshot.objects.bulk_create(batch, ignore_conflicts=True)
+                written += len(batch)
+                batch = []
+        StockSnapshot.objects.bulk_create(batch, ignore_conflicts=True)
+        written += len(batch)
+    return written
+
+
+# ---------- сверка остатков с журналом ---------------------------------------
+
+RECONCILE_CHUNK_SIZE = 5000
+
+
+def reconcile(chunk_size=RECONCILE_CHUNK_SIZE, fix=False):
+    """
+    Сверяет Stock.quantity с журналом движений, пачками по диапазону pk.
+
+    Ожидаемый остаток = fixed_quantity («получено изначально», включает
+    приходы) + знаковая сумма всех движений, кроме 'in'. Движения 'in'
+    отдельно сверяются с fixed_quantity: приходов не может быть больше.
+
+    На пачку — один сгруппированный запрос к StockMovement. При fix=True
+    расхождения закрываются движениями 'adjust' (журнал подтягивается к
+    фактическому остатку). Генератор: отдаёт расхождения по одному.
+    """
+    last_pk = 0
+    while True:
+        with transaction.atomic():
+            stocks = Stock.objects.filter(pk__gt=last_pk).order_by('pk')
+            if fix:
+                stocks = stocks.select_for_update()
+            stocks = list(stocks.values_list('pk', 'name', 'quantity', 'fixed_quantity')[:chunk_size])
+            if not stocks:
+                return
+            last_pk = stocks[-1][0]
+            mismatches = _reconcile_chunk(stocks, fix)
+        yield from mismatches
+
+
+def _reconcile_chunk(stocks, fix):
+    sums = {
+        row['stock']: row
+        for row in StockMovement.objects.filter(stock__gte=stocks[0][0], stock__lte=stocks[-1][0])
+        .order_by().values('stock')
+        .annotate(
+            ledger=Sum(signed_quantity(), filter=~Q(movement_type='in')),
+            received=Sum('quantity', filter=Q(movement_type='in')),
+        )
+    }
+
+    mismatches, adjustments = [], []
+    for pk, name, quantity, fixed_quantity in stocks:
+        row = sums.get(pk, {})
+        fixed_quantity = fixed_quantity or 0
+        received = row.get('received') or 0
+        expected = fixed_quantity + (row.get('ledger') or 0)
+        diff = quantity - expected
+        if not diff and received <= fixed_quantity:
+            continue
+        mismatches.append({
+            'stock': pk,
+            'name': name,
+            'quantity': quantity,
+            'fixed_quantity': fixed_quantity,
+            'received': received,
+            'expected': expected,
+            'diff': diff,
+        })
+        if fix and diff:
+            adjustments.append(StockMovement(
+                stock_id=pk, movement_type='adjust', quantity=diff, comment='Сверка остатков',
+            ))
+
+    StockMovement.objects.bulk_create(adjustments)
+    return mismatches
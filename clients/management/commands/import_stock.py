@@ -0,0 +1,34 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from clients.importers import DEFAULT_BATCH_SIZE, import_stock, iter_file
+
+
+class Command(BaseCommand):
+    help = 'Импорт каталога товаров из CSV/XLSX (построчно, пачками)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='файл .csv или .xlsx')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+
+    def handle(self, *args, path, batch_size, **options):
+        try:
+            fileobj = open(path, 'rb')
+        except OSError as exc:
+            raise CommandError(exc)
+
+        progress = None
+        with fileobj:
+            for progress in import_stock(iter_file(fileobj, path), batch_size=batch_size):
+                self.stdout.write(
+                    f"строк: {progress['processed']}  создано: {progress['created']}  "
+                    f"пополнено: {progress['updated']}  ошибок: {progress['errors']}"
+                )
+
+        if progress is None:
+            self.stdout.write('Файл пуст')
+            return
+        for error in progress['error_details']:
+            self.stderr.write(f"строка {error['line']}: {json.dumps(error['errors'], ensure_ascii=False)}")
+        self.stdout.write(self.style.SUCCESS('Импорт завершён'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from clients.idempotency import purge_expired
+
+
+class Command(BaseCommand):
+    help = 'Удаляет устаревшие ключи Idempotency-Key (запускать ежедневно, например из cron)'
+
+    def handle(self, *args, **options):
+        deleted = purge_expired()
+        self.stdout.write(self.style.SUCCESS(f'Удалено ключей: {deleted}'))
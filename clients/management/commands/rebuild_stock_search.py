@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from clients.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает поисковый индекс товаров (FTS5 в SQLite; в PostgreSQL не нужен)'
+
+    def handle(self, *args, **options):
+        written = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'Проиндексировано товаров: {written}'))
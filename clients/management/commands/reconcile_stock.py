@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from clients.ledger import RECONCILE_CHUNK_SIZE, reconcile
+
+
+class Command(BaseCommand):
+    help = 'Сверка Stock.quantity с журналом движений (--fix — закрыть расхождения движениями adjust)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='записать корректирующие движения')
+        parser.add_argument('--chunk-size', type=int, default=RECONCILE_CHUNK_SIZE)
+
+    def handle(self, *args, fix, chunk_size, **options):
+        count = 0
+        for m in reconcile(chunk_size=chunk_size, fix=fix):
+            count += 1
+            self.stdout.write(
+                f"#{m['stock']} {m['name']}: остаток {m['quantity']}, по журналу {m['expected']} "
+                f"(разница {m['diff']}), приход {m['received']} / получено {m['fixed_quantity']}"
+            )
+
+        if not count:
+            self.stdout.write(self.style.SUCCESS('Расхождений нет'))
+        elif fix:
+            self.stdout.write(self.style.WARNING(f'Расхождений: {count}, исправлено движениями adjust'))
+        else:
+            self.stdout.write(self.style.WARNING(f'Расхождений: {count} (запустите с --fix для исправления)'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from clients.reorder import refresh_demand, reorder_report
+
+
+class Command(BaseCommand):
+    help = 'Досчитывает расход по дням и прогревает отчёт /stocks/reorder/ (запускать из cron, например раз в час)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='пересобрать свёртку за всю историю')
+
+    def handle(self, *args, full, **options):
+        written = refresh_demand(full=full)
+        report = reorder_report()
+        self.stdout.write(self.style.SUCCESS(
+            f'Строк расхода: {written}, к заказу: {report["count"]} товаров'
+        ))
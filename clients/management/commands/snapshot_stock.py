@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from clients.ledger import take_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Снимок остатков для запросов ?as_of= (запускать ежедневно, например из cron)'
+
+    def handle(self, *args, **options):
+        written = take_snapshot()
+        self.stdout.write(self.style.SUCCESS(f'Записано снимков: {written}'))
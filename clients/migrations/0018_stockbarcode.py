@@ -0,0 +1,26 @@
+# Generated by Django 5.1.7 on 2026-10-17 12:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0017_returnitem_branch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockBarcode',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('barcode', models.CharField(max_length=100, unique=True, verbose_name='Штрихкод')),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='barcodes', to='clients.stock')),
+            ],
+            options={
+                'verbose_name': 'Штрихкод',
+                'verbose_name_plural': 'Штрихкоды',
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+from django.db import migrations
+
+
+def split_codes(apps, schema_editor):
+    Stock = apps.get_model('clients', 'Stock')
+    StockBarcode = apps.get_model('clients', 'StockBarcode')
+
+    batch = []
+    for pk, code in Stock.objects.order_by('pk').values_list('pk', 'code').iterator(chunk_size=2000):
+        for barcode in {c.strip() for c in (code or '').split(',') if c.strip()}:
+            batch.append(StockBarcode(stock_id=pk, barcode=barcode))
+        if len(batch) >= 2000:
+            StockBarcode.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    StockBarcode.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def clear_barcodes(apps, schema_editor):
+    apps.get_model('clients', 'StockBarcode').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0018_stockbarcode'),
+    ]
+
+    operations = [
+        migrations.RunPython(split_codes, clear_barcodes),
+    ]
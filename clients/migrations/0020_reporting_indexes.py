@@ -0,0 +1,53 @@
+# Generated by Django 5.1.7 on 2026-10-17 12:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0019_split_stock_codes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dispatchhistory',
+            index=models.Index(fields=['date'], name='dispatch_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='returnitem',
+            index=models.Index(fields=['date'], name='return_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='returnitem',
+            index=models.Index(fields=['branch', 'date'], name='return_branch_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='salehistory',
+            index=models.Index(fields=['date'], name='sale_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='salehistory',
+            index=models.Index(fields=['payment_type', 'date'], name='sale_payment_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['date'], name='movement_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['movement_type', 'date'], name='movement_type_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['stock', 'date'], name='movement_stock_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['date'], name='transaction_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['type', 'date'], name='transaction_type_date_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.7 on 2026-10-17 12:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0020_reporting_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyTransactionTotals',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('type', models.CharField(choices=[('income', 'Доход'), ('expense', 'Расход')], max_length=10)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'verbose_name': 'Итоги дня по транзакциям',
+                'verbose_name_plural': 'Итоги дней по транзакциям',
+                'constraints': [models.UniqueConstraint(fields=('date', 'type'), name='daily_transaction_totals_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+from django.db import migrations
+from django.db.models import Count, Sum
+
+
+def backfill(apps, schema_editor):
+    Transaction = apps.get_model('clients', 'Transaction')
+    DailyTransactionTotals = apps.get_model('clients', 'DailyTransactionTotals')
+
+    rows = (
+        Transaction.objects.values('date', 'type')
+        .annotate(count=Count('id'), amount=Sum('amount'))
+        .order_by()
+    )
+    DailyTransactionTotals.objects.bulk_create(
+        [DailyTransactionTotals(**row) for row in rows],
+        batch_size=1000,
+    )
+
+
+def clear(apps, schema_editor):
+    apps.get_model('clients', 'DailyTransactionTotals').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0021_dailytransactiontotals'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, clear),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.7 on 2026-10-17 12:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0022_backfill_daily_transaction_totals'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesTotals',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('hour', 'Час'), ('day', 'День')], max_length=4)),
+                ('start', models.DateTimeField(verbose_name='Начало периода')),
+                ('payment_type', models.CharField(max_length=50)),
+                ('receipts', models.IntegerField(default=0, verbose_name='Чеков')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Выручка')),
+                ('returns', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Возвраты')),
+            ],
+            options={
+                'verbose_name': 'Итоги продаж',
+                'verbose_name_plural': 'Итоги продаж',
+                'constraints': [models.UniqueConstraint(fields=('period', 'start', 'payment_type'), name='sales_totals_uniq')],
+            },
+        ),
+    ]
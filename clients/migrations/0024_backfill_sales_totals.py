@@ -0,0 +1,55 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import migrations
+from django.utils.timezone import localtime
+
+
+def _starts(moment):
+    hour = localtime(moment).replace(minute=0, second=0, microsecond=0)
+    return {'hour': hour, 'day': hour.replace(hour=0)}
+
+
+def backfill(apps, schema_editor):
+    SaleHistory = apps.get_model('clients', 'SaleHistory')
+    ReturnItem = apps.get_model('clients', 'ReturnItem')
+    SalesTotals = apps.get_model('clients', 'SalesTotals')
+
+    buckets = defaultdict(lambda: {'receipts': 0, 'revenue': Decimal('0'), 'returns': Decimal('0')})
+
+    sales = SaleHistory.objects.values_list('date', 'payment_type', 'total')
+    for date, payment_type, total in sales.iterator(chunk_size=2000):
+        for period, start in _starts(date).items():
+            bucket = buckets[(period, start, payment_type)]
+            bucket['receipts'] += 1
+            bucket['revenue'] += total
+
+    returns = ReturnItem.objects.values_list(
+        'date', 'quantity', 'sale_item__price', 'sale_item__sale__payment_type'
+    )
+    for date, quantity, price, payment_type in returns.iterator(chunk_size=2000):
+        for period, start in _starts(date).items():
+            buckets[(period, start, payment_type)]['returns'] += quantity * price
+
+    SalesTotals.objects.bulk_create(
+        [
+            SalesTotals(period=period, start=start, payment_type=payment_type, **values)
+            for (period, start, payment_type), values in buckets.items()
+        ],
+        batch_size=1000,
+    )
+
+
+def clear(apps, schema_editor):
+    apps.get_model('clients', 'SalesTotals').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0023_salestotals'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, clear),
+    ]
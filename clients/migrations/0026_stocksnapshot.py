@@ -0,0 +1,29 @@
+# Generated by Django 5.1.7 on 2026-10-17 12:35
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0025_stockmovement_backorder'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('taken_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Момент снимка')),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='clients.stock')),
+            ],
+            options={
+                'verbose_name': 'Снимок остатка',
+                'verbose_name_plural': 'Снимки остатков',
+                'constraints': [models.UniqueConstraint(fields=('stock', 'taken_at'), name='stock_snapshot_uniq')],
+            },
+        ),
+    ]
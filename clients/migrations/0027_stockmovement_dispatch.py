@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-17 12:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0026_stocksnapshot'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='stockmovement',
+            name='movement_type',
+            field=models.CharField(choices=[('in', 'Приход'), ('sale', 'Продажа'), ('return', 'Возврат'), ('adjust', 'Коррекция'), ('backorder', 'Под заказ'), ('dispatch', 'Отправка')], max_length=10),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.7 on 2026-10-17 12:39
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0027_stockmovement_dispatch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255)),
+                ('path', models.CharField(max_length=255)),
+                ('fingerprint', models.CharField(max_length=64, verbose_name='Хэш тела запроса')),
+                ('status_code', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('response', models.JSONField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Ключ идемпотентности',
+                'verbose_name_plural': 'Ключи идемпотентности',
+                'constraints': [models.UniqueConstraint(fields=('key', 'path'), name='idempotency_key_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-17 12:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0028_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='salehistory',
+            name='client_uuid',
+            field=models.UUIDField(blank=True, editable=False, null=True, unique=True),
+        ),
+    ]
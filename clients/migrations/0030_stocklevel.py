@@ -0,0 +1,43 @@
+# Generated by Django 5.1.7 on 2026-10-17 12:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0029_salehistory_client_uuid'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dispatchhistory',
+            name='branch',
+            field=models.CharField(choices=[('Сокулук', 'Сокулук'), ('Беловодское', 'Беловодское')], default='Сокулук', max_length=100, verbose_name='Филиал-отправитель'),
+        ),
+        migrations.AddField(
+            model_name='salehistory',
+            name='branch',
+            field=models.CharField(choices=[('Сокулук', 'Сокулук'), ('Беловодское', 'Беловодское')], default='Сокулук', max_length=100, verbose_name='Филиал'),
+        ),
+        migrations.AddField(
+            model_name='stockmovement',
+            name='branch',
+            field=models.CharField(blank=True, choices=[('Сокулук', 'Сокулук'), ('Беловодское', 'Беловодское')], max_length=100, null=True, verbose_name='Филиал'),
+        ),
+        migrations.CreateModel(
+            name='StockLevel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('branch', models.CharField(choices=[('Сокулук', 'Сокулук'), ('Беловодское', 'Беловодское')], max_length=100, verbose_name='Филиал')),
+                ('quantity', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='levels', to='clients.stock')),
+            ],
+            options={
+                'verbose_name': 'Остаток в филиале',
+                'verbose_name_plural': 'Остатки по филиалам',
+                'constraints': [models.UniqueConstraint(fields=('branch', 'stock'), name='stock_level_branch_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+from django.db import migrations
+
+# до разделения по филиалам весь остаток числился в основном филиале
+DEFAULT_BRANCH = 'Сокулук'
+
+
+def backfill(apps, schema_editor):
+    Stock = apps.get_model('clients', 'Stock')
+    StockLevel = apps.get_model('clients', 'StockLevel')
+
+    StockLevel.objects.bulk_create(
+        [
+            StockLevel(stock_id=pk, branch=DEFAULT_BRANCH, quantity=quantity or 0)
+            for pk, quantity in Stock.objects.values_list('pk', 'quantity').iterator(chunk_size=2000)
+        ],
+        batch_size=1000,
+    )
+
+
+def clear(apps, schema_editor):
+    apps.get_model('clients', 'StockLevel').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0030_stocklevel'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, clear),
+    ]
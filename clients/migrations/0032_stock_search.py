@@ -0,0 +1,41 @@
+from django.db import migrations
+
+# см. clients/search.py
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS clients_stock_fts USING fts5(name, codes, tokenize='trigram')",
+    "INSERT INTO clients_stock_fts (rowid, name, codes) "
+    "SELECT id, COALESCE(name, ''), REPLACE(COALESCE(code, ''), ',', ' ') FROM clients_stock",
+]
+SQLITE_BACKWARD = [
+    'DROP TABLE IF EXISTS clients_stock_fts',
+]
+POSTGRES_FORWARD = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS stock_name_trgm_idx ON clients_stock USING gin (name gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS stock_barcode_trgm_idx ON clients_stockbarcode USING gin (barcode gin_trgm_ops)',
+]
+POSTGRES_BACKWARD = [
+    'DROP INDEX IF EXISTS stock_barcode_trgm_idx',
+    'DROP INDEX IF EXISTS stock_name_trgm_idx',
+]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        for sql in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0031_backfill_stock_levels'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            _run({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD}),
+            _run({'sqlite': SQLITE_BACKWARD, 'postgresql': POSTGRES_BACKWARD}),
+        ),
+    ]
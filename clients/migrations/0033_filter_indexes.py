@@ -0,0 +1,21 @@
+# Generated by Django 5.1.7 on 2026-10-17 12:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0032_stock_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='salehistory',
+            index=models.Index(fields=['total'], name='sale_total_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(fields=['quantity'], name='stock_quantity_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.7 on 2026-10-17 12:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0033_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyStockDemand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('quantity', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_demand', to='clients.stock')),
+            ],
+            options={
+                'verbose_name': 'Расход товара за день',
+                'verbose_name_plural': 'Расход товаров по дням',
+                'indexes': [models.Index(fields=['day', 'stock'], name='daily_demand_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('stock', 'day'), name='daily_stock_demand_uniq')],
+            },
+        ),
+    ]
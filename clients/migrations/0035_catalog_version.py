@@ -0,0 +1,47 @@
+# Generated by Django 5.1.7 on 2026-10-17 12:53
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0034_dailystockdemand'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Версия каталога',
+                'verbose_name_plural': 'Версия каталога',
+            },
+        ),
+        migrations.CreateModel(
+            name='DeletedStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stock_id', models.PositiveBigIntegerField()),
+                ('version', models.PositiveBigIntegerField(db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Удалённый товар',
+                'verbose_name_plural': 'Удалённые товары',
+            },
+        ),
+        migrations.AddField(
+            model_name='stock',
+            name='version',
+            field=models.PositiveBigIntegerField(default=0, editable=False, verbose_name='Версия'),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(fields=['version'], name='stock_version_idx'),
+        ),
+    ]
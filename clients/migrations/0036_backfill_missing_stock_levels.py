@@ -0,0 +1,31 @@
+from django.db import migrations
+
+DEFAULT_BRANCH = 'Сокулук'
+
+
+def backfill(apps, schema_editor):
+    # товары, заведённые после 0031 не через приход (админка, API), остались
+    # без строки StockLevel — их остаток числится в основном филиале
+    Stock = apps.get_model('clients', 'Stock')
+    StockLevel = apps.get_model('clients', 'StockLevel')
+
+    StockLevel.objects.bulk_create(
+        [
+            StockLevel(stock_id=pk, branch=DEFAULT_BRANCH, quantity=quantity or 0)
+            for pk, quantity in Stock.objects.filter(levels__isnull=True)
+            .values_list('pk', 'quantity').iterator(chunk_size=2000)
+        ],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0035_catalog_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.7 on 2026-10-17 13:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0036_backfill_missing_stock_levels'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='salehistory',
+            index=models.Index(fields=['branch', 'date'], name='sale_branch_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['branch', 'date'], name='movement_branch_date_idx'),
+        ),
+    ]
@@ -13,6 +13,14 @@ from django.utils.timezone import now
 def current_date():
     return now().date()
 
+
+# филиалы: остатки по каждому — в StockLevel
+BRANCH_CHOICES = [
+    ('Сокулук', 'Сокулук'),
+    ('Беловодское', 'Беловодское'),
+]
+DEFAULT_BRANCH = 'Сокулук'
+
 class Transaction(models.Model):
     TRANSACTION_TYPES = [
         ('income', 'Доход'),
@@ -28,6 +36,30 @@ class Transaction(models.Model):
     def __str__(self):
         return f"{self.get_type_display()} — {self.name}: {self.amount}"
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['date'], name='transaction_date_idx'),
+            models.Index(fields=['type', 'date'], name='transaction_type_date_idx'),
+        ]
+
+
+class DailyTransactionTotals(models.Model):
+    """Свёртка Transaction по дням и типам (см. rollups.py)"""
+    date = models.DateField()
+    type = models.CharField(max_length=10, choices=Transaction.TRANSACTION_TYPES)
+    count = models.PositiveIntegerField(default=0)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.date} {self.type}: {self.count} / {self.amount}"
+
+    class Meta:
+        verbose_name = "Итоги дня по транзакциям"
+        verbose_name_plural = "Итоги дней по транзакциям"
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'type'], name='daily_transaction_totals_uniq'),
+        ]
+
 
 class Category(models.Model):
     """Категория товара"""
@@ -63,18 +95,95 @@ class Stock(models.Model):
         related_name='stocks',
         verbose_name="Категория"
     )
+    # версия каталога последнего изменения (catalog.py, GET /stocks/changes/?since=)
+    version = models.PositiveBigIntegerField(default=0, editable=False, verbose_name="Версия")
 
     def save(self, *args, **kwargs):
         if self.pk is None:
             self.fixed_quantity = self.quantity
         super().save(*args, **kwargs)
 
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'code' in update_fields:
+            self.sync_barcodes()
+
+    @staticmethod
+    def split_codes(code):
+        """'123, 456' → ['123', '456']"""
+        return [c.strip() for c in (code or '').split(',') if c.strip()]
+
+    def barcode_conflicts(self, code=None):
+        """Штрихкоды из code (по умолчанию self.code), уже принадлежащие другим товарам."""
+        codes = self.split_codes(self.code if code is None else code)
+        return list(
+            StockBarcode.objects.filter(barcode__in=codes).exclude(stock_id=self.pk)
+            .order_by('barcode').values_list('barcode', flat=True)
+        )
+
+    def clean(self):
+        # админка: иначе sync_barcodes молча пропустит чужой штрихкод,
+        # а сканер продолжит находить другой товар
+        conflicts = self.barcode_conflicts()
+        if conflicts:
+            raise ValidationError({'code': f'Штрихкоды уже у других товаров: {", ".join(conflicts)}'})
+
+    def sync_barcodes(self):
+        """
+        Приводит таблицу StockBarcode в соответствие с полем code.
+        Чужие штрихкоды пропускаются — их отсекают clean() и StockSerializer.
+        """
+        codes = self.split_codes(self.code)
+        self.barcodes.exclude(barcode__in=codes).delete()
+        StockBarcode.objects.bulk_create(
+            [StockBarcode(stock=self, barcode=c) for c in codes],
+            ignore_conflicts=True,   # штрихкод уже принадлежит другому товару
+        )
+
     def __str__(self):
         return f"{self.code} — {self.name}"
 
     class Meta:
         verbose_name = "Склад"
         verbose_name_plural = "Товары на складе"
+        indexes = [
+            # фильтр «мало на складе» (?low_stock=, filters.StockFilter)
+            models.Index(fields=['quantity'], name='stock_quantity_idx'),
+            # дельта ?since=
+            models.Index(fields=['version'], name='stock_version_idx'),
+        ]
+
+
+class StockBarcode(models.Model):
+    """Отдельный штрихкод товара (у одного товара их может быть несколько)"""
+    stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='barcodes')
+    barcode = models.CharField(max_length=100, unique=True, verbose_name="Штрихкод")
+
+    def __str__(self):
+        return self.barcode
+
+    class Meta:
+        verbose_name = "Штрихкод"
+        verbose_name_plural = "Штрихкоды"
+
+
+class StockLevel(models.Model):
+    """
+    Остаток товара в филиале. Stock.quantity — сумма по всем филиалам;
+    обе величины меняются вместе в services.apply_stock_deltas.
+    """
+    stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='levels')
+    branch = models.CharField(max_length=100, choices=BRANCH_CHOICES, verbose_name='Филиал')
+    quantity = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.branch}: {self.quantity}"
+
+    class Meta:
+        verbose_name = "Остаток в филиале"
+        verbose_name_plural = "Остатки по филиалам"
+        constraints = [
+            models.UniqueConstraint(fields=['branch', 'stock'], name='stock_level_branch_uniq'),
+        ]
 
 
 class SaleHistory(models.Model):
@@ -85,6 +194,11 @@ class SaleHistory(models.Model):
     )
     total = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Итого")
     date = models.DateTimeField(default=now, verbose_name="Дата продажи")
+    branch = models.CharField(
+        max_length=100, choices=BRANCH_CHOICES, default=DEFAULT_BRANCH, verbose_name='Филиал'
+    )
+    # UUID чека, выданный кассой офлайн (sales/sync/) — защита от повторной загрузки
+    client_uuid = models.UUIDField(null=True, blank=True, unique=True, editable=False)
 
     def __str__(self):
         return f"Продажа на {self.total} сом — {self.date.strftime('%d.%m.%Y %H:%M')}"
@@ -92,6 +206,38 @@ class SaleHistory(models.Model):
     class Meta:
         verbose_name = "Продажа"
         verbose_name_plural = "Продажи"
+        indexes = [
+            models.Index(fields=['date'], name='sale_date_idx'),
+            models.Index(fields=['payment_type', 'date'], name='sale_payment_date_idx'),
+            models.Index(fields=['total'], name='sale_total_idx'),
+            # ?branch= (filters.SaleHistoryFilter)
+            models.Index(fields=['branch', 'date'], name='sale_branch_date_idx'),
+        ]
+
+
+class SalesTotals(models.Model):
+    """Свёртка продаж и возвратов по часам и дням (см. rollups.py)"""
+    PERIODS = [
+        ('hour', 'Час'),
+        ('day', 'День'),
+    ]
+
+    period = models.CharField(max_length=4, choices=PERIODS)
+    start = models.DateTimeField(verbose_name="Начало периода")
+    payment_type = models.CharField(max_length=50)
+    receipts = models.IntegerField(default=0, verbose_name="Чеков")
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Выручка")
+    returns = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Возвраты")
+
+    def __str__(self):
+        return f"{self.period} {self.start:%d.%m.%Y %H:%M} {self.payment_type}: {self.revenue}"
+
+    class Meta:
+        verbose_name = "Итоги продаж"
+        verbose_name_plural = "Итоги продаж"
+        constraints = [
+            models.UniqueConstraint(fields=['period', 'start', 'payment_type'], name='sales_totals_uniq'),
+        ]
 
 
 class SaleItem(models.Model):
@@ -112,6 +258,8 @@ class StockMovement(models.Model):
         ('sale', 'Продажа'),
         ('return', 'Возврат'),
         ('adjust', 'Коррекция'),
+        ('backorder', 'Под заказ'),
+        ('dispatch', 'Отправка'),
     ]
 
     stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='movements')
@@ -127,6 +275,19 @@ class StockMovement(models.Model):
         blank=True,
         related_name='stock_movements'
     )
+    branch = models.CharField(
+        max_length=100, choices=BRANCH_CHOICES, blank=True, null=True, verbose_name='Филиал'
+    )
+
+    # знак движения для остатка; 'adjust' хранит уже знаковую величину
+    SIGNS = {
+        'in': 1,
+        'sale': -1,
+        'return': 1,
+        'adjust': 1,
+        'backorder': 1,
+        'dispatch': -1,
+    }
 
     def __str__(self):
         return f"{self.get_movement_type_display()} {self.quantity} {self.stock.unit} — {self.stock.name}"
@@ -134,14 +295,58 @@ class StockMovement(models.Model):
     class Meta:
         verbose_name = "Движение по складу"
         verbose_name_plural = "Движения по складу"
+        indexes = [
+            models.Index(fields=['date'], name='movement_date_idx'),
+            models.Index(fields=['movement_type', 'date'], name='movement_type_date_idx'),
+            models.Index(fields=['stock', 'date'], name='movement_stock_date_idx'),
+            # ?branch= (filters.StockMovementFilter)
+            models.Index(fields=['branch', 'date'], name='movement_branch_date_idx'),
+        ]
 
 
 
+class DailyStockDemand(models.Model):
+    """
+    Свёртка расхода товара по дням: продажи и отправки минус возвраты
+    (см. reorder.py). Обновляется инкрементально командой refresh_reorder.
+    """
+    stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='daily_demand')
+    day = models.DateField()
+    quantity = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.day} #{self.stock_id}: {self.quantity}"
+
+    class Meta:
+        verbose_name = "Расход товара за день"
+        verbose_name_plural = "Расход товаров по дням"
+        constraints = [
+            models.UniqueConstraint(fields=['stock', 'day'], name='daily_stock_demand_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['day', 'stock'], name='daily_demand_day_idx'),
+        ]
+
+
+class StockSnapshot(models.Model):
+    """Остаток товара на момент снимка (ежедневно / при закрытии смены)"""
+    stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='snapshots')
+    taken_at = models.DateTimeField(default=now, verbose_name="Момент снимка")
+    quantity = models.DecimalField(max_digits=10, decimal_places=2)
+
+    def __str__(self):
+        return f"{self.stock_id} @ {self.taken_at:%d.%m.%Y %H:%M}: {self.quantity}"
+
+    class Meta:
+        verbose_name = "Снимок остатка"
+        verbose_name_plural = "Снимки остатков"
+        constraints = [
+            models.UniqueConstraint(fields=['stock', 'taken_at'], name='stock_snapshot_uniq'),
+        ]
+
+
 class ReturnItem(models.Model):
-    BRANCH_CHOICES = [
-        ('Сокулук', 'Сокулук'),
-        ('Беловодское', 'Беловодское'),
-    ]
+    BRANCH_CHOICES = BRANCH_CHOICES
 
     sale_item = models.ForeignKey(
         'SaleItem',
@@ -164,6 +369,10 @@ class ReturnItem(models.Model):
     class Meta:
         verbose_name = "Возврат позиции"
         verbose_name_plural = "Возвраты позиций"
+        indexes = [
+            models.Index(fields=['date'], name='return_date_idx'),
+            models.Index(fields=['branch', 'date'], name='return_branch_date_idx'),
+        ]
         
 class CashSession(models.Model):
     opened_at   = models.DateTimeField(default=now, editable=False)
@@ -206,6 +415,10 @@ class DispatchHistory(models.Model):
     comment = models.TextField(blank=True, null=True, verbose_name="Комментарий")
     total = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Итого", default=0)
     date = models.DateTimeField(default=now, verbose_name="Дата и время отправки")
+    branch = models.CharField(
+        max_length=100, choices=BRANCH_CHOICES, default=DEFAULT_BRANCH,
+        verbose_name='Филиал-отправитель'
+    )
 
     def __str__(self):
         return f"Отправка на {self.total} сом — {self.date.strftime('%d.%m.%Y %H:%M')}"
@@ -213,6 +426,9 @@ class DispatchHistory(models.Model):
     class Meta:
         verbose_name = "Отправка"
         verbose_name_plural = "История отправок"
+        indexes = [
+            models.Index(fields=['date'], name='dispatch_date_idx'),
+        ]
 
 
 
@@ -230,4 +446,68 @@ class DispatchItem(models.Model):
 
     class Meta:
         verbose_name = "Отправленный товар"
-        verbose_name_plural = "Отправленные товары"
\ No newline at end of file
+        verbose_name_plural = "Отправленные товары"
+
+class IdempotencyKey(models.Model):
+    """
+    Ответ на POST с заголовком Idempotency-Key (см. idempotency.py).
+    status_code = NULL — запрос ещё выполняется.
+    """
+    key = models.CharField(max_length=255)
+    path = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64, verbose_name="Хэш тела запроса")
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(default=now, db_index=True)
+
+    def __str__(self):
+        return f"{self.path} {self.key}"
+
+    class Meta:
+        verbose_name = "Ключ идемпотентности"
+        verbose_name_plural = "Ключи идемпотентности"
+        constraints = [
+            models.UniqueConstraint(fields=['key', 'path'], name='idempotency_key_uniq'),
+        ]
+
+
+class CatalogVersion(models.Model):
+    """
+    Версия каталога (товары и категории) — единственная строка pk=1.
+    Растёт на каждое изменение; по ней строятся ETag / Last-Modified
+    (см. catalog.py).
+    """
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(default=now)
+
+    @classmethod
+    def bump(cls):
+        """
+        Следующий номер версии. UPDATE держит блокировку строки до конца
+        транзакции, поэтому номера видны в порядке коммитов — вызывать в
+        короткой отдельной транзакции (catalog.changed).
+        """
+        stamp = now()
+        if not cls.objects.filter(pk=1).update(version=F('version') + 1, updated_at=stamp):
+            cls.objects.create(pk=1, version=1, updated_at=stamp)
+        return cls.objects.values_list('version', flat=True).get(pk=1)
+
+    def __str__(self):
+        return f"v{self.version}"
+
+    class Meta:
+        verbose_name = "Версия каталога"
+        verbose_name_plural = "Версия каталога"
+
+
+class DeletedStock(models.Model):
+    """Удалённый товар — чтобы дельта ?since= сообщила о нём кассам."""
+    stock_id = models.PositiveBigIntegerField()
+    version = models.PositiveBigIntegerField(db_index=True)
+
+    def __str__(self):
+        return f"#{self.stock_id} (v{self.version})"
+
+    class Meta:
+        verbose_name = "Удалённый товар"
+        verbose_name_plural = "Удалённые товары"
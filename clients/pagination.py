@@ -0,0 +1,14 @@
+from rest_framework.pagination import CursorPagination
+
+
+class DateCursorPagination(CursorPagination):
+    """
+    Keyset-пагинация по дате: WHERE (date, id) < курсор ORDER BY -date, -id.
+    Стоимость страницы не зависит от её номера.
+      ?page_size=…  — размер страницы (не больше max_page_size)
+      ?cursor=…     — берётся из next/previous ответа
+    """
+    ordering = ('-date', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
@@ -0,0 +1,39 @@
+"""
+Сжатые тела запросов: Content-Encoding: gzip | deflate.
+
+Кассы копят офлайн-чеки и отправляют их пачкой (POST /sales/sync/);
+JSON с повторяющимися ключами сжимается в разы.
+"""
+import io
+import zlib
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+
+# предел распакованного тела — защита от «zip-бомбы»
+MAX_DECOMPRESSED_SIZE = 50 * 1024 * 1024
+
+
+class CompressedJSONParser(JSONParser):
+    """JSON как есть или сжатый gzip/deflate (по заголовку Content-Encoding)."""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = (parser_context or {}).get('request')
+        encoding = request.META.get('HTTP_CONTENT_ENCODING', '').strip().lower() if request else ''
+        if encoding in ('gzip', 'deflate'):
+            stream = io.BytesIO(self.decompress(stream.read()))
+        elif encoding not in ('', 'identity'):
+            raise ParseError(f'Неподдерживаемый Content-Encoding: {encoding}')
+        return super().parse(stream, media_type, parser_context)
+
+    @staticmethod
+    def decompress(raw):
+        # wbits=47: zlib сам определяет заголовок gzip или zlib
+        decompressor = zlib.decompressobj(wbits=47)
+        try:
+            data = decompressor.decompress(raw, MAX_DECOMPRESSED_SIZE)
+        except zlib.error as exc:
+            raise ParseError(f'Не удалось распаковать тело запроса: {exc}')
+        if decompressor.unconsumed_tail:
+            raise ParseError('Распакованное тело запроса слишком большое')
+        return data
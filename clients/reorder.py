@@ -0,0 +1,155 @@
+"""
+Точка перезаказа: GET /stocks/reorder/ и команда refresh_reorder.
+
+Расход по дням (продажи + отправки − возвраты) сворачивается в
+DailyStockDemand. Обновление инкрементальное: пересчитываются только
+дни, начиная с последнего уже свёрнутого (он мог быть неполным), —
+один сгруппированный запрос к StockMovement по индексу (type, date).
+
+Отчёт: скорость = расход за окно / дни окна, дней запаса = остаток /
+скорость. Товары, которым хватит меньше чем на порог дней, — к заказу.
+Результат кэшируется; обновление свёртки сбрасывает кэш.
+"""
+from datetime import datetime, time, timedelta
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Max, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.utils.timezone import localdate, make_aware, now
+
+from .models import DailyStockDemand, Stock, StockMovement
+
+# знак движения для расхода: возврат уменьшает спрос
+DEMAND_SIGNS = {'sale': 1, 'dispatch': 1, 'return': -1}
+QUANTITY = DecimalField(max_digits=12, decimal_places=2)
+REORDER_KEY = 'stock_reorder:{version}:{window}:{threshold}:{all}'
+VERSION_KEY = 'stock_reorder:version'
+
+
+# ---------- свёртка расхода ---------------------------------------------------
+
+def refresh_demand(full=False):
+    """
+    Досчитывает DailyStockDemand по новым движениям.
+    full=True — пересобрать всю историю (REORDER_HISTORY_DAYS).
+    Возвращает число записанных строк.
+    """
+    today = localdate()
+    oldest = today - timedelta(days=settings.REORDER_HISTORY_DAYS)
+    with transaction.atomic():
+        last = None if full else DailyStockDemand.objects.aggregate(last=Max('day'))['last']
+        since = max(last or oldest, oldest)
+
+        rows = (
+            StockMovement.objects
+            .filter(movement_type__in=DEMAND_SIGNS, date__gte=make_aware(datetime.combine(since, time.min)))
+            .annotate(day=TruncDate('date'))
+            .values('stock', 'day')
+            .annotate(quantity=Sum(Case(
+                *[When(movement_type=t, then=F('quantity') * sign) for t, sign in DEMAND_SIGNS.items()],
+                default=Value(0),
+                output_field=QUANTITY,
+            )))
+            .order_by()
+        )
+        demand = [
+            DailyStockDemand(stock_id=row['stock'], day=row['day'], quantity=row['quantity'])
+            for row in rows
+        ]
+        DailyStockDemand.objects.filter(day__gte=since).delete()
+        DailyStockDemand.objects.filter(day__lt=oldest).delete()
+        # upsert: два запроса отчёта на промахе кэша могут досчитывать
+        # одновременно — вставка того же (stock, day) не должна падать
+        DailyStockDemand.objects.bulk_create(
+            demand, batch_size=2000,
+            update_conflicts=True, unique_fields=['stock', 'day'], update_fields=['quantity'],
+        )
+        transaction.on_commit(invalidate_report)
+    return len(demand)
+
+
+def invalidate_report():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 2, None)
+
+
+# ---------- отчёт -------------------------------------------------------------
+
+def _round(value, places='0.01'):
+    return value.quantize(Decimal(places), rounding=ROUND_HALF_UP)
+
+
+def build_report(window, threshold, include_all=False):
+    today = localdate()
+    start = today - timedelta(days=window - 1)
+
+    # один сгруппированный запрос по свёртке (индекс day, stock)
+    sold = {
+        row['stock']: row
+        for row in DailyStockDemand.objects.filter(day__gte=start, day__lte=today)
+        .values('stock', 'stock__name', 'stock__unit', 'stock__quantity')
+        .annotate(sold=Sum('quantity'))
+        .order_by()
+    }
+    # закончившиеся товары без продаж за окно — тоже к заказу (индекс quantity)
+    empty = Stock.objects.filter(quantity__lte=0).exclude(pk__in=sold).values_list('pk', 'name', 'unit', 'quantity')
+
+    items = []
+    for row in sold.values():
+        quantity, total = row['stock__quantity'], row['sold']
+        velocity = total / window if total > 0 else Decimal('0')
+        if quantity <= 0:
+            cover = Decimal('0')
+        elif velocity > 0:
+            cover = quantity / velocity
+        else:
+            cover = None
+        items.append({
+            'stock': row['stock'],
+            'name': row['stock__name'],
+            'unit': row['stock__unit'],
+            'quantity': quantity,
+            'sold': _round(total),
+            'velocity': _round(velocity),
+            'days_of_cover': None if cover is None else _round(cover, '0.1'),
+            'reorder': cover is not None and cover < threshold,
+        })
+    for pk, name, unit, quantity in empty:
+        items.append({
+            'stock': pk, 'name': name, 'unit': unit, 'quantity': quantity,
+            'sold': _round(Decimal('0')), 'velocity': _round(Decimal('0')),
+            'days_of_cover': _round(Decimal('0'), '0.1'), 'reorder': True,
+        })
+
+    if not include_all:
+        items = [item for item in items if item['reorder']]
+    items.sort(key=lambda i: (i['days_of_cover'] is None, i['days_of_cover'] or 0, -i['velocity']))
+    return {
+        'generated_at': now(),
+        'window_days': window,
+        'threshold_days': threshold,
+        'count': len(items),
+        'items': items,
+    }
+
+
+def reorder_report(window=None, threshold=None, include_all=False):
+    """Отчёт из кэша; при промахе свёртка досчитывается и отчёт строится заново."""
+    window = window or settings.REORDER_WINDOW_DAYS
+    threshold = settings.REORDER_MIN_DAYS_OF_COVER if threshold is None else threshold
+    version = cache.get_or_set(VERSION_KEY, 1, None)
+    key = REORDER_KEY.format(version=version, window=window, threshold=threshold, all=int(include_all))
+    report = cache.get(key)
+    if report is None:
+        refresh_demand()
+        report = build_report(window, threshold, include_all)
+        # refresh_demand сменил версию — кладём под новую
+        version = cache.get_or_set(VERSION_KEY, 1, None)
+        key = REORDER_KEY.format(version=version, window=window, threshold=threshold, all=int(include_all))
+        cache.set(key, report, settings.REORDER_CACHE_TTL)
+    return report
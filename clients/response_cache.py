@@ -0,0 +1,108 @@
+"""
+Кэш ответов GET для того, что читают намного чаще, чем меняют:
+категории, товары, кассовые смены (list и retrieve).
+
+Ответ хранится уже отрисованным (байты JSON) в кэше Django под ключом
+respcache:<область>:<поколение>:<хэш пути, параметров и формата> —
+повторный запрос не трогает ни базу, ни сериализатор, ни рендерер.
+
+Изменение модели сдвигает поколение своей области: сигналы
+(signals.py), а bulk-операции склада — через catalog.changed() и
+catalog.quantities_changed().
+Старые записи больше не читаются и уходят по RESPONSE_CACHE_TTL.
+Поколение сдвигается сразу и ещё раз после коммита: ответ, который
+параллельный запрос посчитал по незакоммиченному состоянию, под
+актуальным ключом не останется.
+
+Нужны только get/set/add/incr — подходит любой бэкенд кэша. LocMem
+живёт в памяти одного процесса: при нескольких воркерах сброс виден
+только своему, поэтому там нужен общий бэкенд (CACHE_BACKEND=file).
+"""
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from rest_framework.response import Response
+
+GENERATION_KEY = 'respcache:{scope}:gen'
+RESPONSE_KEY = 'respcache:{scope}:{generation}:{variant}'
+HEADER = 'X-Response-Cache'
+
+
+def _generation(scope):
+    key = GENERATION_KEY.format(scope=scope)
+    generation = cache.get(key)
+    if generation is None:
+        # не с 1: после вытеснения ключа старые записи не должны ожить
+        cache.add(key, time.time_ns(), None)
+        generation = cache.get(key)
+    return generation
+
+
+def _bump(scope):
+    key = GENERATION_KEY.format(scope=scope)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
+
+
+def invalidate(*scopes):
+    """Сбрасывает закэшированные ответы областей (scope ViewSet'а)."""
+    for scope in scopes:
+        _bump(scope)
+    transaction.on_commit(lambda: [_bump(scope) for scope in scopes])
+
+
+class ResponseCacheMixin:
+    """
+    Подмешивается к ViewSet: list() и retrieve() отдаются из кэша.
+    cache_scope — область для invalidate(); запросы с параметрами из
+    cache_skip_params не кэшируются.
+    """
+    cache_scope = None
+    cache_skip_params = ()
+
+    def response_cache_key(self, request):
+        if not settings.RESPONSE_CACHE_TTL or any(p in request.query_params for p in self.cache_skip_params):
+            return None
+        generation = _generation(self.cache_scope)
+        if generation is None:
+            return None
+        params = urlencode(sorted(request.query_params.lists()), doseq=True)
+        variant = f'{request.path}?{params}|{request.accepted_media_type}'
+        return RESPONSE_KEY.format(
+            scope=self.cache_scope, generation=generation, variant=hashlib.md5(variant.encode()).hexdigest()
+        )
+
+    def cached(self, request, render):
+        key = self.response_cache_key(request)
+        if key is not None:
+            hit = cache.get(key)
+            if hit is not None:
+                content_type, content = hit
+                response = HttpResponse(content, content_type=content_type)
+                response[HEADER] = 'hit'
+                return response
+            # промах: ответ сохранит finalize_response, когда он будет отрисован
+            self._response_cache_key = key
+        return render()
+
+    def list(self, request, *args, **kwargs):
+        return self.cached(request, lambda: super(ResponseCacheMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached(request, lambda: super(ResponseCacheMixin, self).retrieve(request, *args, **kwargs))
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        key = getattr(self, '_response_cache_key', None)
+        if key is not None and isinstance(response, Response) and response.status_code == 200:
+            response.render()
+            cache.set(key, (response['Content-Type'], response.content), settings.RESPONSE_CACHE_TTL)
+            response[HEADER] = 'miss'
+        return response
@@ -0,0 +1,211 @@
+"""
+Предварительно агрегированные итоги (rollup-таблицы).
+
+Итоги обновляются инкрементально в той же транзакции, что и запись
+исходных строк, поэтому отчёты читают несколько сотен строк свёртки
+вместо сканирования всей истории.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DecimalField, F, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils.timezone import localtime, make_aware, now
+
+from .models import DailyTransactionTotals, SalesTotals, Transaction
+
+
+# ---------- транзакции --------------------------------------------------------
+
+TRANSACTION_SUMMARY_KEY = 'transaction_summary:{date}'
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+
+
+def _as_date(value):
+    return Transaction._meta.get_field('date').to_python(value)
+
+
+def _increment(model, lookup, **deltas):
+    """UPDATE … SET f = f + delta; если строки ещё нет — INSERT."""
+    if model.objects.filter(**lookup).update(**{f: F(f) + d for f, d in deltas.items()}):
+        return
+    # строку мог только что создать параллельный запрос
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **deltas)
+    except IntegrityError:
+        model.objects.filter(**lookup).update(**{f: F(f) + d for f, d in deltas.items()})
+
+
+def add_transactions(transactions):
+    """
+    Инкрементально добавляет транзакции в DailyTransactionTotals:
+    один UPDATE (или INSERT) на каждую пару (дата, тип).
+    """
+    buckets = defaultdict(lambda: [0, Decimal('0')])
+    for t in transactions:
+        bucket = buckets[(_as_date(t.date), t.type)]
+        bucket[0] += 1
+        bucket[1] += Decimal(t.amount)
+
+    with transaction.atomic():
+        for (date, type_), (count, amount) in buckets.items():
+            _increment(DailyTransactionTotals, {'date': date, 'type': type_}, count=count, amount=amount)
+        transaction.on_commit(invalidate_transaction_summary)
+
+
+def rebuild_transaction_totals(keys):
+    """
+    Пересчитывает указанные пары (дата, тип) из Transaction целиком —
+    для изменений и удалений, где инкремент неизвестен.
+    """
+    keys = {(_as_date(d), t) for d, t in keys}
+    if not keys:
+        return
+    with transaction.atomic():
+        dates = {d for d, _ in keys}
+        actual = {
+            (row['date'], row['type']): row
+            for row in Transaction.objects.filter(date__in=dates)
+            .values('date', 'type').annotate(count=Count('id'), amount=Sum('amount'))
+        }
+        for date, type_ in keys:
+            row = actual.get((date, type_))
+            if row is None:
+                DailyTransactionTotals.objects.filter(date=date, type=type_).delete()
+            else:
+                DailyTransactionTotals.objects.update_or_create(
+                    date=date, type=type_,
+                    defaults={'count': row['count'], 'amount': row['amount']},
+                )
+        transaction.on_commit(invalidate_transaction_summary)
+
+
+def invalidate_transaction_summary():
+    cache.delete(TRANSACTION_SUMMARY_KEY.format(date=now().date()))
+
+
+def transaction_summary(ttl):
+    """
+    Сводка для дашборда: один запрос с условной агрегацией по свёртке,
+    результат кэшируется на ttl секунд.
+    """
+    today = now().date()
+    key = TRANSACTION_SUMMARY_KEY.format(date=today)
+    summary = cache.get(key)
+    if summary is not None:
+        return summary
+
+    totals = DailyTransactionTotals.objects.filter(date__gte=today.replace(day=1)).aggregate(
+        added_today=Sum('count', filter=Q(date=today)),
+        daily_expense=Sum('amount', filter=Q(date=today, type='expense'), output_field=MONEY),
+        monthly_expense=Sum('amount', filter=Q(type='expense'), output_field=MONEY),
+    )
+    summary = {
+        "month": {"added_today": totals['added_today'] or 0},
+        "daily_expense": totals['daily_expense'] or 0,
+        "monthly_expense": totals['monthly_expense'] or 0,
+    }
+    cache.set(key, summary, ttl)
+    return summary
+
+
+# ---------- продажи -----------------------------------------------------------
+
+def _period_starts(moment):
+    """Начало часа и дня (в текущем часовом поясе) для момента продажи."""
+    local = localtime(moment)
+    hour = local.replace(minute=0, second=0, microsecond=0)
+    return {'hour': hour, 'day': hour.replace(hour=0)}
+
+
+def _add_sales_buckets(buckets):
+    """buckets: {(moment, payment_type): {'receipts': …, 'revenue': …, 'returns': …}}"""
+    merged = defaultdict(lambda: defaultdict(int))
+    for (moment, payment_type), deltas in buckets.items():
+        for period, start in _period_starts(moment).items():
+            bucket = merged[(period, start, payment_type)]
+            for field, value in deltas.items():
+                bucket[field] += value
+
+    with transaction.atomic():
+        for (period, start, payment_type), deltas in merged.items():
+            _increment(
+                SalesTotals,
+                {'period': period, 'start': start, 'payment_type': payment_type},
+                **deltas,
+            )
+
+
+def add_sales(sales, sign=1):
+    """Продажи → +чек и +выручка в часовой и дневной строке (sign=-1 — откат)."""
+    buckets = defaultdict(lambda: defaultdict(int))
+    for sale in sales:
+        bucket = buckets[(sale.date, sale.payment_type)]
+        bucket['receipts'] += sign
+        bucket['revenue'] += sign * Decimal(sale.total)
+    _add_sales_buckets(buckets)
+
+
+def add_returns(return_items, sign=1, payment_type=None):
+    """
+    Возвраты → +returns в периоде возврата, по типу оплаты исходной продажи
+    (sign=-1 — откат). У ReturnItem должны быть подгружены sale_item и
+    sale_item.sale; payment_type — взять вместо типа оплаты продажи.
+    """
+    buckets = defaultdict(lambda: defaultdict(int))
+    for item in return_items:
+        bucket = buckets[(item.date, payment_type or item.sale_item.sale.payment_type)]
+        bucket['returns'] += sign * Decimal(item.quantity) * Decimal(item.sale_item.price)
+    _add_sales_buckets(buckets)
+
+
+def sales_stats(date_from, date_to, group):
+    """
+    Выручка, чеки, средний чек и разбивка нал/карта за период.
+    group: 'hour' | 'day' | 'month'. Читает только строки SalesTotals.
+    """
+    period = 'hour' if group == 'hour' else 'day'
+    # границы — datetime, чтобы фильтр шёл по индексу (period, start, …)
+    start = make_aware(datetime.combine(date_from, time.min))
+    end = make_aware(datetime.combine(date_to + timedelta(days=1), time.min))
+    qs = SalesTotals.objects.filter(period=period, start__gte=start, start__lt=end)
+    if group == 'month':
+        qs = qs.annotate(bucket=TruncMonth('start'))
+    else:
+        qs = qs.annotate(bucket=F('start'))
+
+    rows = (
+        qs.values('bucket', 'payment_type')
+        .annotate(receipts=Sum('receipts'), revenue=Sum('revenue'), returns=Sum('returns'))
+        .order_by('bucket', 'payment_type')
+    )
+
+    result = {}
+    for row in rows:
+        entry = result.setdefault(row['bucket'], {
+            'period': row['bucket'],
+            'receipts': 0,
+            'revenue': Decimal('0'),
+            'returns': Decimal('0'),
+            'by_payment_type': {},
+        })
+        entry['receipts'] += row['receipts']
+        entry['revenue'] += row['revenue']
+        entry['returns'] += row['returns']
+        entry['by_payment_type'][row['payment_type']] = {
+            'receipts': row['receipts'],
+            'revenue': row['revenue'],
+            'returns': row['returns'],
+        }
+
+    for entry in result.values():
+        entry['net'] = entry['revenue'] - entry['returns']
+        entry['average_receipt'] = (
+            (entry['revenue'] / entry['receipts']).quantize(Decimal('0.01'))
+            if entry['receipts'] else Decimal('0')
+        )
+    return list(result.values())
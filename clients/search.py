@@ -0,0 +1,199 @@
+"""
+Поиск товара по названию и штрихкодам: GET /stocks/?search=молоко
+
+SQLite — FTS5-таблица clients_stock_fts с токенизатором trigram
+(rowid = Stock.id). Её держат в актуальном состоянии сигналы Stock
+(signals.py) и явный index_stocks() после bulk-операций (services.py).
+PostgreSQL — расширение pg_trgm и GIN-индексы по Stock.name и
+StockBarcode.barcode: их обновляет сама база.
+
+Порядок поиска в SQLite, каждый следующий шаг — только если не хватило:
+1. похоже на штрихкод — префикс по уникальному индексу StockBarcode
+2. все слова запроса как подстроки (фразы FTS5) — без сортировки по bm25
+3. опечатки (кроме штрихкодов): любые триграммы запроса, ранжирование
+   bm25 и долей совпавших
+Префиксные и точные совпадения идут первыми.
+
+queryset — уже отфильтрованный список (категория, филиал, остаток):
+ограничение входит в каждый шаг до LIMIT, иначе фильтры после поиска
+оставили бы выдачу пустой или короче limit при наличии совпадений.
+"""
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+
+from .models import Stock, StockBarcode
+
+FTS_TABLE = 'clients_stock_fts'
+# сколько кандидатов FTS5 на одно место в выдаче проверяем на сходство
+CANDIDATES_FACTOR = 5
+
+
+def trigrams(text):
+    text = ' '.join(str(text).lower().split())
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def search_stocks(query, limit=None, queryset=None):
+    """id товаров из queryset (по умолчанию — все), лучшие совпадения первыми (не больше limit)."""
+    query = ' '.join(str(query).split())
+    if not query:
+        return []
+    limit = limit or settings.STOCK_SEARCH_LIMIT
+    if queryset is not None and not queryset.query.where:
+        queryset = None     # без фильтров — без лишнего подзапроса
+    if connection.vendor == 'sqlite':
+        return _search_fts(query, limit, queryset)
+    if connection.vendor == 'postgresql':
+        return _search_trigram(query, limit, queryset)
+    return _search_like(query, limit, queryset)
+
+
+def _search_barcodes(query, limit, queryset):
+    # диапазон вместо LIKE — SQLite использует уникальный индекс barcode
+    barcodes = StockBarcode.objects.filter(barcode__gte=query, barcode__lt=query + '\uffff')
+    if queryset is not None:
+        barcodes = barcodes.filter(stock__in=queryset.values('pk'))
+    return list(barcodes.order_by('barcode').values_list('stock', flat=True)[:limit])
+
+
+def _search_like(query, limit, queryset):
+    # короткие запросы (меньше триграммы) и прочие СУБД;
+    # LIKE в SQLite не сравнивает кириллицу без учёта регистра — отсюда capitalize
+    barcodes = StockBarcode.objects.filter(barcode__startswith=query).values('stock')
+    stocks = Stock.objects.all() if queryset is None else Stock.objects.filter(pk__in=queryset.values('pk'))
+    return list(
+        stocks.filter(
+            Q(name__istartswith=query) | Q(name__startswith=query.capitalize()) | Q(pk__in=barcodes)
+        )
+        .order_by('name').values_list('pk', flat=True)[:limit]
+    )
+
+
+def _phrase(text):
+    return '"%s"' % text.replace('"', '""')
+
+
+def _fts(match, limit, ranked, queryset):
+    order = 'ORDER BY rank ' if ranked else ''
+    where, params = '', []
+    if queryset is not None:
+        subquery, params = queryset.values('pk').query.sql_with_params()
+        where = f'AND rowid IN ({subquery}) '
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid, name, codes FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s {where}{order}LIMIT %s',
+            [match, *params, limit],
+        )
+        return cursor.fetchall()
+
+
+def _search_fts(query, limit, queryset):
+    grams = trigrams(query)
+    if not grams:
+        return _search_like(query, limit, queryset)
+
+    found = []
+    barcode_like = ' ' not in query and any(ch.isdigit() for ch in query)
+    if barcode_like:
+        found = _search_barcodes(query, limit, queryset)
+        if len(found) >= limit:
+            return found
+
+    words = [w for w in query.lower().split() if len(w) >= 3]
+    rows = _fts(' AND '.join(map(_phrase, words)), limit * CANDIDATES_FACTOR, False, queryset) if words else []
+    found += [pk for pk in _rank(query.lower(), grams, rows, limit) if pk not in found]
+    if len(found) >= limit or barcode_like:
+        # опечатки в штрихкоде не ищем — сканер их не делает
+        return found[:limit]
+
+    rows = _fts(' OR '.join(map(_phrase, sorted(grams))), limit * CANDIDATES_FACTOR, True, queryset)
+    found += [pk for pk in _rank(query.lower(), grams, rows, limit) if pk not in found]
+    return found[:limit]
+
+
+def _rank(query, grams, rows, limit):
+    """Префикс → подстрока → доля совпавших триграмм → порядок bm25."""
+    scored = []
+    for position, (pk, name, codes) in enumerate(rows):
+        name, codes = name.lower(), codes.lower().split()
+        overlap = len(grams & trigrams(f'{name} {" ".join(codes)}')) / len(grams)
+        if overlap < settings.STOCK_SEARCH_MIN_SIMILARITY:
+            continue
+        if name.startswith(query) or any(code.startswith(query) for code in codes):
+            tier = 0
+        elif query in name:
+            tier = 1
+        else:
+            tier = 2
+        scored.append((tier, -overlap, position, pk))
+    scored.sort()
+    return [pk for *_, pk in scored[:limit]]
+
+
+def _search_trigram(query, limit, queryset):
+    from django.contrib.postgres.search import TrigramWordSimilarity
+
+    barcodes = StockBarcode.objects.filter(barcode__startswith=query).values('stock')
+    stocks = Stock.objects.all() if queryset is None else Stock.objects.filter(pk__in=queryset.values('pk'))
+    return list(
+        stocks.filter(Q(name__trigram_word_similar=query) | Q(pk__in=barcodes))
+        .annotate(similarity=TrigramWordSimilarity(query, 'name'))
+        .order_by('-similarity', 'name')
+        .values_list('pk', flat=True)[:limit]
+    )
+
+
+# ---------- синхронизация FTS5 (только SQLite) --------------------------------
+
+def _fts_row(pk, name, code):
+    return pk, name or '', ' '.join(Stock.split_codes(code))
+
+
+def index_stock(stock):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT OR REPLACE INTO {FTS_TABLE} (rowid, name, codes) VALUES (%s, %s, %s)',
+            _fts_row(stock.pk, stock.name, stock.code),
+        )
+
+
+def index_stocks(pks):
+    """Переиндексация после bulk_create/bulk_update — один SELECT и один executemany."""
+    if connection.vendor != 'sqlite' or not pks:
+        return
+    rows = [_fts_row(*row) for row in Stock.objects.filter(pk__in=pks).values_list('pk', 'name', 'code')]
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT OR REPLACE INTO {FTS_TABLE} (rowid, name, codes) VALUES (%s, %s, %s)', rows
+        )
+
+
+def unindex_stock(pk):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [pk])
+
+
+def rebuild_index(batch_size=5000):
+    """Полная перестройка индекса (management-команда rebuild_stock_search)."""
+    if connection.vendor != 'sqlite':
+        return 0
+    written = 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        batch = []
+        for row in Stock.objects.values_list('pk', 'name', 'code').iterator(chunk_size=batch_size):
+            batch.append(_fts_row(*row))
+            if len(batch) >= batch_size:
+                cursor.executemany(
+                    f'INSERT INTO {FTS_TABLE} (rowid, name, codes) VALUES (%s, %s, %s)', batch
+                )
+                written += len(batch)
+                batch = []
+        cursor.executemany(f'INSERT INTO {FTS_TABLE} (rowid, name, codes) VALUES (%s, %s, %s)', batch)
+        written += len(batch)
+    return written
@@ -1,26 +1,64 @@
+from django.utils.timezone import localdate
 from rest_framework import serializers
 from .models import (
-    Transaction, Stock, SaleHistory, SaleItem,
+    BRANCH_CHOICES, Transaction, Stock, SaleHistory, SaleItem,
     Category, StockMovement, ReturnItem, CashSession, DispatchHistory, DispatchItem
 )
+from .services import checkout, dispatch_stock, receive_stock, return_items, update_return
+
+
+# ---------- выбор полей ------------------------------------------------------
+
+def selected_fields(request, names, param='fields'):
+    """
+    Какие из полей names попадут в ответ по ?fields=: множество имён.
+    Без параметра, не для GET или если ни одно имя не подошло — все names.
+    """
+    requested = request.query_params.get(param) if request.method in ('GET', 'HEAD') else None
+    if not requested:
+        return set(names)
+    wanted = {f.strip() for f in requested.split(',') if f.strip()}
+    return (wanted & set(names)) or set(names)
+
+
+class SparseFieldsMixin:
+    """
+    ?fields=id,total,date — в GET-ответе остаются только перечисленные поля.
+    Применяется только к корневому сериализатору (вложенные не трогаем).
+    """
+    fields_query_param = 'fields'
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is None or not self._is_root():
+            return fields
+        wanted = selected_fields(request, fields, self.fields_query_param)
+        return {name: field for name, field in fields.items() if name in wanted}
+
+    def _is_root(self):
+        parent = self.parent
+        if parent is None:
+            return True
+        return isinstance(parent, serializers.ListSerializer) and parent.parent is None
 
 
 # ---------- базовые ----------------------------------------------------------
 
-class TransactionSerializer(serializers.ModelSerializer):
+class TransactionSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Transaction
         fields = '__all__'
 
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = ['id', 'name']
 
 
 
-class StockSerializer(serializers.ModelSerializer):
+class StockSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     category = serializers.StringRelatedField(read_only=True)
     category_id = serializers.PrimaryKeyRelatedField(
         queryset=Category.objects.all(),
@@ -36,45 +74,48 @@ class StockSerializer(serializers.ModelSerializer):
         model = Stock
         fields = '__all__'
 
+    def validate_code(self, value):
+        conflicts = (self.instance or Stock()).barcode_conflicts(value)
+        if conflicts:
+            raise serializers.ValidationError(f'Штрихкоды уже у других товаров: {", ".join(conflicts)}')
+        return value
 
-class StockBulkEntrySerializer(serializers.Serializer):
-    code = serializers.ListField(
-        child=serializers.CharField(max_length=50),
-        write_only=True
-    )
-    name = serializers.CharField()
-    price = serializers.DecimalField(max_digits=10, decimal_places=2)
-    price_seller = serializers.DecimalField(max_digits=10, decimal_places=2, required=False, allow_null=True)
-    quantity = serializers.DecimalField(max_digits=10, decimal_places=2)
-    unit = serializers.CharField()
-    category_id = serializers.PrimaryKeyRelatedField(
-        queryset=Category.objects.all(),
-        source='category',
-        write_only=True,
-        required=False
-    )
-    fixed_quantity = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
 
-    def validate_code(self, value):
-        return [str(code) for code in value]
+class StockAsOfSerializer(StockSerializer):
+    """GET /stocks/?as_of=… — плюс остаток на указанный момент"""
+    as_of = serializers.SerializerMethodField()
+    quantity_as_of = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
 
-    def create(self, validated_data):
-        codes = validated_data.pop('code')
-        created = []
+    def get_as_of(self, obj):
+        return self.context['as_of']
+
+
+class StockBranchSerializer(StockSerializer):
+    """GET /stocks/?branch=… — плюс остаток в этом филиале"""
+    branch = serializers.SerializerMethodField()
+    branch_quantity = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
 
-        for code in codes:
-            stock_data = {
-                **validated_data,
-                'code': code,
-            }
+    def get_branch(self, obj):
+        return self.context['branch']
 
-            if 'fixed_quantity' not in stock_data or stock_data['fixed_quantity'] is None:
-                stock_data['fixed_quantity'] = stock_data['quantity']
 
-            stock = Stock.objects.create(**stock_data)
-            created.append(stock)
+class StockBulkEntryListSerializer(serializers.ListSerializer):
+    """Партия прихода: валидация и запись целиком, без запросов на каждую строку"""
 
-        return created  # ← здесь возвращаем список, что ок, потому что обёртка его расплющит
+    def validate(self, attrs):
+        ids = {row['category_id'] for row in attrs if row.get('category_id')}
+        if ids:
+            found = set(Category.objects.filter(pk__in=ids).values_list('pk', flat=True))
+            if ids - found:
+                raise serializers.ValidationError([
+                    {'category_id': ['Категория не найдена']}
+                    if row.get('category_id') in ids - found else {}
+                    for row in attrs
+                ])
+        return attrs
+
+    def create(self, validated_data):
+        return receive_stock(validated_data)
 
 
 class StockBulkEntrySerializer(serializers.Serializer):
@@ -87,26 +128,34 @@ class StockBulkEntrySerializer(serializers.Serializer):
     price_seller = serializers.DecimalField(max_digits=10, decimal_places=2, required=False, allow_null=True)
     quantity = serializers.DecimalField(max_digits=10, decimal_places=2)
     unit = serializers.CharField()
-    category_id = serializers.PrimaryKeyRelatedField(
-        queryset=Category.objects.all(),
-        source='category',
-        write_only=True,
-        required=False
-    )
+    # id проверяются пачкой в StockBulkEntryListSerializer.validate
+    category_id = serializers.IntegerField(write_only=True, required=False, allow_null=True)
     fixed_quantity = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    # куда пришёл товар; по умолчанию — основной филиал
+    branch = serializers.ChoiceField(choices=BRANCH_CHOICES, required=False, write_only=True)
+
+    class Meta:
+        list_serializer_class = StockBulkEntryListSerializer
 
     def validate_code(self, value):
-        return [str(code).strip() for code in value if code]
+        return list(dict.fromkeys(str(code).strip() for code in value if str(code).strip()))
 
     def create(self, validated_data):
-        codes = validated_data.pop('code')
-        validated_data['code'] = ",".join(codes)
+        return receive_stock([validated_data])[0]
+
+
+class ReorderQuerySerializer(serializers.Serializer):
+    """Параметры GET /stocks/reorder/ (по умолчанию — из настроек REORDER_*)"""
+    window = serializers.IntegerField(min_value=1, max_value=365, required=False)
+    threshold = serializers.IntegerField(min_value=0, required=False)
+    all = serializers.BooleanField(default=False)
+
+
+class CatalogChangesQuerySerializer(serializers.Serializer):
+    """GET /stocks/changes/?since=<версия> (X-Catalog-Version прошлого ответа)"""
+    since = serializers.IntegerField(min_value=0)
 
-        if 'fixed_quantity' not in validated_data or validated_data['fixed_quantity'] is None:
-            validated_data['fixed_quantity'] = validated_data['quantity']
 
-        return Stock.objects.create(**validated_data)
-    
 # ---------- продажи ----------------------------------------------------------
 
 class SaleItemSerializer(serializers.ModelSerializer):
@@ -115,48 +164,50 @@ class SaleItemSerializer(serializers.ModelSerializer):
         fields = ['id', 'code', 'name', 'price', 'quantity', 'total']
 
 
-class SaleHistorySerializer(serializers.ModelSerializer):
+class SaleHistorySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     items = SaleItemSerializer(many=True)
 
     class Meta:
         model = SaleHistory
-        fields = ['id', 'payment_type', 'total', 'date', 'items']
+        fields = ['id', 'payment_type', 'total', 'date', 'branch', 'items']
 
     def create(self, validated_data):
         """
-        - создаём саму продажу
-        - создаём позиции
-        - уменьшаем Stock.quantity
-        - пишем StockMovement
+        Продажа проводится пакетно в services.checkout:
+        - создаём саму продажу и позиции (bulk_create)
+        - уменьшаем Stock.quantity одним UPDATE
+        - пишем StockMovement (bulk_create)
         """
-        from .models import StockMovement, Stock   # локальный импорт, чтобы избежать циклов
+        return checkout(validated_data)
+
 
-        items_data = validated_data.pop('items')
-        sale = SaleHistory.objects.create(**validated_data)
+class SaleSyncEntrySerializer(SaleHistorySerializer):
+    """Офлайн-чек из пачки POST /sales/sync/ — UUID и время продажи обязательны"""
+    client_uuid = serializers.UUIDField()
+    date = serializers.DateTimeField()
 
-        for item_data in items_data:
-            SaleItem.objects.create(sale=sale, **item_data)
+    class Meta(SaleHistorySerializer.Meta):
+        fields = SaleHistorySerializer.Meta.fields + ['client_uuid']
 
-            # уменьшаем склад
-            stock_obj = Stock.objects.get(code=item_data['code'])
-            stock_obj.quantity -= item_data['quantity']
-            stock_obj.save()
 
-            # движение
-            StockMovement.objects.create(
-                stock=stock_obj,
-                movement_type='sale',
-                quantity=item_data['quantity'],
-                sale=sale,
-                comment='Продажа'
-            )
+class SalesStatsQuerySerializer(serializers.Serializer):
+    """Параметры GET /sales/stats/ (по умолчанию — текущий месяц по дням)"""
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    group = serializers.ChoiceField(choices=['hour', 'day', 'month'], default='day')
 
-        return sale
+    def validate(self, attrs):
+        today = localdate()
+        attrs.setdefault('date_to', today)
+        attrs.setdefault('date_from', attrs['date_to'].replace(day=1))
+        if attrs['date_from'] > attrs['date_to']:
+            raise serializers.ValidationError('date_from позже date_to')
+        return attrs
 
 
 # ---------- движение по складу ----------------------------------------------
 
-class StockMovementSerializer(serializers.ModelSerializer):
+class StockMovementSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     stock_name = serializers.CharField(source='stock.name', read_only=True)
 
     class Meta:
@@ -167,12 +218,32 @@ class StockMovementSerializer(serializers.ModelSerializer):
 
 # ---------- возврат ----------------------------------------------------------
 
-class ReturnItemSerializer(serializers.ModelSerializer):
+class ReturnItemListSerializer(serializers.ListSerializer):
+    """Партия возвратов: одна транзакция в services.return_items"""
+
+    def create(self, validated_data):
+        return return_items(validated_data)
+
+
+class ReturnItemSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    # позиции продажи проверяются в services (пачкой в return_items, при правке — update_return)
+    sale_item = serializers.IntegerField(source='sale_item_id')
+
     class Meta:
         model  = ReturnItem
         fields = ["id", "sale_item", "quantity", "reason", "date", "branch"]
+        list_serializer_class = ReturnItemListSerializer
+
+    def create(self, validated_data):
+        try:
+            return return_items([validated_data])[0]
+        except serializers.ValidationError as exc:
+            raise serializers.ValidationError(exc.detail[0])
+
+    def update(self, instance, validated_data):
+        return update_return(instance, validated_data)
         
-class CashSessionSerializer(serializers.ModelSerializer):
+class CashSessionSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model  = CashSession
         fields = ['id', 'opened_at', 'opening_sum', 'closed_at', 'closing_sum', 'is_open']
@@ -180,11 +251,14 @@ class CashSessionSerializer(serializers.ModelSerializer):
         
         
 class DispatchItemSerializer(serializers.ModelSerializer):
+    # id товара без запроса на каждую позицию — проверяется пачкой в dispatch_stock
+    stock = serializers.IntegerField(source='stock_id', required=False, allow_null=True)
+
     class Meta:
         model = DispatchItem
         exclude = ['dispatch']  # ✅ или используем fields и делаем dispatch read_only
 
-class DispatchHistorySerializer(serializers.ModelSerializer):
+class DispatchHistorySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     items = DispatchItemSerializer(many=True)
 
     class Meta:
@@ -192,16 +266,8 @@ class DispatchHistorySerializer(serializers.ModelSerializer):
         fields = '__all__'
 
     def create(self, validated_data):
-        items_data = validated_data.pop('items')
-        dispatch = DispatchHistory.objects.create(**validated_data)
-
-        total = 0
-        for item_data in items_data:
-            item_data['dispatch'] = dispatch
-            DispatchItem.objects.create(**item_data)
-            total += item_data['total']
-
-        dispatch.total = total
-        dispatch.save()
-
-        return dispatch
\ No newline at end of file
+        """
+        Отправка проводится пакетно в services.dispatch_stock:
+        позиции, итог, списание остатков и движения — одной транзакцией.
+        """
+        return dispatch_stock(validated_data)
@@ -0,0 +1,718 @@
+"""
+Складские операции, выполняемые пакетно (set-based).
+
+Каждая операция укладывается в фиксированное число запросов
+независимо от количества позиций и целиком выполняется
+внутри transaction.atomic.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils.timezone import now
+from rest_framework import serializers
+
+from . import catalog, rollups, search
+from .cache import StockRef, stock_resolver_cache
+from .models import (
+    DEFAULT_BRANCH, DispatchHistory, DispatchItem, ReturnItem, SaleHistory, SaleItem, Stock,
+    StockBarcode, StockLevel, StockMovement,
+)
+
+
+# ---------- вспомогательные ---------------------------------------------------
+
+def resolve_stocks(codes):
+    """
+    Единая точка поиска товара по штрихкоду (продажи, возвраты, отправки).
+    Один индексированный запрос: {barcode: Stock} для найденных кодов.
+    """
+    codes = {str(c).strip() for c in codes if c}
+    if not codes:
+        return {}
+    barcodes = StockBarcode.objects.filter(barcode__in=codes).select_related('stock')
+    return {b.barcode: b.stock for b in barcodes}
+
+
+def resolve_stock(code):
+    """Один товар по штрихкоду или None."""
+    return resolve_stocks([code]).get(str(code).strip())
+
+
+def resolve_stock_refs(codes):
+    """
+    Как resolve_stocks, но через LRU-кэш в памяти: {barcode: StockRef}.
+    StockRef содержит только id, название и цены — остатки из него
+    не читаются никогда. Свежесть между воркерами — см. clients/cache.py.
+    """
+    codes = {str(c).strip() for c in codes if c}
+    if settings.SHARED_CACHE:
+        # другой воркер мог перенести штрихкод — его сигнал сюда не дойдёт
+        stock_resolver_cache.check_version(catalog.stamp()[0])
+    found, missing = stock_resolver_cache.get_many(codes)
+    if missing:
+        fetched = {
+            code: StockRef(s.pk, s.name, s.price, s.price_seller, s.unit)
+            for code, s in resolve_stocks(missing).items()
+        }
+        stock_resolver_cache.set_many(fetched)
+        found.update(fetched)
+    return found
+
+
+def apply_stock_deltas(deltas, fields=('quantity',), branch=None):
+    """
+    Изменяет Stock.quantity одним UPDATE … CASE по всем товарам.
+    deltas: {stock_id: Decimal} — положительное значение увеличивает остаток.
+    fields — какие колонки сдвигать (например, ещё и fixed_quantity при приходе).
+    branch — филиал: тот же сдвиг quantity получает его строка StockLevel.
+
+    Общая строка Stock остаётся источником остатка: по ней проверяется
+    перепродажа, сверяется журнал (ledger.reconcile) и строятся списки и
+    отчёты. Блокируется строка товара, а не филиала — кассы разных
+    филиалов ждут друг друга, только продавая один товар одновременно.
+    """
+    if not deltas:
+        return 0
+    if branch and 'quantity' in fields:
+        apply_level_deltas(deltas, branch)
+    # версию каталога остатки не берут — см. catalog.quantities_changed
+    catalog.quantities_changed()
+    return Stock.objects.filter(pk__in=deltas.keys()).update(**{
+        field: Case(
+            *[
+                When(pk=pk, then=Coalesce(F(field), Value(Decimal('0'))) + Decimal(delta))
+                for pk, delta in deltas.items()
+            ],
+            default=F(field),
+        )
+        for field in fields
+    })
+
+
+def apply_level_deltas(deltas, branch):
+    """
+    Сдвигает остатки филиала: недостающие строки StockLevel создаются
+    (ignore_conflicts), затем один UPDATE … CASE по (branch, stock).
+    Как и Stock.quantity, остаток филиала при политике 'allow' может
+    уйти в минус — см. decrement_stock.
+    """
+    if not deltas:
+        return 0
+    StockLevel.objects.bulk_create(
+        [StockLevel(stock_id=pk, branch=branch) for pk in deltas],
+        ignore_conflicts=True,
+    )
+    return StockLevel.objects.filter(branch=branch, stock_id__in=deltas.keys()).update(
+        quantity=Case(
+            *[When(stock_id=pk, then=F('quantity') + Decimal(delta)) for pk, delta in deltas.items()],
+            default=F('quantity'),
+        )
+    )
+
+
+def group_by_branch(pairs):
+    """[(branch, stock_id, qty)] → {branch: {stock_id: сумма qty}}"""
+    grouped = defaultdict(lambda: defaultdict(Decimal))
+    for branch, stock_id, qty in pairs:
+        grouped[branch][stock_id] += Decimal(qty)
+    return grouped
+
+
+def record_movements(movements):
+    """
+    bulk_create движений с текущим временем — вызывать после UPDATE
+    остатков: тогда движение датировано позже любого снимка, который
+    его ещё не видит (ledger.take_snapshot).
+    """
+    moment = now()
+    for movement in movements:
+        movement.date = moment
+    return StockMovement.objects.bulk_create(movements)
+
+
+def decrement_stock(deltas, policy=None, comment='', sale=None, branch=None):
+    """
+    Списывает остатки с контролем перепродажи.
+    deltas: {stock_id: Decimal} — сколько списать (положительные числа).
+
+    Сначала выполняется UPDATE (он берёт блокировку строк / записи в SQLite),
+    затем в той же транзакции читаются итоговые остатки — гонки между
+    кассами нет, read-modify-write в Python не используется.
+
+    policy (settings.STOCK_OVERSELL_POLICY):
+    - 'allow'     — остаток может уйти в минус (и общий, и филиала);
+      такие товары — GET /stocks/?oversold=true[&branch=…]
+    - 'reject'    — ValidationError, вся операция откатывается
+    - 'backorder' — остаток обнуляется, нехватка пишется движением 'backorder'
+
+    branch — филиал, чьи строки StockLevel списываются вместе со Stock;
+    'reject' и 'backorder' проверяют и его остаток: товар другого филиала
+    продать нельзя, даже если общий остаток положительный.
+
+    Возвращает число обновлённых строк Stock.
+    """
+    policy = policy or settings.STOCK_OVERSELL_POLICY
+    updated = apply_stock_deltas({pk: -qty for pk, qty in deltas.items()}, branch=branch)
+    if policy == 'allow' or updated != len(deltas):
+        return updated
+
+    negative = dict(
+        Stock.objects.filter(pk__in=deltas.keys(), quantity__lt=0).values_list('pk', 'quantity')
+    )
+    if branch:
+        levels = StockLevel.objects.filter(branch=branch, stock_id__in=deltas.keys(), quantity__lt=0)
+        for pk, qty in levels.values_list('stock_id', 'quantity'):
+            negative[pk] = min(negative.get(pk, 0), qty)
+    if not negative:
+        return updated
+
+    if policy == 'reject':
+        names = Stock.objects.filter(pk__in=negative).values_list('name', flat=True)
+        raise serializers.ValidationError(
+            {'items': [f'Недостаточно товара: {name}' for name in names]}
+        )
+
+    # backorder: не больше списанного в этой операции
+    shortfall = {pk: min(-qty, deltas[pk]) for pk, qty in negative.items()}
+    apply_stock_deltas(shortfall, branch=branch)
+    record_movements([
+        StockMovement(
+            stock_id=pk,
+            movement_type='backorder',
+            quantity=qty,
+            sale=sale,
+            branch=branch,
+            comment=f'Нехватка: {comment}' if comment else 'Нехватка',
+        )
+        for pk, qty in shortfall.items()
+    ])
+    return updated
+
+
+# ---------- продажа -----------------------------------------------------------
+
+def checkout(validated_data):
+    """
+    Проводит продажу целиком:
+    - создаёт SaleHistory
+    - bulk_create позиций SaleItem
+    - уменьшает Stock.quantity одним UPDATE (с учётом STOCK_OVERSELL_POLICY)
+    - bulk_create движений StockMovement('sale')
+    """
+    validated_data = dict(validated_data)
+    items_data = validated_data.pop('items')
+
+    with transaction.atomic():
+        stocks = resolve_stock_refs(item['code'] for item in items_data)
+        missing = sorted({item['code'].strip() for item in items_data} - stocks.keys())
+        if missing:
+            raise serializers.ValidationError(
+                {'items': [f'Товар с кодом {code} не найден' for code in missing]}
+            )
+
+        sale = SaleHistory.objects.create(**validated_data)
+        SaleItem.objects.bulk_create(
+            [SaleItem(sale=sale, **item) for item in items_data]
+        )
+
+        deltas = defaultdict(Decimal)
+        movements = []
+        for item in items_data:
+            stock = stocks[item['code'].strip()]
+            deltas[stock.id] += Decimal(item['quantity'])
+            movements.append(StockMovement(
+                stock_id=stock.id,
+                movement_type='sale',
+                quantity=item['quantity'],
+                sale=sale,
+                branch=sale.branch,
+                comment='Продажа',
+            ))
+
+        if decrement_stock(deltas, comment='Продажа', sale=sale, branch=sale.branch) != len(deltas):
+            # товар удалён в другом процессе, а кэш ещё помнит его id
+            for stock_id in deltas:
+                stock_resolver_cache.invalidate_stock(stock_id)
+            raise serializers.ValidationError({'items': ['Товар был удалён, повторите продажу']})
+        record_movements(movements)
+        # в итоги продаж чек добавил сигнал post_save (signals.py)
+
+    return sale
+
+
+def checkout_batch(entries, policy=None):
+    """
+    Пачка офлайн-чеков (POST /sales/sync/) за фиксированное число запросов,
+    в одной транзакции. entries — [{client_uuid, date, payment_type, total, items}].
+
+    - чеки с уже загруженным client_uuid — 'duplicate' с id продажи; повтор
+      внутри пачки получает итог первого вхождения (id или причину отказа)
+    - чеки с неизвестными штрихкодами — 'rejected', остальные проводятся
+    - policy (settings.SALES_SYNC_CONFLICT_POLICY): 'reject' отклоняет чеки
+      по порядку времени, как только товара не хватает; 'allow' и 'backorder' —
+      как в decrement_stock
+    - SaleHistory, SaleItem и StockMovement('sale') — bulk_create,
+      остатки — по UPDATE на филиал, итоги продаж — rollups.add_sales
+
+    Дата чека — время продажи на кассе; движения пишутся текущим временем,
+    чтобы снимки остатков (ledger) оставались согласованными.
+    Возвращает [{client_uuid, status, sale, errors}] в порядке entries.
+    """
+    policy = policy or settings.SALES_SYNC_CONFLICT_POLICY
+    results = [{'client_uuid': e['client_uuid'], 'status': None, 'sale': None} for e in entries]
+
+    with transaction.atomic():
+        uuids = {e['client_uuid'] for e in entries}
+        known = dict(
+            SaleHistory.objects.filter(client_uuid__in=uuids).values_list('client_uuid', 'pk')
+        )
+        stocks = resolve_stock_refs(item['code'] for e in entries for item in e['items'])
+
+        accepted, first, repeats = [], {}, []
+        for i in sorted(range(len(entries)), key=lambda i: entries[i]['date']):
+            entry, result = entries[i], results[i]
+            if entry['client_uuid'] in known:
+                result.update(status='duplicate', sale=known[entry['client_uuid']])
+                continue
+            if entry['client_uuid'] in first:
+                # повтор внутри пачки — итог первого вхождения, когда он известен
+                repeats.append((i, first[entry['client_uuid']]))
+                continue
+            first[entry['client_uuid']] = i
+            missing = sorted({item['code'].strip() for item in entry['items']} - stocks.keys())
+            if missing:
+                result.update(status='rejected', errors=[f'Товар с кодом {code} не найден' for code in missing])
+                continue
+            accepted.append(i)
+
+        if policy == 'reject':
+            accepted = _reserve_in_order(entries, results, accepted, stocks)
+
+        sales = [
+            SaleHistory(**{k: v for k, v in entries[i].items() if k != 'items'})
+            for i in accepted
+        ]
+        SaleHistory.objects.bulk_create(sales)
+
+        items, movements, sold = [], [], []
+        for i, sale in zip(accepted, sales):
+            results[i].update(status='created', sale=sale.pk)
+            for item in entries[i]['items']:
+                stock_id = stocks[item['code'].strip()].id
+                sold.append((sale.branch, stock_id, item['quantity']))
+                items.append(SaleItem(sale=sale, **item))
+                movements.append(StockMovement(
+                    stock_id=stock_id,
+                    movement_type='sale',
+                    quantity=item['quantity'],
+                    sale=sale,
+                    branch=sale.branch,
+                    comment='Продажа (синхронизация)',
+                ))
+        SaleItem.objects.bulk_create(items)
+        for i, j in repeats:
+            if results[j]['status'] == 'created':
+                results[i].update(status='duplicate', sale=results[j]['sale'])
+            else:
+                results[i].update(status=results[j]['status'], errors=results[j]['errors'])
+
+        # по UPDATE на филиал; при 'reject' нехватка уже отсечена выше
+        for branch, deltas in group_by_branch(sold).items():
+            updated = decrement_stock(
+                deltas, policy='allow' if policy == 'reject' else policy,
+                comment='Синхронизация', branch=branch,
+            )
+            if updated == len(deltas):
+                continue
+            for stock_id in deltas:
+                stock_resolver_cache.invalidate_stock(stock_id)
+            raise serializers.ValidationError({'sales': ['Товар был удалён, повторите синхронизацию']})
+        record_movements(movements)
+        rollups.add_sales(sales)
+
+    return results
+
+
+def _reserve_in_order(entries, results, accepted, stocks):
+    """Политика 'reject' для пачки: чек проходит, только если весь товар в наличии."""
+    ids = {stocks[item['code'].strip()].id for i in accepted for item in entries[i]['items']}
+    left = dict(
+        Stock.objects.select_for_update().filter(pk__in=ids).values_list('pk', 'quantity')
+    )
+    names = {ref.id: ref.name for ref in stocks.values()}
+    kept = []
+    for i in accepted:
+        need = defaultdict(Decimal)
+        for item in entries[i]['items']:
+            need[stocks[item['code'].strip()].id] += Decimal(item['quantity'])
+        short = [pk for pk, qty in need.items() if (left.get(pk) or 0) < qty]
+        if short:
+            results[i].update(
+                status='rejected', errors=[f'Недостаточно товара: {names[pk]}' for pk in short]
+            )
+            continue
+        for pk, qty in need.items():
+            left[pk] -= qty
+        kept.append(i)
+    return kept
+
+
+# ---------- приход товара -----------------------------------------------------
+
+def receive_stock(rows):
+    """
+    Приход партии товара (накладная поставщика) за фиксированное число запросов:
+    - все штрихкоды партии ищутся одним запросом
+    - строка с известным штрихкодом дополняет существующий товар
+      (+quantity, +fixed_quantity, новые цены и штрихкоды),
+      остальные создаются через bulk_create
+    - fixed_quantity строки, если задан, идёт в fixed_quantity вместо quantity
+    - штрихкоды, которые вместе не помещаются в Stock.code, — ошибка строки
+    - на каждую строку пишется StockMovement('in')
+    Всё в одной транзакции. Возвращает [(status, stock_id)] по строкам,
+    status — 'created' или 'updated'.
+    """
+    rows = [dict(row, code=[c for c in row['code'] if c]) for row in rows]
+    for row in rows:
+        # «получено изначально»: как в накладной, иначе — принятое количество
+        if row.get('fixed_quantity') is None:
+            row['fixed_quantity'] = row['quantity']
+    max_length = Stock._meta.get_field('code').max_length
+    too_long = f'Штрихкоды товара не помещаются в {max_length} символов'
+
+    with transaction.atomic():
+        existing = resolve_stocks(c for row in rows for c in row['code'])
+        merged = {}             # id существующего товара -> его штрихкоды с добавленными
+
+        # строка → товар: существующий (id) или новый из этой же партии (индекс)
+        targets, errors = [], {}
+        pending = {}            # barcode -> индекс нового товара в new_stocks
+        new_stocks = []
+        for i, row in enumerate(rows):
+            owners = {existing[c].pk for c in row['code'] if c in existing}
+            if len(owners) > 1:
+                errors[i] = 'Штрихкоды принадлежат разным товарам'
+                targets.append(None)
+                continue
+            if owners:
+                pk = owners.pop()
+                owner = next(existing[c] for c in row['code'] if c in existing)
+                codes = merged.setdefault(pk, Stock.split_codes(owner.code))
+                merged[pk] = list(dict.fromkeys(codes + row['code']))
+                if len(','.join(merged[pk])) > max_length:
+                    errors[i] = too_long
+                targets.append(('updated', pk))
+                continue
+            known = {pending[c] for c in row['code'] if c in pending}
+            if len(known) > 1:
+                errors[i] = 'Штрихкоды принадлежат разным товарам'
+                targets.append(None)
+                continue
+            if known:
+                index = known.pop()
+                new_stocks[index].quantity += row['quantity']
+                new_stocks[index].fixed_quantity += row['fixed_quantity']
+                new_stocks[index].code = ','.join(
+                    dict.fromkeys(Stock.split_codes(new_stocks[index].code) + row['code'])
+                )
+            else:
+                index = len(new_stocks)
+                new_stocks.append(Stock(
+                    code=','.join(row['code']),
+                    name=row['name'],
+                    price=row['price'],
+                    price_seller=row.get('price_seller'),
+                    quantity=row['quantity'],
+                    fixed_quantity=row['fixed_quantity'],
+                    unit=row['unit'],
+                    category_id=row.get('category_id'),
+                ))
+            if len(new_stocks[index].code) > max_length:
+                errors[i] = too_long
+            for c in row['code']:
+                pending[c] = index
+            targets.append(('created', index))
+
+        if errors:
+            raise serializers.ValidationError(
+                [{'code': [errors[i]]} if i in errors else {} for i in range(len(rows))]
+            )
+
+        Stock.objects.bulk_create(new_stocks)
+
+        # существующие товары: остатки одним UPDATE, цены/штрихкоды — bulk_update
+        received, received_fixed = defaultdict(Decimal), defaultdict(Decimal)
+        updates = {}
+        for (status, ref), row in zip(targets, rows):
+            if status == 'updated':
+                received[ref] += row['quantity']
+                received_fixed[ref] += row['fixed_quantity']
+                updates[ref] = row
+        stocks = Stock.objects.in_bulk(list(updates))
+        for pk, row in updates.items():
+            stock = stocks[pk]
+            stock.price = row['price']
+            if row.get('price_seller') is not None:
+                stock.price_seller = row['price_seller']
+            if row.get('category_id'):
+                stock.category_id = row['category_id']
+            stock.code = ','.join(merged[pk])
+        Stock.objects.bulk_update(stocks.values(), ['price', 'price_seller', 'category', 'code'])
+        if received == received_fixed:
+            apply_stock_deltas(received, fields=('quantity', 'fixed_quantity'))
+        else:
+            apply_stock_deltas(received)
+            apply_stock_deltas(received_fixed, fields=('fixed_quantity',))
+
+        created_ids = [s.pk for s in new_stocks]
+        all_stocks = list(new_stocks) + list(stocks.values())
+        StockBarcode.objects.bulk_create(
+            [
+                StockBarcode(stock_id=stock.pk, barcode=c)
+                for stock in all_stocks for c in Stock.split_codes(stock.code)
+            ],
+            ignore_conflicts=True,
+        )
+
+        # bulk-операции не шлют post_save — поисковый индекс и версию обновляем сами
+        # (у пополненных товаров могли смениться цены и штрихкоды)
+        search.index_stocks(created_ids + list(stocks))
+        catalog.changed(created_ids + list(stocks))
+
+        results = [
+            (status, created_ids[ref] if status == 'created' else ref)
+            for status, ref in targets
+        ]
+        record_movements([
+            StockMovement(
+                stock_id=stock_id, movement_type='in', quantity=row['quantity'],
+                branch=row.get('branch') or DEFAULT_BRANCH, comment='Приход',
+            )
+            for (status, stock_id), row in zip(results, rows)
+        ])
+        # остатки филиалов: и для новых, и для пополненных товаров
+        for branch, deltas in group_by_branch(
+            (row.get('branch') or DEFAULT_BRANCH, stock_id, row['quantity'])
+            for (_, stock_id), row in zip(results, rows)
+        ).items():
+            apply_level_deltas(deltas, branch)
+
+        # bulk-операции не шлют post_save — сбрасываем кэш штрихкодов сами
+        changed = list(stocks)
+        transaction.on_commit(lambda: [stock_resolver_cache.invalidate_stock(pk) for pk in changed])
+
+    return results
+
+
+# ---------- отправка в филиал -------------------------------------------------
+
+def dispatch_stock(validated_data):
+    """
+    Отправка товара за фиксированное число запросов:
+    - товары без stock ищутся по штрихкоду (кэш), stock_id проверяются одним запросом;
+      позиция без товара — ошибка этой позиции, отправка не проводится
+    - bulk_create позиций DispatchItem, итог считается в БД
+    - остатки (и StockLevel филиала-отправителя) списываются одним UPDATE
+    - bulk_create движений StockMovement('dispatch')
+    """
+    validated_data = dict(validated_data)
+    items_data = [dict(item) for item in validated_data.pop('items')]
+
+    with transaction.atomic():
+        refs = resolve_stock_refs(i['code'] for i in items_data if not i.get('stock_id'))
+        for item in items_data:
+            if not item.get('stock_id') and item['code'].strip() in refs:
+                item['stock_id'] = refs[item['code'].strip()].id
+
+        ids = {i['stock_id'] for i in items_data if i.get('stock_id')}
+        missing = ids - set(Stock.objects.filter(pk__in=ids).values_list('pk', flat=True))
+        errors = []
+        for item in items_data:
+            if not item.get('stock_id'):
+                errors.append({'code': [f"Товар с кодом {item['code']} не найден"]})
+            elif item['stock_id'] in missing:
+                errors.append({'stock': [f"Товар #{item['stock_id']} не найден"]})
+            else:
+                errors.append({})
+        if any(errors):
+            raise serializers.ValidationError({'items': errors})
+
+        dispatch = DispatchHistory.objects.create(**validated_data)
+        DispatchItem.objects.bulk_create(
+            [DispatchItem(dispatch=dispatch, **item) for item in items_data]
+        )
+        DispatchHistory.objects.filter(pk=dispatch.pk).update(
+            total=Coalesce(
+                Subquery(
+                    DispatchItem.objects.filter(dispatch=OuterRef('pk'))
+                    .order_by().values('dispatch').annotate(s=Sum('total')).values('s')
+                ),
+                Value(Decimal('0')),
+            )
+        )
+        dispatch.refresh_from_db(fields=['total'])
+
+        deltas = defaultdict(Decimal)
+        for item in items_data:
+            deltas[item['stock_id']] += Decimal(item['quantity'])
+
+        comment = f'Отправка #{dispatch.pk} — {dispatch.recipient}'
+        decrement_stock(deltas, comment=comment, branch=dispatch.branch)
+        record_movements([
+            StockMovement(
+                stock_id=pk, movement_type='dispatch', quantity=qty,
+                branch=dispatch.branch, comment=comment,
+            )
+            for pk, qty in deltas.items()
+        ])
+
+    return dispatch
+
+
+# ---------- возврат -----------------------------------------------------------
+
+def return_items(rows):
+    """
+    Возврат пачки позиций за фиксированное число запросов:
+    - SaleItem блокируются одним запросом, уже возвращённое количество
+      считается вторым — после блокировки (подзапрос в том же SELECT … FOR
+      UPDATE в PostgreSQL видел бы снимок до ожидания блокировки)
+    - по каждой позиции нельзя вернуть больше, чем осталось от продажи
+    - товары ищутся по штрихкоду (кэш), отсутствующие создаются bulk_create
+    - остатки (общий и филиала) увеличиваются UPDATE на филиал,
+      возвраты и движения — bulk_create
+    rows: [{sale_item_id, quantity, reason?, branch?}]. Возвращает [ReturnItem].
+    """
+    rows = [dict(row) for row in rows]
+
+    with transaction.atomic():
+        sale_items = SaleItem.objects.filter(pk__in={row['sale_item_id'] for row in rows})
+        if connection.features.has_select_for_update_of:
+            sale_items = sale_items.select_for_update(of=('self',))
+        else:
+            sale_items = sale_items.select_for_update()
+        sale_items = {item.pk: item for item in sale_items.select_related('sale')}
+        returned = dict(
+            ReturnItem.objects.filter(sale_item__in=list(sale_items))
+            .order_by().values('sale_item').annotate(s=Sum('quantity')).values_list('sale_item', 's')
+        )
+
+        # сколько ещё можно вернуть; уменьшается по мере разбора строк партии
+        left = {pk: item.quantity - returned.get(pk, 0) for pk, item in sale_items.items()}
+        errors = {}
+        for i, row in enumerate(rows):
+            pk, qty = row['sale_item_id'], row['quantity']
+            if pk not in sale_items:
+                errors[i] = {'sale_item': [f'Позиция продажи #{pk} не найдена']}
+            elif qty <= 0:
+                errors[i] = {'quantity': ['Количество должно быть больше нуля']}
+            elif qty > left[pk]:
+                errors[i] = {'quantity': [f'Можно вернуть не больше {left[pk]}']}
+            else:
+                left[pk] -= qty
+        if errors:
+            raise serializers.ValidationError([errors.get(i, {}) for i in range(len(rows))])
+
+        # товар по штрихкоду; если его уже нет в каталоге — заводим заново
+        stocks = {code: ref.id for code, ref in resolve_stock_refs(i.code for i in sale_items.values()).items()}
+        new_stocks = {}
+        for item in sale_items.values():
+            code = item.code.strip()
+            if code not in stocks and code not in new_stocks:
+                new_stocks[code] = Stock(
+                    code=code, name=item.name, price=item.price,
+                    price_seller=item.price, quantity=0, unit='шт',
+                )
+        if new_stocks:
+            Stock.objects.bulk_create(new_stocks.values())
+            StockBarcode.objects.bulk_create(
+                [StockBarcode(stock_id=s.pk, barcode=code) for code, s in new_stocks.items()],
+                ignore_conflicts=True,
+            )
+            search.index_stocks([s.pk for s in new_stocks.values()])
+            catalog.changed([s.pk for s in new_stocks.values()])
+            stocks.update({code: s.pk for code, s in new_stocks.items()})
+
+        items, movements, returned = [], [], []
+        for row in rows:
+            sale_item = sale_items[row['sale_item_id']]
+            stock_id = stocks[sale_item.code.strip()]
+            branch = row.get('branch', DEFAULT_BRANCH)
+            returned.append((branch, stock_id, row['quantity']))
+            movements.append(StockMovement(
+                stock_id=stock_id,
+                movement_type='return',
+                quantity=row['quantity'],
+                branch=branch,
+                comment=f'Возврат по продаже #{sale_item.sale_id}',
+            ))
+            items.append(ReturnItem(
+                sale_item=sale_item,
+                quantity=row['quantity'],
+                reason=row.get('reason', ''),
+                branch=branch,
+            ))
+
+        # товар возвращается на склад того филиала, куда его принесли
+        for branch, deltas in group_by_branch(returned).items():
+            apply_stock_deltas(deltas, branch=branch)
+        record_movements(movements)
+        ReturnItem.objects.bulk_create(items)
+        rollups.add_returns(items)
+
+    return items
+
+
+def update_return(item, data):
+    """
+    Правка возврата (PUT/PATCH) с теми же проверками, что у return_items:
+    позиция продажи существует и блокируется, вместе с остальными её
+    возвратами — не больше проданного. Остаток сдвигается на разницу:
+    старое количество забирается с прежнего товара и филиала, новое
+    возвращается — движениями 'return' со знаком. Итоги продаж
+    пересчитывает сигнал post_save ReturnItem.
+    """
+    with transaction.atomic():
+        item = ReturnItem.objects.select_for_update().select_related('sale_item').get(pk=item.pk)
+        sale_item_id = data.get('sale_item_id', item.sale_item_id)
+        sale_item = SaleItem.objects.select_for_update().filter(pk=sale_item_id).first()
+        if sale_item is None:
+            raise serializers.ValidationError({'sale_item': [f'Позиция продажи #{sale_item_id} не найдена']})
+        quantity = data.get('quantity', item.quantity)
+        if quantity <= 0:
+            raise serializers.ValidationError({'quantity': ['Количество должно быть больше нуля']})
+        others = (
+            ReturnItem.objects.filter(sale_item=sale_item).exclude(pk=item.pk)
+            .aggregate(s=Sum('quantity'))['s'] or 0
+        )
+        if quantity > sale_item.quantity - others:
+            raise serializers.ValidationError({'quantity': [f'Можно вернуть не больше {sale_item.quantity - others}']})
+
+        branch = data.get('branch', item.branch)
+        if (sale_item.pk, quantity, branch) != (item.sale_item_id, item.quantity, item.branch):
+            old_code, new_code = item.sale_item.code.strip(), sale_item.code.strip()
+            stocks = resolve_stock_refs([old_code, new_code])
+            if new_code not in stocks:
+                raise serializers.ValidationError({'sale_item': [f'Товар с кодом {new_code} не найден']})
+            # (код, филиал, количество, продажа): прежний возврат снимается, новый проводится
+            moves = [(new_code, branch, quantity, sale_item.sale_id)]
+            if old_code in stocks:
+                moves.append((old_code, item.branch, -item.quantity, item.sale_item.sale_id))
+            for branch_, deltas in group_by_branch((b, stocks[c].id, q) for c, b, q, _ in moves).items():
+                apply_stock_deltas(deltas, branch=branch_)
+            record_movements([
+                StockMovement(
+                    stock_id=stocks[c].id, movement_type='return', quantity=q, branch=b,
+                    comment=f'Правка возврата по продаже #{sale_id}',
+                )
+                for c, b, q, sale_id in moves
+            ])
+
+        for field, value in data.items():
+            setattr(item, field, value)
+        item.save()
+    return item
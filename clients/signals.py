@@ -0,0 +1,197 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import catalog, response_cache, search
+from .cache import stock_resolver_cache
+from .models import DEFAULT_BRANCH, CashSession, Category, ReturnItem, SaleHistory, Stock, StockBarcode, Transaction
+from .rollups import add_returns, add_sales, add_transactions, rebuild_transaction_totals
+from .services import apply_level_deltas
+
+
+# ---------- SQLite ------------------------------------------------------------
+
+@receiver(connection_created)
+def tune_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+    if connection.settings_dict['NAME'] == ':memory:' or 'mode=memory' in str(connection.settings_dict['NAME']):
+        pragmas = {k: v for k, v in pragmas.items() if k != 'journal_mode'}
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+# ---------- кэш штрихкодов ---------------------------------------------------
+
+def _invalidate_stock(stock_id):
+    # сразу и ещё раз после коммита: между ними другой поток мог
+    # закэшировать ещё не закоммиченное (старое) состояние
+    stock_resolver_cache.invalidate_stock(stock_id)
+    transaction.on_commit(lambda: stock_resolver_cache.invalidate_stock(stock_id))
+
+
+@receiver([post_save, post_delete], sender=Stock)
+def stock_changed(sender, instance, **kwargs):
+    _invalidate_stock(instance.pk)
+
+
+# ---------- поисковый индекс -------------------------------------------------
+
+@receiver(post_save, sender=Stock)
+def stock_saved_index(sender, instance, **kwargs):
+    search.index_stock(instance)
+
+
+@receiver(post_delete, sender=Stock)
+def stock_deleted_index(sender, instance, **kwargs):
+    search.unindex_stock(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=StockBarcode)
+def barcode_changed(sender, instance, **kwargs):
+    stock_resolver_cache.invalidate_code(instance.barcode)
+    _invalidate_stock(instance.stock_id)
+
+
+# ---------- версия каталога и остаток филиала --------------------------------
+
+@receiver(pre_save, sender=Stock)
+def stock_before_save(sender, instance, update_fields=None, **kwargs):
+    instance._old_quantity = None
+    if instance.pk is not None and (update_fields is None or 'quantity' in update_fields):
+        instance._old_quantity = Stock.objects.filter(pk=instance.pk).values_list('quantity', flat=True).first()
+
+
+@receiver(post_save, sender=Stock)
+def stock_saved(sender, instance, created, **kwargs):
+    catalog.changed([instance.pk])
+    # остаток, заданный вручную (админка, PUT/PATCH, create), идёт на основной
+    # склад: у каждого товара есть строка StockLevel, ?branch= его видит
+    old = Decimal('0') if created else instance._old_quantity
+    if old is not None:
+        delta = Decimal(str(instance.quantity)) - old
+        if created or delta:
+            apply_level_deltas({instance.pk: delta}, DEFAULT_BRANCH)
+
+
+@receiver(post_delete, sender=Stock)
+def stock_deleted_version(sender, instance, **kwargs):
+    catalog.changed(deleted_ids=[instance.pk])
+
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance, **kwargs):
+    # название категории входит в ответ /stocks/ — товары тоже меняются
+    catalog.changed(Stock.objects.filter(category=instance).values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Category)
+def category_before_delete(sender, instance, **kwargs):
+    # до SET_NULL: потом товары категории уже не найти
+    catalog.changed(Stock.objects.filter(category=instance).values_list('pk', flat=True))
+
+
+# ---------- кэш ответов GET (товары — через catalog.changed) -----------------
+
+@receiver([post_save, post_delete], sender=Category)
+def category_changed_response_cache(sender, instance, **kwargs):
+    response_cache.invalidate('category')
+
+
+@receiver([post_save, post_delete], sender=CashSession)
+def cash_session_changed(sender, instance, **kwargs):
+    response_cache.invalidate('cashsession')
+
+
+# ---------- итоги по транзакциям ---------------------------------------------
+
+@receiver(pre_save, sender=Transaction)
+def transaction_before_save(sender, instance, **kwargs):
+    instance._old_bucket = None
+    if instance.pk is not None:
+        instance._old_bucket = (
+            Transaction.objects.filter(pk=instance.pk).values_list('date', 'type').first()
+        )
+
+
+@receiver(post_save, sender=Transaction)
+def transaction_saved(sender, instance, created, **kwargs):
+    if created:
+        add_transactions([instance])
+    else:
+        keys = {(instance.date, instance.type)}
+        if instance._old_bucket:
+            keys.add(instance._old_bucket)
+        rebuild_transaction_totals(keys)
+
+
+@receiver(post_delete, sender=Transaction)
+def transaction_deleted(sender, instance, **kwargs):
+    rebuild_transaction_totals({(instance.date, instance.type)})
+
+
+# ---------- итоги продаж ------------------------------------------------------
+# всё, что создано через save(), учитывают сигналы ниже; bulk_create сигналов
+# не шлёт — такие продажи и возвраты добавляют в итоги сами services
+# (checkout_batch, return_items)
+
+@receiver(pre_save, sender=SaleHistory)
+def sale_before_save(sender, instance, **kwargs):
+    instance._old_bucket = None
+    if instance.pk is not None:
+        instance._old_bucket = (
+            SaleHistory.objects.filter(pk=instance.pk).values('date', 'payment_type', 'total').first()
+        )
+
+
+@receiver(post_save, sender=SaleHistory)
+def sale_saved(sender, instance, created, **kwargs):
+    old = instance._old_bucket
+    if created or old is None:
+        # новый чек — из checkout, админки, фикстур: delete его вычтет
+        add_sales([instance])
+        return
+    if (old['date'], old['payment_type'], Decimal(old['total'])) == (
+        instance.date, instance.payment_type, Decimal(str(instance.total))
+    ):
+        return
+    # правка чека: старые значения вычитаются, новые добавляются
+    add_sales([SaleHistory(**old)], sign=-1)
+    add_sales([instance])
+    if old['payment_type'] != instance.payment_type:
+        # возвраты учтены по типу оплаты продажи — переносим их
+        returns = list(ReturnItem.objects.filter(sale_item__sale=instance).select_related('sale_item'))
+        add_returns(returns, sign=-1, payment_type=old['payment_type'])
+        add_returns(returns, payment_type=instance.payment_type)
+
+
+@receiver(post_delete, sender=SaleHistory)
+def sale_deleted(sender, instance, **kwargs):
+    add_sales([instance], sign=-1)
+
+
+@receiver(pre_save, sender=ReturnItem)
+def return_item_before_save(sender, instance, **kwargs):
+    instance._old_return = None
+    if instance.pk is not None:
+        instance._old_return = ReturnItem.objects.select_related('sale_item__sale').filter(pk=instance.pk).first()
+
+
+@receiver(post_save, sender=ReturnItem)
+def return_item_saved(sender, instance, created, **kwargs):
+    # правка возврата (количество, дата, позиция): старое вычитается, новое добавляется
+    if instance._old_return is not None:
+        add_returns([instance._old_return], sign=-1)
+    add_returns([instance])
+
+
+@receiver(pre_delete, sender=ReturnItem)
+def return_item_before_delete(sender, instance, **kwargs):
+    # в том числе каскадом вместе с продажей: позиция и чек ещё в базе
+    add_returns([instance], sign=-1)
@@ -1,3 +1,1058 @@
-from django.test import TestCase
+import gzip
+import json
+import threading
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, connections
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import idempotency
+from .checks import local_memory_cache
+from .cache import StockRef, StockResolverCache, stock_resolver_cache
+from .ledger import annotate_quantity_as_of, reconcile, take_snapshot
+from .models import (
+    DEFAULT_BRANCH, CatalogVersion, Category, DailyStockDemand, DispatchHistory, DispatchItem, IdempotencyKey,
+    ReturnItem, SaleHistory, SaleItem, SalesTotals, Stock, StockLevel, StockMovement, StockSnapshot, Transaction
+)
+from .reorder import refresh_demand
+from .services import resolve_stock_refs
+
+
+@override_settings(RESPONSE_CACHE_TTL=0)
+class ListQueryCountTests(TestCase):
+    """
+    Число запросов на списке не должно зависеть от числа строк (N+1).
+    Считаем запросы при N и при 3N строках — значения обязаны совпасть.
+    Кэш ответов выключен: считаем запросы самого списка.
+    """
+    api_endpoints = [
+        '/clients/transactions/',
+        '/clients/categories/',
+        '/clients/stocks/',
+        '/clients/sales/',
+        '/clients/stock-movements/',
+        '/clients/returns/',
+        '/clients/cash-sessions/',
+        '/clients/dispatches/',
+    ]
+    admin_endpoints = [
+        '/admin/clients/stock/',
+        '/admin/clients/salehistory/',
+        '/admin/clients/stockmovement/',
+        '/admin/clients/returnitem/',
+        '/admin/clients/dispatchhistory/',
+        '/admin/clients/dispatchitem/',
+    ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.seq = 0
+
+    def seed(self, n):
+        for _ in range(n):
+            self.seq += 1
+            i = self.seq
+            category = Category.objects.create(name=f'cat-{i}')
+            stock = Stock.objects.create(
+                code=f'code-{i}', name=f'stock-{i}', price=10, quantity=100,
+                unit='шт', category=category
+            )
+            sale = SaleHistory.objects.create(payment_type='cash', total=20)
+            sale_item = SaleItem.objects.create(
+                sale=sale, code=stock.code, name=stock.name, price=10, quantity=2, total=20
+            )
+            StockMovement.objects.create(stock=stock, movement_type='sale', quantity=2, sale=sale)
+            ReturnItem.objects.create(sale_item=sale_item, quantity=1, branch='Сокулук')
+            dispatch = DispatchHistory.objects.create(recipient=f'r-{i}', total=10)
+            DispatchItem.objects.create(
+                dispatch=dispatch, stock=stock, code=stock.code, name=stock.name,
+                quantity=1, price=10, total=10
+            )
+            Transaction.objects.create(type='income', name=f't-{i}', amount=Decimal('1.00'))
+
+    def count_queries(self, url):
+        # версия каталога (ETag) читается из кэша — оба замера начинают с пустого
+        cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return len(ctx)
+
+    def assert_constant(self, urls):
+        self.seed(2)
+        before = {url: self.count_queries(url) for url in urls}
+        self.seed(6)
+        after = {url: self.count_queries(url) for url in urls}
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(before[url], after[url])
+
+    def test_api_lists(self):
+        self.assert_constant(self.api_endpoints)
+
+    def test_sparse_fields_skip_items(self):
+        self.seed(2)
+        for url in ('/clients/sales/', '/clients/dispatches/'):
+            with self.subTest(url=url):
+                full = self.count_queries(url)
+                self.assertEqual(self.count_queries(f'{url}?fields=id,total'), full - 1)
+                self.assertEqual(self.count_queries(f'{url}?fields=id,items'), full)
+
+    def test_admin_changelists(self):
+        user = get_user_model().objects.create_superuser('admin', 'a@a.kg', 'pass')
+        self.client.force_login(user)
+        self.assert_constant(self.admin_endpoints)
+
+
+class ConcurrentCheckoutTests(TransactionTestCase):
+    """
+    Несколько касс одновременно продают один товар.
+    Итоговый остаток обязан сходиться с журналом движений.
+    """
+    threads = 8
+    sales_per_thread = 5
+
+    def setUp(self):
+        # flush между тестами не шлёт сигналы — кэш штрихкодов чистим сами
+        stock_resolver_cache.clear()
+        self.stock = Stock.objects.create(code='777', name='Молоко', price=50, quantity=0, unit='шт')
+
+    def set_quantity(self, quantity):
+        # мимо сигналов: остаток филиала продажи ставим вместе с общим
+        Stock.objects.filter(pk=self.stock.pk).update(quantity=quantity)
+        StockLevel.objects.filter(stock=self.stock, branch=DEFAULT_BRANCH).update(quantity=quantity)
+        return Decimal(quantity)
+
+    def run_checkouts(self):
+        statuses = []
+        lock = threading.Lock()
+        start = threading.Barrier(self.threads)
+
+        def till():
+            client = APIClient()
+            start.wait()
+            try:
+                for _ in range(self.sales_per_thread):
+                    response = client.post('/clients/sales/', {
+                        'payment_type': 'cash',
+                        'total': '50.00',
+                        'items': [{'code': '777', 'name': 'Молоко', 'price': '50.00', 'quantity': 1, 'total': '50.00'}],
+                    }, format='json')
+                    with lock:
+                        statuses.append(response.status_code)
+            finally:
+                connections.close_all()
+
+        workers = [threading.Thread(target=till) for _ in range(self.threads)]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        return statuses
+
+    def movement_sum(self, movement_type):
+        return StockMovement.objects.filter(
+            stock=self.stock, movement_type=movement_type
+        ).aggregate(s=Sum('quantity'))['s'] or Decimal('0')
+
+    def assert_ledger_matches(self, initial):
+        self.stock.refresh_from_db()
+        ledger = initial - self.movement_sum('sale') + self.movement_sum('backorder')
+        self.assertEqual(self.stock.quantity, ledger)
+
+    @override_settings(STOCK_OVERSELL_POLICY='allow')
+    def test_allow_no_lost_updates(self):
+        initial = self.set_quantity(10)
+        statuses = self.run_checkouts()
+
+        total = self.threads * self.sales_per_thread
+        self.assertEqual(statuses, [201] * total)
+        self.assertEqual(self.movement_sum('sale'), total)
+        self.assert_ledger_matches(initial)
+        self.assertEqual(self.stock.quantity, initial - total)
+
+    @override_settings(STOCK_OVERSELL_POLICY='reject')
+    def test_reject_never_oversells(self):
+        initial = self.set_quantity(7)
+        statuses = self.run_checkouts()
+
+        self.assertEqual(statuses.count(201), 7)
+        self.assertEqual(SaleHistory.objects.count(), 7)
+        self.assert_ledger_matches(initial)
+        self.assertEqual(self.stock.quantity, 0)
+
+    @override_settings(STOCK_OVERSELL_POLICY='backorder')
+    def test_backorder_clamps_at_zero(self):
+        initial = self.set_quantity(7)
+        statuses = self.run_checkouts()
+
+        total = self.threads * self.sales_per_thread
+        self.assertEqual(statuses, [201] * total)
+        self.assertEqual(self.movement_sum('backorder'), total - 7)
+        self.assert_ledger_matches(initial)
+        self.assertEqual(self.stock.quantity, 0)
+
+
+class StockResolverCacheTests(TestCase):
+    """Запись кэша штрихкодов живёт не дольше TTL и не переживает смену версии каталога."""
+
+    def setUp(self):
+        self.cache = StockResolverCache(10, ttl=60)
+        self.cache.check_version(1)
+        self.cache.set_many({'731': StockRef(1, 'Кофе', 100, 80, 'шт')})
+
+    def test_ttl(self):
+        self.assertEqual(self.cache.get_many(['731'])[1], [])
+        with mock.patch('clients.cache.time.monotonic', return_value=time.monotonic() + 61):
+            self.assertEqual(self.cache.get_many(['731'])[1], ['731'])
+
+    def test_version_change(self):
+        self.cache.check_version(1)
+        self.assertEqual(self.cache.get_many(['731'])[1], [])
+        self.cache.check_version(2)
+        self.assertEqual(self.cache.get_many(['731'])[1], ['731'])
+
+    @override_settings(SHARED_CACHE=True, CATALOG_STAMP_TTL=30)
+    def test_barcode_moved_in_other_worker(self):
+        cache.clear()
+        stock_resolver_cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            old = Stock.objects.create(code='732', name='Чай', price=50, quantity=5, unit='шт')
+        self.assertEqual(resolve_stock_refs(['732'])['732'].id, old.pk)
+        # другой воркер: штрихкод переехал, а сигнал до нашего кэша не дошёл
+        with mock.patch.object(stock_resolver_cache, 'invalidate_stock'), \
+                mock.patch.object(stock_resolver_cache, 'invalidate_code'), \
+                self.captureOnCommitCallbacks(execute=True):
+            old.code = '733'
+            old.save()
+            new = Stock.objects.create(code='732', name='Чай зелёный', price=60, quantity=5, unit='шт')
+        self.assertEqual(resolve_stock_refs(['732'])['732'].id, new.pk)
+
+class ReturnItemTests(TestCase):
+    """Нельзя вернуть больше, чем продано; ошибка в строке отклоняет всю партию."""
+
+    def setUp(self):
+        stock_resolver_cache.clear()
+        self.client = APIClient()
+        self.stock = Stock.objects.create(code='555', name='Кефир', price=40, quantity=10, unit='шт')
+        sale = SaleHistory.objects.create(payment_type='cash', total=120)
+        self.item = SaleItem.objects.create(sale=sale, code='555', name='Кефир', price=40, quantity=3, total=120)
+
+    def post(self, data):
+        return self.client.post('/clients/returns/', data, format='json')
+
+    def test_returnable_quantity(self):
+        self.assertEqual(self.post({'sale_item': self.item.pk, 'quantity': 2, 'branch': 'Сокулук'}).status_code, 201)
+        response = self.post({'sale_item': self.item.pk, 'quantity': 2, 'branch': 'Сокулук'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('quantity', response.data)
+        self.assertEqual(self.post({'sale_item': self.item.pk, 'quantity': 1, 'branch': 'Сокулук'}).status_code, 201)
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantity, 13)
+
+    def test_batch_rejected_as_a_whole(self):
+        # вместе строки превышают проданное — не проходит ни одна
+        response = self.post([
+            {'sale_item': self.item.pk, 'quantity': 2, 'branch': 'Сокулук'},
+            {'sale_item': self.item.pk, 'quantity': 2, 'branch': 'Сокулук'},
+            {'sale_item': 999999, 'quantity': 1, 'branch': 'Сокулук'},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data[0], {})
+        self.assertIn('quantity', response.data[1])
+        self.assertIn('sale_item', response.data[2])
+        self.assertFalse(ReturnItem.objects.exists())
+        self.assertFalse(StockMovement.objects.filter(movement_type='return').exists())
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantity, 10)
+
+
+    def test_update_validated(self):
+        return_id = self.post({'sale_item': self.item.pk, 'quantity': 1, 'branch': 'Сокулук'}).data['id']
+        url = f'/clients/returns/{return_id}/'
+        response = self.client.patch(url, {'sale_item': 999999}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('sale_item', response.data)
+        response = self.client.patch(url, {'quantity': 4}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('quantity', response.data)
+
+        self.assertEqual(self.client.patch(url, {'quantity': 3}, format='json').status_code, 200)
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantity, 13)
+        self.assertEqual(SalesTotals.objects.get(period='day').returns, Decimal('120.00'))
+
+class ConcurrentReturnTests(TransactionTestCase):
+    """Одновременные возвраты одной позиции не превышают проданное."""
+    threads = 6
+
+    def test_no_over_return(self):
+        stock_resolver_cache.clear()
+        Stock.objects.create(code='556', name='Ряженка', price=40, quantity=0, unit='шт')
+        sale = SaleHistory.objects.create(payment_type='cash', total=120)
+        item = SaleItem.objects.create(sale=sale, code='556', name='Ряженка', price=40, quantity=3, total=120)
+
+        statuses = []
+        lock = threading.Lock()
+        start = threading.Barrier(self.threads)
+
+        def till():
+            client = APIClient()
+            start.wait()
+            try:
+                response = client.post('/clients/returns/', {'sale_item': item.pk, 'quantity': 1, 'branch': 'Сокулук'}, format='json')
+                with lock:
+                    statuses.append(response.status_code)
+            finally:
+                connections.close_all()
+
+        workers = [threading.Thread(target=till) for _ in range(self.threads)]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+
+        self.assertEqual(statuses.count(201), 3)
+        self.assertEqual(statuses.count(400), self.threads - 3)
+        self.assertEqual(ReturnItem.objects.filter(sale_item=item).aggregate(s=Sum('quantity'))['s'], 3)
+
+
+class SalesTotalsTests(TestCase):
+    """Правка и удаление чека не оставляют расхождений в SalesTotals."""
+
+    def setUp(self):
+        stock_resolver_cache.clear()
+        self.client = APIClient()
+        Stock.objects.create(code='557', name='Сыр', price=50, quantity=10, unit='шт')
+
+    def totals(self):
+        return SalesTotals.objects.filter(period='day').aggregate(
+            receipts=Sum('receipts'), revenue=Sum('revenue'), returns=Sum('returns')
+        )
+
+    def test_update_and_cascaded_delete(self):
+        response = self.client.post('/clients/sales/', {
+            'payment_type': 'cash', 'total': '50.00',
+            'items': [{'code': '557', 'name': 'Сыр', 'price': '50.00', 'quantity': 1, 'total': '50.00'}],
+        }, format='json')
+        sale_id = response.data['id']
+        item_id = SaleItem.objects.get(sale_id=sale_id).pk
+        self.client.post('/clients/returns/', {'sale_item': item_id, 'quantity': 1, 'branch': 'Сокулук'}, format='json')
+
+        self.client.patch(f'/clients/sales/{sale_id}/', {'total': '1000.00', 'payment_type': 'card'}, format='json')
+        self.assertEqual(self.totals(), {'receipts': 1, 'revenue': Decimal('1000.00'), 'returns': Decimal('50.00')})
+        self.assertEqual(
+            SalesTotals.objects.get(period='day', payment_type='card').returns, Decimal('50.00')
+        )
+
+        self.client.delete(f'/clients/sales/{sale_id}/')
+        self.assertEqual(self.totals(), {'receipts': 0, 'revenue': Decimal('0.00'), 'returns': Decimal('0.00')})
+
+
+    def test_orm_sale_and_return_edit(self):
+        # чек не через checkout (админка, фикстуры) — delete не должен уводить итоги в минус
+        sale = SaleHistory.objects.create(payment_type='cash', total=100)
+        self.assertEqual(self.totals()['receipts'], 1)
+        item = SaleItem.objects.create(sale=sale, code='557', name='Сыр', price=50, quantity=2, total=100)
+
+        ret = ReturnItem.objects.create(sale_item=item, quantity=1, branch='Сокулук')
+        self.assertEqual(self.totals()['returns'], Decimal('50.00'))
+        ret.quantity = 2
+        ret.save()
+        self.assertEqual(self.totals()['returns'], Decimal('100.00'))
+
+        sale.delete()
+        self.assertEqual(self.totals(), {'receipts': 0, 'revenue': Decimal('0.00'), 'returns': Decimal('0.00')})
+
+class IdempotencyKeyTests(TestCase):
+    """Повтор POST с тем же Idempotency-Key не проводит продажу второй раз."""
+
+    sale = {
+        'payment_type': 'cash', 'total': '50.00',
+        'items': [{'code': '558', 'name': 'Хлеб', 'price': '50.00', 'quantity': 1, 'total': '50.00'}],
+    }
+
+    def setUp(self):
+        stock_resolver_cache.clear()
+        self.client = APIClient()
+        self.stock = Stock.objects.create(code='558', name='Хлеб', price=50, quantity=10, unit='шт')
+
+    def post(self, data, key='till-1-0001'):
+        return self.client.post('/clients/sales/', data, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_replay(self):
+        first = self.post(self.sale)
+        second = self.post(self.sale)
+        self.assertEqual((first.status_code, second.status_code), (201, 201))
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(second.data['id'], first.data['id'])
+        self.assertEqual(SaleHistory.objects.count(), 1)
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantity, 9)
+
+    def test_other_body_rejected(self):
+        self.post(self.sale)
+        response = self.post({**self.sale, 'payment_type': 'card'})
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(SaleHistory.objects.count(), 1)
+
+    def test_pending_key_conflict(self):
+        IdempotencyKey.objects.create(
+            key='till-1-0001', path='/clients/sales/',
+            fingerprint=idempotency.fingerprint(SimpleNamespace(data=self.sale)),
+        )
+        response = self.post(self.sale)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertFalse(SaleHistory.objects.exists())
+
+    def test_failed_store_rolls_back_sale(self):
+        # ответ не сохранился — продажа тоже не должна остаться
+        with mock.patch.object(IdempotencyKey, 'save', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.post(self.sale)
+        self.assertFalse(SaleHistory.objects.exists())
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantity, 10)
+
+
+class SalesSyncTests(TestCase):
+    """POST /sales/sync/: повторы по client_uuid, сжатое тело, политика 'reject'."""
+
+    def setUp(self):
+        stock_resolver_cache.clear()
+        self.client = APIClient()
+        self.stock = Stock.objects.create(code='559', name='Чай', price=50, quantity=3, unit='шт')
+
+    def entry(self, uuid, minute, quantity=1):
+        return {
+            'client_uuid': uuid, 'date': f'2026-01-10T10:{minute:02d}:00Z',
+            'payment_type': 'cash', 'total': f'{50 * quantity}.00',
+            'items': [{'code': '559', 'name': 'Чай', 'price': '50.00', 'quantity': quantity, 'total': f'{50 * quantity}.00'}],
+        }
+
+    def sync(self, entries):
+        return self.client.post('/clients/sales/sync/', entries, format='json')
+
+    def test_uuid_dedupe(self):
+        uuid = '11111111-1111-1111-1111-111111111111'
+        response = self.sync([self.entry(uuid, 0), self.entry(uuid, 1)])
+        created, repeat = response.data['results']
+        self.assertEqual((created['status'], repeat['status']), ('created', 'duplicate'))
+        self.assertEqual(repeat['sale'], created['sale'])
+
+        again = self.sync([self.entry(uuid, 0)]).data
+        self.assertEqual((again['duplicate'], again['results'][0]['sale']), (1, created['sale']))
+        self.assertEqual(SaleHistory.objects.count(), 1)
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantity, 2)
+
+    def test_gzip_body(self):
+        body = gzip.compress(json.dumps({'sales': [self.entry('22222222-2222-2222-2222-222222222222', 0)]}).encode())
+        response = self.client.post(
+            '/clients/sales/sync/', body, content_type='application/json', HTTP_CONTENT_ENCODING='gzip'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], 1)
+
+    @override_settings(SALES_SYNC_CONFLICT_POLICY='reject')
+    def test_reject_policy_per_sale(self):
+        # в наличии 3: проходят чеки по порядку времени, пока хватает товара
+        response = self.sync([
+            self.entry('33333333-3333-3333-3333-333333333333', 2, quantity=2),
+            self.entry('44444444-4444-4444-4444-444444444444', 0, quantity=2),
+            self.entry('55555555-5555-5555-5555-555555555555', 1, quantity=1),
+        ])
+        statuses = [r['status'] for r in response.data['results']]
+        self.assertEqual(statuses, ['rejected', 'created', 'created'])
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantity, 0)
+
+
+@override_settings(RESPONSE_CACHE_TTL=0)
+class StockBarcodeTests(TestCase):
+    """Штрихкод другого товара не принимается — ни через API, ни через админку."""
+
+    def setUp(self):
+        stock_resolver_cache.clear()
+        self.client = APIClient()
+        self.milk = Stock.objects.create(code='601', name='Молоко', price=60, quantity=5, unit='шт')
+        self.bread = Stock.objects.create(code='602', name='Хлеб', price=30, quantity=5, unit='шт')
+
+    def test_api_rejects_foreign_barcode(self):
+        response = self.client.patch(f'/clients/stocks/{self.bread.pk}/', {'code': '602, 601'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('601', str(response.data['code']))
+        self.assertEqual(list(self.milk.barcodes.values_list('barcode', flat=True)), ['601'])
+
+        response = self.client.patch(f'/clients/stocks/{self.bread.pk}/', {'code': '602, 603'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(self.bread.barcodes.values_list('barcode', flat=True)), ['602', '603'])
+
+    def test_clean_rejects_foreign_barcode(self):
+        self.bread.code = '601'
+        with self.assertRaises(ValidationError):
+            self.bread.clean()
+        self.bread.code = '602'
+        self.bread.clean()
+
+
+class ExportErrorTests(TestCase):
+    """Ошибки при ?format=csv|ndjson приходят JSON'ом, а не под text/csv."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.sale = SaleHistory.objects.create(payment_type='cash', total=10)
+
+    def test_list_error_is_json(self):
+        response = self.client.get('/clients/sales/?format=csv&date_from=xx')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertIn('date_from', response.json())
+
+    def test_export_only_for_list(self):
+        response = self.client.get(f'/clients/sales/{self.sale.pk}/?format=ndjson')
+        self.assertEqual(response.status_code, 406)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(self.client.get('/clients/sales/?format=csv')['Content-Type'], 'text/csv; charset=utf-8')
+
+
+@override_settings(RESPONSE_CACHE_TTL=0)
+class ReceiveStockTests(TestCase):
+    """Приход: известный штрихкод пополняет товар, новый — создаёт; каждая строка — движение 'in'."""
+
+    def setUp(self):
+        stock_resolver_cache.clear()
+        self.client = APIClient()
+
+    def receive(self, data):
+        return self.client.post('/clients/stocks/', data, format='json')
+
+    def row(self, codes, quantity):
+        return {'code': codes, 'name': 'Сыр', 'price': '300.00', 'quantity': quantity, 'unit': 'кг'}
+
+    def test_created_then_updated(self):
+        response = self.receive([self.row(['701'], 2), self.row(['701', '702'], 3)])
+        self.assertEqual(response.status_code, 201)
+        first, second = response.data
+        self.assertEqual((first['status'], second['status']), ('created', 'created'))
+        self.assertEqual(first['stock']['id'], second['stock']['id'])
+
+        response = self.receive(self.row(['702', '703'], 4))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data[0]['status'], 'updated')
+        stock = Stock.objects.get()
+        self.assertEqual((stock.quantity, stock.fixed_quantity), (9, 9))
+        self.assertEqual(sorted(stock.barcodes.values_list('barcode', flat=True)), ['701', '702', '703'])
+        self.assertEqual(
+            list(StockMovement.objects.filter(stock=stock, movement_type='in').order_by('pk').values_list('quantity', flat=True)),
+            [2, 3, 4],
+        )
+
+    def test_conflicting_owners_rejected(self):
+        Stock.objects.create(code='711', name='Масло', price=200, quantity=1, unit='шт')
+        Stock.objects.create(code='712', name='Маргарин', price=90, quantity=1, unit='шт')
+        response = self.receive([self.row(['713'], 1), self.row(['711', '712'], 1)])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data[0], {})
+        self.assertIn('code', response.data[1])
+        self.assertFalse(Stock.objects.filter(barcodes__barcode='713').exists())
+        self.assertFalse(StockMovement.objects.filter(movement_type='in').exists())
+
+
+    def test_fixed_quantity_honoured(self):
+        self.receive(dict(self.row(['751'], 5), fixed_quantity='20.00'))
+        self.receive(dict(self.row(['751'], 1), fixed_quantity='3.00'))
+        self.receive(self.row(['751'], 2))
+        stock = Stock.objects.get()
+        self.assertEqual((stock.quantity, stock.fixed_quantity), (8, 25))
+
+    def test_merged_codes_fit_the_column(self):
+        long_codes = [str(n) * 50 for n in range(1, 7)]     # 6 × 50 символов + запятые > 255
+        response = self.receive([self.row(long_codes[:3], 1), self.row(long_codes[2:], 1)])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data[0], {})
+        self.assertIn('code', response.data[1])
+        self.assertFalse(Stock.objects.exists())
+
+        self.receive(self.row(long_codes[:3], 1))
+        response = self.receive(self.row(long_codes[2:], 1))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(Stock.objects.get().code), 152)
+
+@override_settings(RESPONSE_CACHE_TTL=0, CATALOG_STAMP_TTL=0)
+class CatalogVersionTests(TestCase):
+    """ETag/304 для списка товаров и дельта /stocks/changes/?since=."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        # версия выдаётся после коммита — в TestCase коммита нет, колбэки выполняем сами
+        with self.captureOnCommitCallbacks(execute=True):
+            self.milk = Stock.objects.create(code='721', name='Молоко', price=60, quantity=5, unit='шт')
+            self.bread = Stock.objects.create(code='722', name='Хлеб', price=30, quantity=5, unit='шт')
+
+    def test_if_none_match(self):
+        response = self.client.get('/clients/stocks/')
+        self.assertEqual(response.status_code, 200)
+        tag = response['ETag']
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/clients/stocks/', HTTP_IF_NONE_MATCH=tag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/clients/stocks/{self.milk.pk}/', {'price': '65.00'}, format='json')
+        response = self.client.get('/clients/stocks/', HTTP_IF_NONE_MATCH=tag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], tag)
+
+    def test_sale_keeps_version(self):
+        # продажа не берёт номер версии, но ETag списка меняется — по журналу движений
+        response = self.client.get('/clients/stocks/')
+        tag, version = response['ETag'], response['X-Catalog-Version']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/clients/sales/', {
+                'payment_type': 'cash', 'total': '60.00',
+                'items': [{'code': '721', 'name': 'Молоко', 'price': '60.00', 'quantity': 1, 'total': '60.00'}],
+            }, format='json')
+        self.assertEqual(CatalogVersion.objects.get().version, int(version))
+
+        response = self.client.get('/clients/stocks/', HTTP_IF_NONE_MATCH=tag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Catalog-Version'], version)
+        self.assertEqual(self.client.get(f'/clients/stocks/changes/?since={version}').data['items'], [])
+
+    def test_as_of_not_conditional(self):
+        # остаток на дату меняют движения сверки, версия каталога при этом та же
+        Stock.objects.filter(pk=self.milk.pk).update(quantity=9)     # мимо журнала
+        url = f'/clients/stocks/?as_of={(date.today() - timedelta(days=1)).isoformat()}'
+        response = self.client.get(url)
+        self.assertNotIn('ETag', response)
+        quantities = {item['id']: item['quantity_as_of'] for item in response.data}
+        self.assertEqual(Decimal(quantities[self.milk.pk]), 9)
+
+        tag = self.client.get('/clients/stocks/')['ETag']
+        self.client.post('/clients/stocks/reconcile/')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=tag)
+        self.assertEqual(response.status_code, 200)
+        quantities = {item['id']: item['quantity_as_of'] for item in response.data}
+        self.assertEqual(Decimal(quantities[self.milk.pk]), 5)
+
+    def test_changes_since(self):
+        since = int(self.client.get('/clients/stocks/')['X-Catalog-Version'])
+        bread_id = self.bread.pk
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/clients/stocks/{self.milk.pk}/', {'price': '65.00'}, format='json')
+            self.bread.delete()
+
+        data = self.client.get(f'/clients/stocks/changes/?since={since}').data
+        self.assertFalse(data['reset'])
+        self.assertEqual([item['id'] for item in data['items']], [self.milk.pk])
+        self.assertEqual(data['deleted'], [bread_id])
+        self.assertGreater(data['version'], since)
+
+        data = self.client.get(f"/clients/stocks/changes/?since={data['version']}").data
+        self.assertEqual((data['items'], data['deleted']), ([], []))
+
+        # версия кассы новее серверной — каталог целиком
+        data = self.client.get(f"/clients/stocks/changes/?since={data['version'] + 100}").data
+        self.assertTrue(data['reset'])
+        self.assertEqual([item['id'] for item in data['items']], [self.milk.pk])
+
+
+@override_settings(RESPONSE_CACHE_TTL=0)
+class StockSnapshotTests(TestCase):
+    """Остаток на дату = снимок + движения после него, без двойного счёта."""
+
+    def setUp(self):
+        stock_resolver_cache.clear()
+        self.client = APIClient()
+        self.stock = Stock.objects.create(code='741', name='Рис', price=90, quantity=10, unit='кг')
+
+    def sell(self, quantity):
+        self.client.post('/clients/sales/', {
+            'payment_type': 'cash', 'total': f'{90 * quantity}.00',
+            'items': [{'code': '741', 'name': 'Рис', 'price': '90.00', 'quantity': quantity, 'total': f'{90 * quantity}.00'}],
+        }, format='json')
+
+    def as_of_now(self):
+        moment = timezone.now() + timedelta(seconds=1)
+        return annotate_quantity_as_of(Stock.objects.filter(pk=self.stock.pk), moment).get().quantity_as_of
+
+    def test_sale_waiting_for_lock_counted_once(self):
+        # продажа коммитится, пока снимок ждёт блокировку записи
+        with mock.patch('clients.ledger._lock_stock_writes', side_effect=lambda: self.sell(3)):
+            take_snapshot()
+        self.assertEqual(StockSnapshot.objects.get(stock=self.stock).quantity, 7)
+        self.assertEqual(self.as_of_now(), 7)
+
+    def test_close_session_takes_snapshot(self):
+        self.sell(2)
+        session_id = self.client.post('/clients/cash-sessions/open/', {'opening_sum': 0}, format='json').data['id']
+        self.assertEqual(self.client.post(f'/clients/cash-sessions/{session_id}/close/', {}, format='json').status_code, 200)
+        self.assertEqual(StockSnapshot.objects.get(stock=self.stock).quantity, 8)
+        self.sell(1)
+        self.assertEqual(self.as_of_now(), 7)
+
+
+@override_settings(RESPONSE_CACHE_TTL=0)
+class DispatchTests(TestCase):
+    """Отправка списывает остаток; позиция с неизвестным кодом — ошибка, отправка не проводится."""
+
+    def setUp(self):
+        stock_resolver_cache.clear()
+        self.client = APIClient()
+        self.stock = Stock.objects.create(code='761', name='Мука', price=40, quantity=10, unit='кг')
+
+    def dispatch(self, *codes):
+        return self.client.post('/clients/dispatches/', {
+            'recipient': 'Магазин №2', 'total': '0.00',
+            'items': [
+                {'code': code, 'name': 'Мука', 'quantity': '2.00', 'price': '40.00', 'total': '80.00'}
+                for code in codes
+            ],
+        }, format='json')
+
+    def test_unknown_code_rejected(self):
+        response = self.dispatch('761', '769')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['items'][0], {})
+        self.assertIn('code', response.data['items'][1])
+        self.assertFalse(DispatchHistory.objects.exists())
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantity, 10)
+
+    def test_dispatch_decrements(self):
+        response = self.dispatch('761', '761')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Decimal(response.data['total']), Decimal('160.00'))
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantity, 6)
+        self.assertEqual(StockMovement.objects.get(movement_type='dispatch').quantity, 4)
+
+
+@override_settings(RESPONSE_CACHE_TTL=0)
+class StockSearchTests(TestCase):
+    """Фильтры списка действуют до limit поиска: выдача не пустеет из-за чужих совпадений."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.dairy, self.bakery = Category.objects.create(name='Молочка'), Category.objects.create(name='Выпечка')
+        for i in range(30):
+            Stock.objects.create(code=f'4870{i:04d}', name=f'Молоко {i}', price=60, quantity=5, unit='шт', category=self.dairy)
+        for i in range(3):
+            Stock.objects.create(code=f'4871{i:04d}', name=f'Молоко топлёное {i}', price=70, quantity=5, unit='шт',
+                                 category=self.bakery)
+
+    def ids(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.data]
+
+    def test_filters_before_limit(self):
+        expected = set(Stock.objects.filter(category=self.bakery).values_list('pk', flat=True))
+        self.assertEqual(set(self.ids(f'/clients/stocks/?search=молоко&limit=10&category={self.bakery.pk}')), expected)
+        # штрихкоды: префикс 487 есть у всех, в категории — только 4871…
+        found = self.ids(f'/clients/stocks/?search=487&limit=2&category={self.bakery.pk}')
+        self.assertEqual(len(found), 2)
+        self.assertLessEqual(set(found), expected)
+        self.assertEqual(len(self.ids('/clients/stocks/?search=молоко&limit=10')), 10)
+
+
+@override_settings(RESPONSE_CACHE_TTL=0)
+class StockLevelTests(TestCase):
+    """Остатки филиалов: строка на создании товара, правка количества, перепродажа в чужом филиале."""
+
+    def setUp(self):
+        stock_resolver_cache.clear()
+        self.client = APIClient()
+        self.stock = Stock.objects.create(code='771', name='Соль', price=20, quantity=10, unit='шт')
+
+    def levels(self):
+        return dict(self.stock.levels.values_list('branch', 'quantity'))
+
+    def sell(self, branch, quantity=2):
+        return self.client.post('/clients/sales/', {
+            'payment_type': 'cash', 'total': f'{20 * quantity}.00', 'branch': branch,
+            'items': [{'code': '771', 'name': 'Соль', 'price': '20.00', 'quantity': quantity, 'total': f'{20 * quantity}.00'}],
+        }, format='json')
+
+    def test_level_follows_stock_edits(self):
+        self.assertEqual(self.levels(), {'Сокулук': 10})
+        self.client.patch(f'/clients/stocks/{self.stock.pk}/', {'quantity': '15.00'}, format='json')
+        self.assertEqual(self.levels(), {'Сокулук': 15})
+        self.sell('Сокулук')
+        self.assertEqual(self.levels(), {'Сокулук': 13})
+
+    @override_settings(STOCK_OVERSELL_POLICY='reject')
+    def test_reject_checks_branch_level(self):
+        # в общем остатке 10, но все — в Сокулуке
+        response = self.sell('Беловодское')
+        self.assertEqual(response.status_code, 400)
+        self.stock.refresh_from_db()
+        self.assertEqual((self.stock.quantity, self.levels()), (10, {'Сокулук': 10}))
+
+    @override_settings(STOCK_OVERSELL_POLICY='allow')
+    def test_oversold_branch_reported(self):
+        self.assertEqual(self.sell('Беловодское').status_code, 201)
+        self.assertEqual(self.levels(), {'Сокулук': 10, 'Беловодское': -2})
+        ids = [s['id'] for s in self.client.get('/clients/stocks/?branch=Беловодское&oversold=true').data]
+        self.assertEqual(ids, [self.stock.pk])
+        self.assertEqual(self.client.get('/clients/stocks/?oversold=true').data, [])
+
+
+@override_settings(RESPONSE_CACHE_TTL=0)
+class StockImportTests(TestCase):
+    """POST /stocks/import/: CSV пачками, прогресс после каждой, ошибки по номерам строк."""
+
+    def setUp(self):
+        stock_resolver_cache.clear()
+        self.client = APIClient()
+        Category.objects.create(name='Бакалея')
+
+    def upload(self, content, batch_size=2):
+        response = self.client.post(
+            f'/clients/stocks/import/?batch_size={batch_size}',
+            {'file': SimpleUploadedFile('stock.csv', content.encode('utf-8-sig'), content_type='text/csv')},
+            format='multipart',
+        )
+        self.assertEqual(response.status_code, 200)
+        return [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+    def test_csv_in_batches(self):
+        lines = self.upload(
+            'code;name;price;quantity;unit;category\n'
+            '781;Гречка;95,50;10;кг;Бакалея\n'
+            '782;Пшено;70;5;кг;\n'
+            '783;Перловка;abc;5;кг;\n'
+            '781;Гречка;96;4;кг;Бакалея\n'
+            '784;Булгур;120;2;кг;Нет такой\n'
+        )
+        self.assertEqual([line['processed'] for line in lines[:-1]], [2, 4, 5])
+        result = lines[-1]
+        self.assertEqual((result['created'], result['updated'], result['errors']), (2, 1, 2))
+        self.assertEqual(sorted(e['line'] for e in result['error_details']), [4, 6])
+        buckwheat = Stock.objects.get(code='781')
+        self.assertEqual((buckwheat.quantity, buckwheat.price, buckwheat.category.name), (14, Decimal('96.00'), 'Бакалея'))
+
+    def test_empty_file(self):
+        self.assertEqual(self.upload('code;name;price;quantity;unit\n'), [
+            {'processed': 0, 'created': 0, 'updated': 0, 'errors': 0, 'error_details': []}
+        ])
+
+
+@override_settings(RESPONSE_CACHE_TTL=0)
+class ReconcileTests(TestCase):
+    """Сверка остатков с журналом: продажи сходятся, правка мимо журнала — расхождение и adjust."""
+
+    def setUp(self):
+        stock_resolver_cache.clear()
+        self.client = APIClient()
+        self.stocks = [
+            Stock.objects.create(code=f'79{i}', name=f'Сок {i}', price=80, quantity=10, unit='шт')
+            for i in range(3)
+        ]
+        self.client.post('/clients/sales/', {
+            'payment_type': 'cash', 'total': '160.00',
+            'items': [{'code': '790', 'name': 'Сок 0', 'price': '80.00', 'quantity': 2, 'total': '160.00'}],
+        }, format='json')
+        Stock.objects.filter(pk=self.stocks[2].pk).update(quantity=7)     # мимо журнала
+
+    def test_report_then_fix(self):
+        report = self.client.get('/clients/stocks/reconcile/').data
+        self.assertEqual(report['count'], 1)
+        self.assertEqual((report['mismatches'][0]['stock'], report['mismatches'][0]['diff']), (self.stocks[2].pk, -3))
+        self.assertFalse(StockMovement.objects.filter(movement_type='adjust').exists())
+
+        self.assertTrue(self.client.post('/clients/stocks/reconcile/').data['fixed'])
+        self.assertEqual(StockMovement.objects.get(movement_type='adjust').quantity, -3)
+        self.assertEqual(self.client.get('/clients/stocks/reconcile/').data['count'], 0)
+
+    def test_chunks(self):
+        # пачки по одному товару дают то же, что и одна пачка
+        self.assertEqual(list(reconcile(chunk_size=1)), list(reconcile()))
+        out = StringIO()
+        call_command('reconcile_stock', '--chunk-size=1', stdout=out)
+        self.assertIn('Расхождений: 1', out.getvalue())
+
+
+@override_settings(RESPONSE_CACHE_TTL=0)
+class ListFilterTests(TestCase):
+    """Фильтры списков: тип, филиал, FK по id, даты включительно, диапазон суммы, низкий остаток."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.today = timezone.localdate()
+        old = timezone.now() - timedelta(days=3)
+        self.dairy = Category.objects.create(name='Молочка')
+        self.milk = Stock.objects.create(code='801', name='Молоко', price=60, quantity=3, unit='шт', category=self.dairy)
+        self.salt = Stock.objects.create(code='802', name='Соль', price=20, quantity=50, unit='шт')
+        self.cash = SaleHistory.objects.create(payment_type='cash', total=60)
+        self.card = SaleHistory.objects.create(payment_type='card', total=500, branch='Беловодское', date=old)
+        item = SaleItem.objects.create(sale=self.card, code='802', name='Соль', price=20, quantity=25, total=500)
+        self.sale_move = StockMovement.objects.create(stock=self.milk, movement_type='sale', quantity=1, sale=self.cash)
+        self.in_move = StockMovement.objects.create(stock=self.salt, movement_type='in', quantity=50, date=old)
+        self.income = Transaction.objects.create(type='income', name='Выручка', amount=60)
+        self.expense = Transaction.objects.create(type='expense', name='Аренда', amount=100,
+                                                  date=self.today - timedelta(days=3))
+        self.returned = ReturnItem.objects.create(sale_item=item, quantity=1, branch='Беловодское', date=old)
+        ReturnItem.objects.create(sale_item=item, quantity=1, branch='Сокулук')
+
+    def ids(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        data = response.data['results'] if isinstance(response.data, dict) else response.data
+        return {row['id'] for row in data}
+
+    def test_movements(self):
+        self.assertEqual(self.ids('/clients/stock-movements/?movement_type=sale'), {self.sale_move.pk})
+        self.assertEqual(self.ids(f'/clients/stock-movements/?stock={self.salt.pk}'), {self.in_move.pk})
+        self.assertEqual(self.ids(f'/clients/stock-movements/?sale={self.cash.pk}'), {self.sale_move.pk})
+        self.assertEqual(self.ids(f'/clients/stock-movements/?date_from={self.today}'), {self.sale_move.pk})
+        self.assertEqual(self.ids(f'/clients/stock-movements/?date_to={self.today - timedelta(days=1)}'),
+                         {self.in_move.pk})
+
+    def test_sales(self):
+        self.assertEqual(self.ids('/clients/sales/?payment_type=card'), {self.card.pk})
+        self.assertEqual(self.ids('/clients/sales/?branch=Сокулук'), {self.cash.pk})
+        self.assertEqual(self.ids('/clients/sales/?total_min=100'), {self.card.pk})
+        self.assertEqual(self.ids('/clients/sales/?total_max=60'), {self.cash.pk})
+        # date_to включает весь день
+        self.assertEqual(self.ids(f'/clients/sales/?date_from={self.today}&date_to={self.today}'), {self.cash.pk})
+
+    def test_transactions_and_returns(self):
+        self.assertEqual(self.ids('/clients/transactions/?type=expense'), {self.expense.pk})
+        self.assertEqual(self.ids(f'/clients/transactions/?date_to={self.today - timedelta(days=3)}'), {self.expense.pk})
+        self.assertEqual(self.ids(f'/clients/transactions/?date_from={self.today}'), {self.income.pk})
+        self.assertEqual(self.ids('/clients/returns/?branch=Беловодское'), {self.returned.pk})
+        self.assertEqual(self.ids(f'/clients/returns/?date_to={self.today - timedelta(days=1)}'), {self.returned.pk})
+
+    def test_stocks(self):
+        self.assertEqual(self.ids(f'/clients/stocks/?category={self.dairy.pk}'), {self.milk.pk})
+        self.assertEqual(self.ids('/clients/stocks/?low_stock=5'), {self.milk.pk})
+        # с ?branch= — по остатку филиала: соли 50 всего, но в Беловодском 2
+        StockLevel.objects.create(stock=self.salt, branch='Беловодское', quantity=2)
+        self.assertEqual(self.ids('/clients/stocks/?branch=Беловодское&low_stock=5'), {self.salt.pk})
+
+    def test_invalid_choice(self):
+        self.assertEqual(self.client.get('/clients/sales/?payment_type=bitcoin').status_code, 400)
+
+
+@override_settings(RESPONSE_CACHE_TTL=0)
+class ReorderTests(TestCase):
+    """Точка перезаказа: расход за окно минус возвраты, порог дней запаса, кэш до обновления свёртки."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.milk = Stock.objects.create(code='811', name='Молоко', price=60, quantity=10, unit='шт')
+        self.salt = Stock.objects.create(code='812', name='Соль', price=20, quantity=100, unit='шт')
+        self.flour = Stock.objects.create(code='813', name='Мука', price=50, quantity=0, unit='кг')
+        # молоко: 3 в день неделю, 7 вернули — 14 за 7 дней; соль: 7 за неделю
+        for days in range(7):
+            self.move(self.milk, 'sale', 3, days)
+        self.move(self.milk, 'return', 7, 0)
+        self.move(self.salt, 'sale', 7, 1)
+
+    def move(self, stock, movement_type, quantity, days_ago):
+        StockMovement.objects.create(stock=stock, movement_type=movement_type, quantity=quantity,
+                                     date=timezone.now() - timedelta(days=days_ago))
+
+    def report(self, query='window=7&threshold=7'):
+        response = self.client.get(f'/clients/stocks/reorder/?{query}')
+        self.assertEqual(response.status_code, 200)
+        return {item['stock']: item for item in response.data['items']}
+
+    def test_window_and_threshold(self):
+        items = self.report()
+        self.assertEqual(list(items), [self.flour.pk, self.milk.pk])
+        self.assertEqual((items[self.milk.pk]['velocity'], items[self.milk.pk]['days_of_cover']),
+                         (Decimal('2.00'), Decimal('5.0')))
+        self.assertEqual(set(self.report('window=7&threshold=7&all=1')), {self.flour.pk, self.milk.pk, self.salt.pk})
+        # за 28 дней молоко расходуется медленнее: 20 дней запаса
+        self.assertEqual(list(self.report('window=28&threshold=7')), [self.flour.pk])
+        self.assertEqual(self.client.get('/clients/stocks/reorder/?window=0').status_code, 400)
+
+    def test_cached_until_refresh(self):
+        self.report()
+        self.move(self.salt, 'sale', 100, 0)
+        self.assertNotIn(self.salt.pk, self.report())
+        with self.captureOnCommitCallbacks(execute=True):
+            refresh_demand()
+            refresh_demand()
+        # повторное обновление не дублирует дни
+        self.assertEqual(DailyStockDemand.objects.filter(stock=self.salt).count(), 2)
+        self.assertIn(self.salt.pk, self.report())
+
+    def test_command(self):
+        out = StringIO()
+        call_command('refresh_reorder', '--full', stdout=out)
+        self.assertIn('к заказу: 1 товаров', out.getvalue())
+        self.assertEqual(DailyStockDemand.objects.get(stock=self.salt).quantity, 7)
+
+
+@override_settings(RESPONSE_CACHE_TTL=300, CATALOG_STAMP_TTL=300)
+class ResponseCacheTests(TestCase):
+    """Кэш ответов: промах, затем попадание без запросов; запись сбрасывает свою область."""
+
+    def setUp(self):
+        cache.clear()
+        stock_resolver_cache.clear()
+        self.client = APIClient()
+        self.stock = Stock.objects.create(code='821', name='Чай', price=150, quantity=10, unit='шт')
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_hit_after_miss(self):
+        self.assertEqual(self.get('/clients/categories/')['X-Response-Cache'], 'miss')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get('/clients/categories/')['X-Response-Cache'], 'hit')
+        # другие параметры — другая запись
+        self.assertEqual(self.get('/clients/categories/?format=json')['X-Response-Cache'], 'miss')
+
+    def test_write_invalidates_scope(self):
+        self.get('/clients/categories/')
+        self.get('/clients/cash-sessions/')
+        self.client.post('/clients/categories/', {'name': 'Напитки'}, format='json')
+        response = self.get('/clients/categories/')
+        self.assertEqual(response['X-Response-Cache'], 'miss')
+        self.assertEqual([c['name'] for c in response.json()], ['Напитки'])
+        # чужая область не задета
+        self.assertEqual(self.get('/clients/cash-sessions/')['X-Response-Cache'], 'hit')
+
+    def test_sale_invalidates_stocks(self):
+        self.get('/clients/stocks/')
+        self.client.post('/clients/sales/', {
+            'payment_type': 'cash', 'total': '300.00',
+            'items': [{'code': '821', 'name': 'Чай', 'price': '150.00', 'quantity': 2, 'total': '300.00'}],
+        }, format='json')
+        response = self.get('/clients/stocks/')
+        self.assertEqual(response['X-Response-Cache'], 'miss')
+        self.assertEqual(Decimal(response.json()[0]['quantity']), 8)
+
+    def test_skip_params(self):
+        for _ in range(2):
+            self.assertNotIn('X-Response-Cache', self.get(f'/clients/stocks/?as_of={timezone.localdate()}'))
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_local_memory_warning(self):
+        self.assertEqual([w.id for w in local_memory_cache(None)], ['clients.W001'])
+        with override_settings(RESPONSE_CACHE_TTL=0, CATALOG_STAMP_TTL=0):
+            self.assertEqual(local_memory_cache(None), [])
@@ -19,6 +19,7 @@ router.register(r'dispatches', DispatchHistoryViewSet, basename='dispatch')
 
 
 urlpatterns = [
-    path('', include(router.urls)),
+    # до роутера: иначе transactions/<pk>/ перехватывает «summary»
     path('transactions/summary/', transaction_summary),
+    path('', include(router.urls)),
 ]
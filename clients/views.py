@@ -1,108 +1,349 @@
 from rest_framework import viewsets, status, serializers
 from rest_framework.response import Response
 from rest_framework.decorators import action, api_view
-from django.db.models import Sum
-from django.utils.timezone import now
+from rest_framework.parsers import MultiPartParser
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, When
+from django.utils.dateparse import parse_date, parse_datetime
 from datetime import timedelta
 from django.shortcuts import get_object_or_404
-from decimal import Decimal
-
+import json
+
+from . import ledger, rollups
+from .cache import stock_resolver_cache
+from .catalog import CatalogConditionalMixin
+from .exports import ExportMixin
+from .filters import (
+    ReturnItemFilter, SaleHistoryFilter, StockFilter, StockMovementFilter, TransactionFilter
+)
+from .idempotency import IdempotentCreateMixin
+from .importers import DEFAULT_BATCH_SIZE, import_stock, iter_file
+from .pagination import DateCursorPagination
+from .parsers import CompressedJSONParser
+from .reorder import reorder_report
+from .response_cache import ResponseCacheMixin
+from .search import search_stocks
+from .services import checkout_batch
 from .models import (
-    Transaction, Stock, SaleHistory, Category,
-    StockMovement, ReturnItem, CashSession, DispatchHistory
+    BRANCH_CHOICES, Transaction, Stock, SaleHistory, SaleItem, Category,
+    StockMovement, ReturnItem, CashSession, DispatchHistory, DeletedStock
 )
 from .serializers import (
     TransactionSerializer, StockSerializer, SaleHistorySerializer, DispatchHistorySerializer,
-    CategorySerializer, StockMovementSerializer, ReturnItemSerializer, CashSessionSerializer, StockBulkEntrySerializer
+    CategorySerializer, StockMovementSerializer, ReturnItemSerializer, CashSessionSerializer, StockBulkEntrySerializer,
+    SalesStatsQuerySerializer, SaleSyncEntrySerializer, StockAsOfSerializer, StockBranchSerializer,
+    ReorderQuerySerializer, CatalogChangesQuerySerializer, selected_fields,
 )
 
+# ------------------- ОБЩЕЕ --------------------------------------------------
+
+class SparsePrefetchMixin:
+    """
+    prefetch_related связей из sparse_prefetch — только если поле связи
+    попадёт в ответ: ?fields=id,total не грузит позиции чека.
+    """
+    sparse_prefetch = ()
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        names = self.get_serializer_class()().fields
+        wanted = selected_fields(self.request, names)
+        return queryset.prefetch_related(*[name for name in self.sparse_prefetch if name in wanted])
+
+
 # ------------------- ТРАНЗАКЦИИ ---------------------------------------------
 
-class TransactionViewSet(viewsets.ModelViewSet):
+class TransactionViewSet(ExportMixin, viewsets.ModelViewSet):
     queryset = Transaction.objects.all()
     serializer_class = TransactionSerializer
+    filterset_class = TransactionFilter
+    export_fields = [
+        ('id', 'id'), ('date', 'date'), ('type', 'type'), ('name', 'name'), ('amount', 'amount'),
+    ]
 
     def create(self, request, *args, **kwargs):
         data = request.data
         if isinstance(data, list):
             serializer = self.get_serializer(data=data, many=True)
             serializer.is_valid(raise_exception=True)
-            Transaction.objects.bulk_create([Transaction(**d) for d in serializer.validated_data])
+            with transaction.atomic():
+                created = Transaction.objects.bulk_create(
+                    [Transaction(**d) for d in serializer.validated_data]
+                )
+                rollups.add_transactions(created)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return super().create(request, *args, **kwargs)
 
 
 @api_view(['GET'])
 def transaction_summary(request):
-    today = now().date()
-    start_of_month = today.replace(day=1)
-
-    added_today = Transaction.objects.filter(date=today).count()
-    daily_expense = Transaction.objects.filter(date=today, type='expense')\
-        .aggregate(sum=Sum('amount'))['sum'] or 0
-    monthly_expense = Transaction.objects.filter(date__gte=start_of_month, type='expense')\
-        .aggregate(sum=Sum('amount'))['sum'] or 0
-
-    return Response({
-        "month": {"added_today": added_today},
-        "daily_expense": daily_expense,
-        "monthly_expense": monthly_expense
-    })
+    # один запрос по свёртке DailyTransactionTotals + кэш на несколько секунд
+    return Response(rollups.transaction_summary(settings.TRANSACTION_SUMMARY_TTL))
 
 
 # ------------------- КАТЕГОРИИ ----------------------------------------------
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(CatalogConditionalMixin, ResponseCacheMixin, viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
+    cache_scope = 'category'
 
 
 # ------------------- СКЛАД ---------------------------------------------------
 
 
-class StockViewSet(viewsets.ModelViewSet):
-    queryset = Stock.objects.all()
+class StockViewSet(CatalogConditionalMixin, ResponseCacheMixin, viewsets.ModelViewSet):
+    """
+    GET — с ETag по версии каталога: If-None-Match → 304 (clients/catalog.py).
+    GET /stocks/changes/?since=<версия> — только изменённые после неё товары.
+    GET ?as_of=2025-07-01 (или дата-время) — остаток на момент:
+    ближайший снимок StockSnapshot + движения после него.
+    GET ?branch=Сокулук — только товары филиала и их остаток в нём (StockLevel).
+    GET ?search=молоко[&limit=20] — лучшие совпадения по названию и штрихкодам.
+    GET ?category=3&low_stock=5&oversold=true — фильтры StockFilter (clients/filters.py).
+    list/retrieve — из кэша ответов (clients/response_cache.py), list — с ETag
+    (clients/catalog.py); ?as_of= — без того и другого.
+    """
+    queryset = Stock.objects.select_related('category')
     serializer_class = StockSerializer
+    filterset_class = StockFilter
+    cache_scope = 'stock'
+    # остаток на дату зависит и от журнала движений (сверка дописывает adjust)
+    cache_skip_params = ('as_of',)
+    conditional_skip_params = ('as_of',)
+
+    def get_as_of(self):
+        if self.request.method != 'GET' or not self.request.query_params.get('as_of'):
+            return None
+        raw = self.request.query_params['as_of']
+        try:
+            value = parse_date(raw) or parse_datetime(raw)
+        except ValueError:
+            value = None
+        if value is None:
+            raise serializers.ValidationError({'as_of': ['Ожидается дата или дата-время ISO 8601']})
+        return ledger.end_of_day(value)
+
+    def get_branch(self):
+        branch = self.request.query_params.get('branch') if self.request.method == 'GET' else None
+        if branch and branch not in dict(BRANCH_CHOICES):
+            raise serializers.ValidationError({'branch': [f'Неизвестный филиал: {branch}']})
+        return branch or None
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        as_of = self.get_as_of()
+        if as_of is not None:
+            queryset = ledger.annotate_quantity_as_of(queryset, as_of)
+        branch = self.get_branch()
+        if branch is not None:
+            # один JOIN по уникальному индексу (branch, stock)
+            queryset = queryset.filter(levels__branch=branch).annotate(branch_quantity=F('levels__quantity'))
+        return queryset
+
+    def filter_queryset(self, queryset):
+        # поиск — после фильтров: limit отбирает лучшие из подходящих под них
+        queryset = super().filter_queryset(queryset)
+        query = self.request.query_params.get('search', '').strip() if self.request.method == 'GET' else ''
+        if query:
+            queryset = self.search(queryset, query)
+        return queryset
+
+    def search(self, queryset, query):
+        try:
+            limit = max(1, min(int(self.request.query_params.get('limit', settings.STOCK_SEARCH_LIMIT)), 100))
+        except ValueError:
+            raise serializers.ValidationError({'limit': ['Нужно целое число']})
+        ids = search_stocks(query, limit, queryset)
+        # порядок — по релевантности из индекса
+        return queryset.filter(pk__in=ids).order_by(
+            Case(*[When(pk=pk, then=position) for position, pk in enumerate(ids)])
+        )
+
+    def get_serializer_class(self):
+        if self.get_as_of() is not None:
+            return StockAsOfSerializer
+        if self.get_branch() is not None:
+            return StockBranchSerializer
+        return super().get_serializer_class()
+
+    def get_serializer_context(self):
+        return {**super().get_serializer_context(), 'as_of': self.get_as_of(), 'branch': self.get_branch()}
 
     def create(self, request, *args, **kwargs):
+        """
+        Приход товара: одиночный объект или массив (накладная целиком).
+        Известные штрихкоды пополняют существующий товар, остальные создаются.
+        Ответ — результат по каждой строке: {row, status, stock}.
+        """
         data = request.data
 
         # оборачиваем одиночный объект в список
         if not isinstance(data, list):
             data = [data]
 
-        # сериализуем
         serializer = StockBulkEntrySerializer(data=data, many=True)
         serializer.is_valid(raise_exception=True)
-
-        # сохраняем
-        created_stocks = serializer.save()
-
-        # 📌 Если вдруг что-то вернулось в виде [[obj, obj]], выравниваем
-        flat_stocks = []
-        for s in created_stocks:
-            if isinstance(s, list):
-                flat_stocks.extend(s)
-            else:
-                flat_stocks.append(s)
-
-        return Response(StockSerializer(flat_stocks, many=True).data, status=status.HTTP_201_CREATED)
+        results = serializer.save()
+
+        stocks = self.get_queryset().in_bulk([stock_id for _, stock_id in results])
+        return Response([
+            {'row': i, 'status': status_, 'stock': StockSerializer(stocks[stock_id]).data}
+            for i, (status_, stock_id) in enumerate(results)
+        ], status=status.HTTP_201_CREATED)
+
+    # POST /stocks/import/ (multipart, поле file: .csv или .xlsx)
+    # Ответ — NDJSON: строка прогресса после каждой пачки
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser])
+    def import_file(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'file': ['Файл не передан']}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            batch_size = max(1, min(int(request.query_params.get('batch_size', DEFAULT_BATCH_SIZE)), 5000))
+        except ValueError:
+            return Response({'batch_size': ['Нужно целое число']}, status=status.HTTP_400_BAD_REQUEST)
+
+        def stream():
+            # файл без строк данных: import_stock ничего не отдаёт — итог нулевой
+            progress = {'processed': 0, 'created': 0, 'updated': 0, 'errors': 0, 'error_details': []}
+            for progress in import_stock(iter_file(upload, upload.name), batch_size=batch_size):
+                yield json.dumps(
+                    {k: v for k, v in progress.items() if k != 'error_details'}, ensure_ascii=False
+                ) + '\n'
+            yield json.dumps(progress, ensure_ascii=False, default=str) + '\n'
+
+        return StreamingHttpResponse(stream(), content_type='application/x-ndjson')
+
+    # GET  /stocks/reconcile/ — отчёт о расхождениях остатков с журналом
+    # POST /stocks/reconcile/ — то же + корректирующие движения adjust
+    @action(detail=False, methods=['get', 'post'])
+    def reconcile(self, request):
+        fix = request.method == 'POST'
+        mismatches = list(ledger.reconcile(fix=fix))
+        return Response({'fixed': fix, 'count': len(mismatches), 'mismatches': mismatches})
+
+    # GET /stocks/reorder/?window=28&threshold=7[&all=1] — что пора заказать
+    @action(detail=False, methods=['get'])
+    def reorder(self, request):
+        params = ReorderQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        data = params.validated_data
+        return Response(reorder_report(data.get('window'), data.get('threshold'), data['all']))
+
+    # GET /stocks/changes/?since=<версия> — товары, изменённые после версии, и id
+    # удалённых; продажи и прочие сдвиги остатка версию не меняют (catalog.py).
+    # version ответа — since для следующего запроса. reset=true —
+    # версия кассы новее серверной (база восстановлена): каталог нужен целиком
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        params = CatalogChangesQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        since = params.validated_data['since']
+
+        def render(version):
+            reset = since > version
+            after = 0 if reset else since
+            stocks = self.filter_queryset(self.get_queryset()).filter(version__gt=after).order_by('version', 'pk')
+            deleted = DeletedStock.objects.filter(version__gt=after).values_list('stock_id', flat=True)
+            return Response({
+                'version': version,
+                'reset': reset,
+                'items': self.get_serializer(stocks, many=True).data,
+                'deleted': list(deleted),
+            })
+
+        return self.conditional(request, render)
+
+    # GET /stocks/resolver-stats/ — счётчики LRU-кэша штрихкодов
+    @action(detail=False, methods=['get'], url_path='resolver-stats')
+    def resolver_stats(self, request):
+        return Response(stock_resolver_cache.stats())
 
 # ------------------- ПРОДАЖИ -------------------------------------------------
 
-class SaleHistoryViewSet(viewsets.ModelViewSet):
-    queryset = SaleHistory.objects.all().order_by('-date')
+class SaleHistoryViewSet(IdempotentCreateMixin, ExportMixin, SparsePrefetchMixin, viewsets.ModelViewSet):
+    queryset = SaleHistory.objects.order_by('-date')
+    sparse_prefetch = ('items',)
     serializer_class = SaleHistorySerializer
+    filterset_class = SaleHistoryFilter
+    pagination_class = DateCursorPagination
+    # выгрузка — по позициям чека (одна строка на SaleItem)
+    export_fields = [
+        ('sale_id', 'sale_id'), ('date', 'sale__date'), ('payment_type', 'sale__payment_type'),
+        ('sale_total', 'sale__total'), ('code', 'code'), ('name', 'name'),
+        ('price', 'price'), ('quantity', 'quantity'), ('total', 'total'),
+    ]
+
+    def get_export_queryset(self):
+        sales = super().get_export_queryset()
+        return SaleItem.objects.filter(sale__in=sales.values('pk')).order_by('-sale__date', 'sale_id', 'id')
 
     # create уже реализован в сериализаторе (SaleHistorySerializer.create)
     # поэтому здесь ничего переопределять не нужно
 
+    # GET /sales/stats/?date_from=2025-07-01&date_to=2025-07-31&group=day
+    @action(detail=False, methods=['get'])
+    def stats(self, request):
+        params = SalesStatsQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        data = params.validated_data
+        return Response(rollups.sales_stats(data['date_from'], data['date_to'], data['group']))
+
+    # POST /sales/sync/ — пачка офлайн-чеков с кассы (тело можно сжать gzip)
+    # [{client_uuid, date, payment_type, total, items}, …] или {"sales": […]}
+    @action(detail=False, methods=['post'], parser_classes=[CompressedJSONParser])
+    def sync(self, request):
+        batch = request.data.get('sales') if isinstance(request.data, dict) else request.data
+        if not isinstance(batch, list):
+            return Response({'sales': ['Ожидается список чеков']}, status=status.HTTP_400_BAD_REQUEST)
+        if len(batch) > settings.SALES_SYNC_MAX_BATCH:
+            return Response(
+                {'sales': [f'Не больше {settings.SALES_SYNC_MAX_BATCH} чеков за раз']},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        # ошибка в одном чеке не мешает остальным — проверяем по одному
+        results, valid = [None] * len(batch), []
+        for i, entry in enumerate(batch):
+            serializer = SaleSyncEntrySerializer(data=entry)
+            if serializer.is_valid():
+                valid.append((i, serializer.validated_data))
+            else:
+                uuid = entry.get('client_uuid') if isinstance(entry, dict) else None
+                results[i] = {'client_uuid': uuid, 'status': 'rejected', 'sale': None, 'errors': serializer.errors}
+
+        try:
+            synced = checkout_batch([data for _, data in valid])
+        except IntegrityError:
+            # тот же чек параллельно загружает другой запрос
+            return Response(
+                {'detail': 'Пачка пересекается с другой синхронизацией, повторите'},
+                status=status.HTTP_409_CONFLICT,
+            )
+        for (i, _), result in zip(valid, synced):
+            results[i] = result
+
+        counts = {key: 0 for key in ('created', 'duplicate', 'rejected')}
+        for result in results:
+            counts[result['status']] += 1
+        return Response({**counts, 'results': results})
+
 
 # ------------------- ДВИЖЕНИЯ ПО СКЛАДУ (read-only) --------------------------
 
-class StockMovementViewSet(viewsets.ReadOnlyModelViewSet):
+class StockMovementViewSet(ExportMixin, viewsets.ReadOnlyModelViewSet):
     queryset = StockMovement.objects.select_related('stock').order_by('-date')
     serializer_class = StockMovementSerializer
+    filterset_class = StockMovementFilter
+    pagination_class = DateCursorPagination
+    export_fields = [
+        ('id', 'id'), ('date', 'date'), ('stock_id', 'stock_id'), ('stock_name', 'stock__name'),
+        ('movement_type', 'movement_type'), ('quantity', 'quantity'), ('sale_id', 'sale_id'),
+        ('comment', 'comment'),
+    ]
     
     
 
@@ -114,83 +355,31 @@ class StockMovementViewSet(viewsets.ReadOnlyModelViewSet):
 
 from rest_framework import status, viewsets
 from rest_framework.response import Response
-from .models import ReturnItem, Stock, StockMovement
+from .models import ReturnItem
 from .serializers import ReturnItemSerializer
 
-class ReturnItemViewSet(viewsets.ModelViewSet):
+class ReturnItemViewSet(IdempotentCreateMixin, viewsets.ModelViewSet):
     """
     POST принимает:
       • единичный объект  {sale_item, quantity, reason?, branch}
       • или массив таких объектов […]
+    PUT/PATCH проверяются и сдвигают остаток на разницу (services.update_return).
     """
-    queryset = ReturnItem.objects.all().order_by('-date')
+    queryset = ReturnItem.objects.select_related('sale_item').order_by('-date')
     serializer_class = ReturnItemSerializer
+    filterset_class = ReturnItemFilter
+    pagination_class = DateCursorPagination
 
-    def create(self, request, *args, **kwargs):
-        data_is_list = isinstance(request.data, list)
-
-        serializer = self.get_serializer(
-            data=request.data,
-            many=data_is_list
-        )
-        serializer.is_valid(raise_exception=True)
-
-        if data_is_list:
-            items = [self._save_one(d) for d in serializer.validated_data]
-            out = self.get_serializer(items, many=True)
-        else:
-            item = self._save_one(serializer.validated_data)
-            out = self.get_serializer(item)
-
-        return Response(out.data, status=status.HTTP_201_CREATED)
-
-    def _save_one(self, data):
-        """
-        helper — обработка одного возврата:
-        • откат остатков на складе
-        • создание движения по складу
-        • сохранение возврата
-        """
-        sale_item = data["sale_item"]
-        qty       = data["quantity"]
-        reason    = data.get("reason", "")
-        branch    = data.get("branch", "Сокулук")  # значение по умолчанию
-
-        # 1. Найдём или создадим товар на складе
-        stock, _ = Stock.objects.get_or_create(
-            code=sale_item.code,
-            defaults={
-                "name": sale_item.name,
-                "price": sale_item.price,
-                "price_seller": sale_item.price,
-                "quantity": 0,
-                "unit": "шт"
-            }
-        )
-
-        # 2. Обновим остаток (+qty)
-        stock.quantity = (stock.quantity or Decimal("0")) + Decimal(qty)
-        stock.save(update_fields=["quantity"])
-
-        # 3. Создаём движение по складу
-        StockMovement.objects.create(
-            stock=stock,
-            movement_type="return",
-            quantity=qty,
-            comment=f"Возврат по продаже #{sale_item.sale_id}"
-        )
-
-        # 4. Создаём возврат
-        return ReturnItem.objects.create(
-            sale_item=sale_item,
-            quantity=qty,
-            reason=reason,
-            branch=branch
-        )
+    def get_serializer(self, *args, **kwargs):
+        # массив возвратов проводится одной партией (ReturnItemListSerializer)
+        if isinstance(kwargs.get('data'), list):
+            kwargs['many'] = True
+        return super().get_serializer(*args, **kwargs)
 
-class CashSessionViewSet(viewsets.ModelViewSet):
+class CashSessionViewSet(ResponseCacheMixin, viewsets.ModelViewSet):
     queryset = CashSession.objects.all()
     serializer_class = CashSessionSerializer
+    cache_scope = 'cashsession'
 
     # POST /cash-sessions/open/
     @action(detail=False, methods=['post'])
@@ -205,10 +394,15 @@ class CashSessionViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'])
     def close(self, request, pk=None):
         session = self.get_object()
-        session.close(request.data.get('closing_sum', 0))
+        # снимок — в той же транзакции, что и закрытие смены
+        with transaction.atomic():
+            session.close(request.data.get('closing_sum', 0))
+            ledger.take_snapshot()
         return Response(self.get_serializer(session).data)
     
     
-class DispatchHistoryViewSet(viewsets.ModelViewSet):
-    queryset = DispatchHistory.objects.all().order_by('-date')
+class DispatchHistoryViewSet(IdempotentCreateMixin, SparsePrefetchMixin, viewsets.ModelViewSet):
+    queryset = DispatchHistory.objects.order_by('-date')
+    sparse_prefetch = ('items',)
+    pagination_class = DateCursorPagination
     serializer_class = DispatchHistorySerializer
\ No newline at end of file
@@ -43,15 +43,56 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'corsheaders',
     "rest_framework",
+    'django_filters',
     'clients'
   ]
 
 REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': (
         'rest_framework.renderers.JSONRenderer',
-    )
+    ),
+    # FilterSet'ы списков — clients/filters.py
+    'DEFAULT_FILTER_BACKENDS': (
+        'django_filters.rest_framework.DjangoFilterBackend',
+    ),
 }
 
+# Размер LRU-кэша «штрихкод → товар» (clients/cache.py), 0 — выключен,
+# и сколько секунд живёт запись (кэш — в памяти каждого воркера)
+STOCK_RESOLVER_CACHE_SIZE = int(os.environ.get('STOCK_RESOLVER_CACHE_SIZE', 10000))
+STOCK_RESOLVER_CACHE_TTL = int(os.environ.get('STOCK_RESOLVER_CACHE_TTL', 60))
+
+# Что делать, если продажа уводит остаток в минус:
+# 'allow' — разрешить, 'reject' — отклонить продажу, 'backorder' — под заказ
+STOCK_OVERSELL_POLICY = os.environ.get('STOCK_OVERSELL_POLICY', 'allow')
+
+# То же для офлайн-чеков, загружаемых пачкой (POST /clients/sales/sync/);
+# 'reject' отклоняет отдельные чеки пачки, остальные проводятся
+SALES_SYNC_CONFLICT_POLICY = os.environ.get('SALES_SYNC_CONFLICT_POLICY', STOCK_OVERSELL_POLICY)
+# Максимум чеков в одной пачке синхронизации
+SALES_SYNC_MAX_BATCH = int(os.environ.get('SALES_SYNC_MAX_BATCH', 1000))
+
+# Поиск товара GET /clients/stocks/?search= (clients/search.py):
+# сколько результатов по умолчанию и минимальная доля совпавших триграмм
+STOCK_SEARCH_LIMIT = int(os.environ.get('STOCK_SEARCH_LIMIT', 20))
+STOCK_SEARCH_MIN_SIMILARITY = float(os.environ.get('STOCK_SEARCH_MIN_SIMILARITY', 0.3))
+
+# Отчёт GET /clients/stocks/reorder/ (clients/reorder.py):
+# окно расчёта скорости продаж, порог «дней запаса», срок кэша отчёта (сек)
+# и сколько дней истории хранить в свёртке DailyStockDemand
+REORDER_WINDOW_DAYS = int(os.environ.get('REORDER_WINDOW_DAYS', 28))
+REORDER_MIN_DAYS_OF_COVER = int(os.environ.get('REORDER_MIN_DAYS_OF_COVER', 7))
+REORDER_CACHE_TTL = int(os.environ.get('REORDER_CACHE_TTL', 300))
+REORDER_HISTORY_DAYS = int(os.environ.get('REORDER_HISTORY_DAYS', 365))
+
+# Сколько секунд кэшируется /clients/transactions/summary/
+TRANSACTION_SUMMARY_TTL = int(os.environ.get('TRANSACTION_SUMMARY_TTL', 10))
+
+# Сколько секунд хранится ответ на POST с Idempotency-Key (clients/idempotency.py)
+IDEMPOTENCY_KEY_TTL = int(os.environ.get('IDEMPOTENCY_KEY_TTL', 24 * 60 * 60))
+# Через сколько секунд «зависший» незавершённый ключ можно занять заново
+IDEMPOTENCY_LOCK_TIMEOUT = int(os.environ.get('IDEMPOTENCY_LOCK_TIMEOUT', 60))
+
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
@@ -70,7 +111,12 @@ CORS_ALLOW_HEADERS = [
     'accept',
     'origin',
     'x-requested-with',
+    'idempotency-key',
+    'content-encoding',
+    'if-none-match',
+    'if-modified-since',
 ]
+CORS_EXPOSE_HEADERS = ['etag', 'x-catalog-version']
 
 ROOT_URLCONF = 'younodarapi.urls'
 
@@ -96,11 +142,96 @@ WSGI_APPLICATION = 'younodarapi.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DB_ENGINE=sqlite (по умолчанию) — одна касса/один сервер, файл db.sqlite3;
+# DB_ENGINE=postgres — прод, нужен psycopg (requirements-postgres.txt).
+
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'postgres':
+    # lookup'ы pg_trgm для поиска товаров (clients/search.py)
+    INSTALLED_APPS.append('django.contrib.postgres')
+    # DB_POOL=1 — пул соединений psycopg внутри процесса (CONN_MAX_AGE тогда 0),
+    # иначе — постоянные соединения на CONN_MAX_AGE секунд
+    DB_POOL = os.environ.get('DB_POOL', '0') == '1'
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('POSTGRES_DB', 'aun'),
+            'USER': os.environ.get('POSTGRES_USER', 'aun'),
+            'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+            'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
+            'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+            'CONN_MAX_AGE': 0 if DB_POOL else int(os.environ.get('CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'pool': {
+                    'min_size': int(os.environ.get('DB_POOL_MIN', 2)),
+                    'max_size': int(os.environ.get('DB_POOL_MAX', 10)),
+                    'timeout': int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+                },
+            } if DB_POOL else {},
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {
+                # BEGIN IMMEDIATE: блокировка записи берётся в начале транзакции,
+                # параллельные кассы ждут (timeout), а не падают с «database is locked»
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': 20,
+            },
+            # файловая тестовая БД — нужна для многопоточных тестов
+            'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
+        }
+    }
+
+# Кэш Django (итоги, отчёты, версия каталога, кэш ответов GET).
+# CACHE_BACKEND=locmem (по умолчанию) — память процесса, только для одного
+# процесса; CACHE_BACKEND=file — каталог CACHE_DIR, общий для всех воркеров
+# сервера: сброс по сигналам виден каждому.
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'locmem')
+
+if CACHE_BACKEND == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('CACHE_DIR', BASE_DIR / '.cache'),
+            'OPTIONS': {'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', 10000))},
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', 10000))},
+        }
     }
+
+# Сброс кэша по сигналам доходит только до своего процесса. С LocMem при
+# нескольких воркерах остальные отдавали бы устаревшие данные, поэтому
+# по умолчанию кэш ответов и версия каталога в нём включены только для
+# общего бэкенда (проверка clients.W001 — если включить их вручную).
+SHARED_CACHE = CACHE_BACKEND != 'locmem'
+# Сколько секунд версия каталога (ETag /clients/stocks/, clients/catalog.py)
+# может жить в кэше; после изменений она и так сбрасывается. 0 — читать
+# из БД (одна строка по pk) на каждый запрос
+CATALOG_STAMP_TTL = int(os.environ.get('CATALOG_STAMP_TTL', 30 if SHARED_CACHE else 0))
+# Кэш ответов GET /clients/categories/, /stocks/, /cash-sessions/
+# (clients/response_cache.py): срок записи в секундах, 0 — выключен
+RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', 300 if SHARED_CACHE else 0))
+
+# PRAGMA для каждого нового соединения SQLite (clients/signals.py).
+# WAL: чтение не блокирует запись; synchronous=NORMAL безопасен в WAL.
+SQLITE_PRAGMAS = {
+    'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 20000)),
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    'cache_size': -int(os.environ.get('SQLITE_CACHE_KB', 64 * 1024)),
+    'temp_store': 'MEMORY',
 }
 
 